@@ -0,0 +1,363 @@
+import pandas as pd
+import os
+import time
+import hashlib
+import sqlite3
+import argparse
+from datetime import datetime
+from pandas.tseries.api import guess_datetime_format
+
+# Diccionario de códigos de extensión por empresa
+CODIGOS_POR_EMPRESA = {
+    'UDC': [
+        '(0220)', '(0221)', '(0222)', '(0303)', '(0305)', '(0308)', '(0316)', '(0320)', 
+        '(0323)', '(0324)', '(0327)', '(0331)', '(0404)', '(0407)', '(0410)', '(0412)', 
+        '(0413)', '(0414)', '(0415)', '(0417)', '(8062)', '(8063)', '(8064)', '(8072)', 
+        '(8080)'
+    ],
+    'ODO': [
+        '(2001)', '(2002)', '(2003)', '(2004)', '(2005)', '(2006)', '(2007)', '(2008)', 
+        '(2009)', '(2010)', '(2011)', '(2012)', '(2013)', '(2014)', '(2015)', '(2016)', 
+        '(2017)', '(2018)', '(2019)', '(2021)', '(2022)', '(2023)', '(2024)', '(2025)', 
+        '(2026)', '(2032)', '(2034)', '(8000)', '(8002)', '(8003)', '(8071)', '(8079)'
+    ],
+    'CCB': [
+        '(2028)', '(2029)', '(2030)', '(2035)', '(8051)', '(8052)'
+    ]
+}
+
+# Mapa código "(dddd)" -> empresa y prioridad de cada empresa (orden del diccionario)
+EMPRESA_POR_CODIGO = {codigo: empresa for empresa, codigos in CODIGOS_POR_EMPRESA.items() for codigo in codigos}
+PRIORIDAD_EMPRESA = {empresa: prioridad for prioridad, empresa in enumerate(CODIGOS_POR_EMPRESA)}
+PATRON_EXTENSION = r'(\(\d{4}\))'
+
+# Histórico local (SQLite) de llamadas clasificadas
+RUTA_ALMACEN_LLAMADAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historico_llamadas.sqlite')
+
+# Columnas del CSV que se leen (como texto) y tamaño de cada bloque de lectura
+COLUMNAS_CDR = {'Call Time': str, 'From': str, 'To': str}
+TAMANO_BLOQUE_CSV = 200_000
+
+# Franjas base en las que se cuentan las llamadas (minutos desde medianoche // MINUTOS_FRANJA_BASE)
+MINUTOS_FRANJA_BASE = 15
+FRANJAS_BASE = 1440 // MINUTOS_FRANJA_BASE
+
+# Función para determinar si un número es extensión interna y a qué empresa pertenece
+def obtener_empresa_extension(numeros):
+    """
+    Determina para cada número de la columna si contiene algún código de extensión interna
+    y a qué empresa pertenece (None si es externo).
+    Se evalúa una sola vez por número distinto: se extrae el token "(dddd)" y se busca en
+    EMPRESA_POR_CODIGO. Los números con varios tokens conservan la regla de primera coincidencia
+    en el orden de CODIGOS_POR_EMPRESA
+    """
+    valores = pd.Series(numeros.dropna().unique())
+    if valores.empty:
+        return pd.Series(None, index=numeros.index, dtype=object)
+    
+    texto = valores.astype(str)
+    empresas = texto.str.extract(PATRON_EXTENSION, expand=False).map(EMPRESA_POR_CODIGO)
+    
+    varios_tokens = texto.str.count(PATRON_EXTENSION) > 1
+    if varios_tokens.any():
+        def empresa_prioritaria(tokens):
+            encontradas = [EMPRESA_POR_CODIGO[token] for token in tokens if token in EMPRESA_POR_CODIGO]
+            return min(encontradas, key=PRIORIDAD_EMPRESA.get) if encontradas else None
+        empresas[varios_tokens] = texto[varios_tokens].str.findall(PATRON_EXTENSION).apply(empresa_prioritaria)
+    
+    empresas = empresas.astype(object).where(empresas.notna(), None)
+    return numeros.map(dict(zip(valores, empresas)))
+
+# Función para calcular el hash del archivo cargado
+def calcular_hash_archivo(archivo):
+    """
+    Calcula el hash del contenido del archivo cargado leyéndolo por bloques (sin copiarlo completo)
+    """
+    hash_md5 = hashlib.md5()
+    archivo.seek(0)
+    for bloque in iter(lambda: archivo.read(1 << 20), b''):
+        hash_md5.update(bloque)
+    archivo.seek(0)
+    return hash_md5.hexdigest()
+
+# Función para detectar el formato de fecha de 'Call Time' en un archivo
+def detectar_formato_call_time(call_time):
+    """
+    Deduce el formato de 'Call Time' a partir del primer valor no vacío, igual que pd.to_datetime sobre
+    la columna completa. Se calcula una vez por archivo y se aplica a todos sus bloques, para que todos
+    usen el mismo orden día/mes. Retorna None si no hay valores, o 'mixed' si el formato no se reconoce
+    """
+    muestra = call_time.dropna()
+    if muestra.empty:
+        return None
+    return guess_datetime_format(str(muestra.iloc[0])) or 'mixed'
+
+# Función para clasificar un bloque del CSV
+def clasificar_bloque_llamadas(bloque, formato=None):
+    """
+    Convierte 'Call Time' con el formato del archivo (ver detectar_formato_call_time), clasifica From/To
+    y aplica el filtro externo → interno sobre un bloque del CSV. Retorna (llamadas, registros_validos),
+    donde llamadas trae Call Time, From, To y Empresa de los registros que cumplen el filtro
+    """
+    call_time = pd.to_datetime(bloque['Call Time'], format=formato or 'mixed', errors='coerce')
+    
+    # Filtrar: Call Time válido, origen externo (From no es extensión) Y destino interno (To es extensión)
+    validos = call_time.notna()
+    empresa_to = obtener_empresa_extension(bloque['To'])
+    mascara = validos & obtener_empresa_extension(bloque['From']).isna() & empresa_to.notna()
+    
+    llamadas = pd.DataFrame({
+        'Call Time': call_time[mascara],
+        'From': bloque['From'][mascara],
+        'To': bloque['To'][mascara],
+        'Empresa': empresa_to[mascara]
+    })
+    return llamadas, int(validos.sum())
+
+# Función para dejar los conteos con tipos compactos y orden cronológico
+def tipar_conteos(conteos):
+    """
+    Normaliza un DataFrame de conteos (Fecha, Franja, Empresa, Llamadas) a los tipos que usa el resto de la app
+    """
+    conteos['Fecha'] = pd.to_datetime(conteos['Fecha'])
+    conteos['Franja'] = conteos['Franja'].astype('int8')
+    conteos['Empresa'] = pd.Categorical(conteos['Empresa'], categories=list(CODIGOS_POR_EMPRESA))
+    conteos['Llamadas'] = conteos['Llamadas'].astype('int64')
+    return conteos.sort_values(['Fecha', 'Franja', 'Empresa']).reset_index(drop=True)
+
+# Función para abrir el histórico local de llamadas
+def conectar_almacen_llamadas(ruta=RUTA_ALMACEN_LLAMADAS):
+    """
+    Abre el histórico SQLite de llamadas clasificadas y crea las tablas si no existen.
+    La llave primaria (call_time, origen, destino) evita registrar dos veces la misma llamada y
+    archivos_procesados lleva el registro de los archivos ya ingeridos (por hash de contenido)
+    """
+    conexion = sqlite3.connect(ruta)
+    conexion.execute("""
+        CREATE TABLE IF NOT EXISTS llamadas (
+            call_time TEXT NOT NULL,
+            origen TEXT NOT NULL,
+            destino TEXT NOT NULL,
+            empresa TEXT NOT NULL,
+            fecha TEXT NOT NULL,
+            hora INTEGER NOT NULL,
+            PRIMARY KEY (call_time, origen, destino)
+        )
+    """)
+    conexion.execute("CREATE INDEX IF NOT EXISTS idx_llamadas_fecha ON llamadas (fecha)")
+    conexion.execute("""
+        CREATE TABLE IF NOT EXISTS archivos_procesados (
+            hash TEXT PRIMARY KEY,
+            nombre TEXT NOT NULL,
+            tamano INTEGER NOT NULL,
+            modificado REAL NOT NULL,
+            procesado_en TEXT NOT NULL,
+            clasificadas INTEGER NOT NULL,
+            nuevas INTEGER NOT NULL,
+            error TEXT
+        )
+    """)
+    return conexion
+
+# Función para agregar un archivo CSV al histórico local
+def agregar_archivo_almacen(archivo, tamano_bloque=TAMANO_BLOQUE_CSV, ruta=RUTA_ALMACEN_LLAMADAS):
+    """
+    Lee el CSV por bloques, clasifica las llamadas (externo → interno) y las agrega al histórico.
+    Las llamadas ya registradas (misma hora, origen y destino) se omiten.
+    Todo el archivo se inserta en una sola transacción: si falla algún bloque no queda ninguna de sus
+    llamadas en el histórico.
+    Retorna un diccionario con las llamadas clasificadas del archivo y las nuevas agregadas
+    """
+    resultado = {'clasificadas': 0, 'nuevas': 0}
+    conexion = conectar_almacen_llamadas(ruta)
+    try:
+        archivo.seek(0)
+        cambios_previos = conexion.total_changes
+        formato = None
+        with conexion:
+            for bloque in pd.read_csv(archivo, usecols=list(COLUMNAS_CDR), dtype=COLUMNAS_CDR, chunksize=tamano_bloque):
+                if formato is None:
+                    formato = detectar_formato_call_time(bloque['Call Time'])
+                llamadas, _ = clasificar_bloque_llamadas(bloque, formato)
+                if llamadas.empty:
+                    continue
+                
+                registros = pd.DataFrame({
+                    'call_time': llamadas['Call Time'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+                    'origen': llamadas['From'].fillna(''),
+                    'destino': llamadas['To'].fillna(''),
+                    'empresa': llamadas['Empresa'],
+                    'fecha': llamadas['Call Time'].dt.strftime('%Y-%m-%d'),
+                    'hora': llamadas['Call Time'].dt.hour
+                })
+                conexion.executemany(
+                    "INSERT OR IGNORE INTO llamadas VALUES (?, ?, ?, ?, ?, ?)",
+                    registros.itertuples(index=False, name=None)
+                )
+                resultado['clasificadas'] += len(registros)
+        resultado['nuevas'] = conexion.total_changes - cambios_previos
+    finally:
+        archivo.seek(0)
+        conexion.close()
+    
+    return resultado
+
+# Función para consultar el rango de fechas disponible en el histórico
+def rango_fechas_almacen(ruta=RUTA_ALMACEN_LLAMADAS):
+    """
+    Retorna (fecha_min, fecha_max, total_llamadas) del histórico local ((None, None, 0) si está vacío)
+    """
+    if not os.path.exists(ruta):
+        return None, None, 0
+    conexion = conectar_almacen_llamadas(ruta)
+    try:
+        fecha_min, fecha_max, total = conexion.execute(
+            "SELECT MIN(fecha), MAX(fecha), COUNT(*) FROM llamadas"
+        ).fetchone()
+    finally:
+        conexion.close()
+    if not total:
+        return None, None, 0
+    return pd.Timestamp(fecha_min).date(), pd.Timestamp(fecha_max).date(), total
+
+# Función para consultar el histórico por rango de fechas
+def consultar_almacen_llamadas(fecha_inicio, fecha_fin, ruta=RUTA_ALMACEN_LLAMADAS):
+    """
+    Consulta el histórico local entre fecha_inicio y fecha_fin (inclusive).
+    Retorna (conteos, resumen, vista_previa) con la misma forma que agregar_llamadas_por_bloques
+    (franjas base calculadas con la hora y el minuto de call_time) y las primeras 10 llamadas del rango
+    """
+    parametros = (MINUTOS_FRANJA_BASE, str(fecha_inicio), str(fecha_fin))
+    conexion = conectar_almacen_llamadas(ruta)
+    try:
+        conteos = pd.read_sql_query(
+            """
+            SELECT fecha AS Fecha, (hora * 60 + CAST(substr(call_time, 15, 2) AS INTEGER)) / ? AS Franja,
+                   empresa AS Empresa, COUNT(*) AS Llamadas
+            FROM llamadas WHERE fecha BETWEEN ? AND ?
+            GROUP BY Fecha, Franja, Empresa
+            """, conexion, params=parametros
+        )
+        vista_previa = pd.read_sql_query(
+            """
+            SELECT call_time AS "Call Time", origen AS "From", destino AS "To", empresa AS Empresa
+            FROM llamadas WHERE fecha BETWEEN ? AND ? ORDER BY call_time LIMIT 10
+            """, conexion, params=parametros[1:]
+        )
+    finally:
+        conexion.close()
+    
+    # El histórico solo guarda llamadas ya clasificadas (externo → interno)
+    total = int(conteos['Llamadas'].sum())
+    resumen = {
+        'columnas_faltantes': [],
+        'filas_archivo': total,
+        'total_registros': total,
+        'registros_externo_interno': total
+    }
+    if total == 0:
+        return None, resumen, vista_previa
+    
+    return tipar_conteos(conteos), resumen, vista_previa
+
+# Función para obtener las firmas de los archivos ya procesados
+def firmas_archivos_procesados(ruta=RUTA_ALMACEN_LLAMADAS):
+    """
+    Retorna (hashes, firmas): los hashes de contenido registrados y las firmas (nombre, tamaño, fecha
+    de modificación) que permiten omitir un archivo sin volver a leerlo
+    """
+    conexion = conectar_almacen_llamadas(ruta)
+    try:
+        filas = conexion.execute("SELECT hash, nombre, tamano, modificado FROM archivos_procesados").fetchall()
+    finally:
+        conexion.close()
+    return {fila[0] for fila in filas}, {fila[1:] for fila in filas}
+
+# Función para registrar un archivo procesado
+def registrar_archivo_procesado(hash_archivo, nombre, tamano, modificado, resultado=None, error=None,
+                                ruta=RUTA_ALMACEN_LLAMADAS):
+    """
+    Registra el archivo en archivos_procesados con su resultado (llamadas clasificadas y nuevas) o el error
+    """
+    resultado = resultado or {'clasificadas': 0, 'nuevas': 0}
+    conexion = conectar_almacen_llamadas(ruta)
+    try:
+        with conexion:
+            conexion.execute(
+                "INSERT OR REPLACE INTO archivos_procesados VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (hash_archivo, nombre, int(tamano), float(modificado), datetime.now().isoformat(timespec='seconds'),
+                 resultado['clasificadas'], resultado['nuevas'], error)
+            )
+    finally:
+        conexion.close()
+
+# Función para ingerir los CSV nuevos de una carpeta
+def ingerir_carpeta(carpeta, ruta=RUTA_ALMACEN_LLAMADAS, segundos_estabilidad=60, tamano_bloque=TAMANO_BLOQUE_CSV):
+    """
+    Agrega al histórico los CSV de la carpeta que aún no están en archivos_procesados.
+    Se omiten los archivos modificados hace menos de segundos_estabilidad (la central aún puede estar
+    escribiéndolos). Cada archivo se ingiere completo o no se ingiere: si falla, sus llamadas se revierten,
+    queda registrado con el error y no se reintenta hasta que cambie su contenido.
+    Retorna una lista de (nombre, resultado o None si hubo error)
+    """
+    hashes, firmas = firmas_archivos_procesados(ruta)
+    procesados = []
+    
+    for nombre in sorted(os.listdir(carpeta)):
+        ruta_archivo = os.path.join(carpeta, nombre)
+        if not nombre.lower().endswith('.csv') or not os.path.isfile(ruta_archivo):
+            continue
+        
+        estado = os.stat(ruta_archivo)
+        if (nombre, estado.st_size, estado.st_mtime) in firmas or time.time() - estado.st_mtime < segundos_estabilidad:
+            continue
+        
+        with open(ruta_archivo, 'rb') as archivo:
+            hash_archivo = calcular_hash_archivo(archivo)
+            if hash_archivo in hashes:
+                continue
+            try:
+                resultado, error = agregar_archivo_almacen(archivo, tamano_bloque, ruta), None
+            except (ValueError, UnicodeDecodeError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+                resultado, error = None, str(e)
+        
+        registrar_archivo_procesado(hash_archivo, nombre, estado.st_size, estado.st_mtime, resultado, error, ruta)
+        hashes.add(hash_archivo)
+        procesados.append((nombre, resultado))
+    
+    return procesados
+
+# Servicio de ingesta: revisa la carpeta periódicamente (o una sola vez con --una-vez)
+def main():
+    parser = argparse.ArgumentParser(
+        description="Agrega al histórico local de llamadas los CSV nuevos que la central deja en una carpeta"
+    )
+    parser.add_argument('carpeta', help="Carpeta donde la central deja los CSV")
+    parser.add_argument('--almacen', default=RUTA_ALMACEN_LLAMADAS, help="Ruta del histórico SQLite")
+    parser.add_argument('--intervalo', type=int, default=300, help="Segundos entre revisiones de la carpeta")
+    parser.add_argument('--estabilidad', type=int, default=60,
+                        help="Segundos sin cambios antes de procesar un archivo")
+    parser.add_argument('--una-vez', action='store_true', help="Revisar la carpeta una sola vez y terminar")
+    args = parser.parse_args()
+    
+    if not os.path.isdir(args.carpeta):
+        parser.error(f"La carpeta '{args.carpeta}' no existe")
+    
+    print(f"Revisando {args.carpeta} → {args.almacen}")
+    try:
+        while True:
+            for nombre, resultado in ingerir_carpeta(args.carpeta, args.almacen, args.estabilidad):
+                momento = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                if resultado is None:
+                    print(f"[{momento}] {nombre}: no se pudo procesar (ver archivos_procesados.error)")
+                else:
+                    print(f"[{momento}] {nombre}: {resultado['nuevas']:,} llamadas nuevas "
+                          f"({resultado['clasificadas'] - resultado['nuevas']:,} ya estaban en el histórico)")
+            if args.una_vez:
+                break
+            time.sleep(args.intervalo)
+    except KeyboardInterrupt:
+        print("Ingesta detenida")
+
+if __name__ == "__main__":
+    main()
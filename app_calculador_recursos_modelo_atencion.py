@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 import io
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time
 import re
 import calendar
 import matplotlib.pyplot as plt
@@ -9,6 +9,10 @@ import matplotlib.dates as mdates
 import numpy as np
 import tempfile
 import os
+import hashlib
+import heapq
+import sqlite3
+from collections import deque
 from openpyxl.drawing.image import Image as XLImage
 from openpyxl.utils.dataframe import dataframe_to_rows
 
@@ -27,6 +31,105 @@ if 'process_clicked' not in st.session_state:
     st.session_state.process_clicked = False
 if 'excel_generado' not in st.session_state:
     st.session_state.excel_generado = None
+if 'excel_parametros' not in st.session_state:
+    st.session_state.excel_parametros = None
+if 'hash_archivo' not in st.session_state:
+    st.session_state.hash_archivo = None
+
+# Hojas requeridas y columnas que usa procesar_datos en cada una
+HOJAS_REQUERIDAS = ['FECHA DE CITA', 'FECHA DE REGISTRO', 'USUARIOS']
+COLUMNAS_POR_HOJA = {
+    'FECHA DE CITA': ['unidad funcional', 'estado cita', 'usuario registra', 'fecha cita',
+                      'hora inicio cita', 'hora final cita', 'profesional', 'centro de atencion'],
+    'FECHA DE REGISTRO': ['unidad funcional', 'usuario registra', 'fecha cita',
+                          'hora inicio cita', 'profesional', 'centro de atencion'],
+    'USUARIOS': ['usuario registra', 'rol']
+}
+COLUMNAS_CATEGORICAS = ['unidad funcional', 'estado cita', 'profesional', 'centro de atencion']
+
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
+
+# Ventana del día y tamaño de franja por defecto (minutos desde la medianoche)
+INTERVALOS_DISPONIBLES = [5, 10, 15, 30]
+MINUTO_INICIO_DEFECTO = 6 * 60 + 30
+MINUTO_FIN_DEFECTO = 19 * 60
+FRANJAS_DEFECTO = {
+    'minutos_intervalo': 5,
+    'minuto_inicio': MINUTO_INICIO_DEFECTO,
+    'minuto_fin': MINUTO_FIN_DEFECTO
+}
+
+# Almacén local de conteos base por período para comparar corridas
+RUTA_ALMACEN_PERIODOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historico_calculador_recursos.sqlite')
+
+# Parámetros de dimensionamiento por defecto
+PARAMETROS_DEFECTO = {
+    'minutos_por_admision': 2.5,
+    'pacientes_por_recurso': 1.72,
+    'factor_entrega_ordenes': 0.1
+}
+
+# Inicializar parámetros de dimensionamiento (controlados por los sliders)
+for nombre_parametro, valor_defecto in PARAMETROS_DEFECTO.items():
+    if nombre_parametro not in st.session_state:
+        st.session_state[nombre_parametro] = valor_defecto
+
+def obtener_parametros_sesion():
+    """
+    Obtiene los parámetros de dimensionamiento actuales desde session_state
+    """
+    return {nombre: st.session_state[nombre] for nombre in PARAMETROS_DEFECTO}
+
+# Inicializar ventana del día y tamaño de franja (controlados en la vista de resumen)
+if 'minutos_intervalo' not in st.session_state:
+    st.session_state.minutos_intervalo = FRANJAS_DEFECTO['minutos_intervalo']
+if 'hora_inicio_ventana' not in st.session_state:
+    st.session_state.hora_inicio_ventana = time(MINUTO_INICIO_DEFECTO // 60, MINUTO_INICIO_DEFECTO % 60)
+if 'hora_fin_ventana' not in st.session_state:
+    st.session_state.hora_fin_ventana = time(MINUTO_FIN_DEFECTO // 60, MINUTO_FIN_DEFECTO % 60)
+
+def obtener_franjas_sesion():
+    """
+    Obtiene el intervalo y la ventana del día actuales desde session_state, en minutos
+    """
+    return {
+        'minutos_intervalo': st.session_state.minutos_intervalo,
+        'minuto_inicio': st.session_state.hora_inicio_ventana.hour * 60 + st.session_state.hora_inicio_ventana.minute,
+        'minuto_fin': st.session_state.hora_fin_ventana.hour * 60 + st.session_state.hora_fin_ventana.minute
+    }
+
+def calcular_hash_archivo(contenido):
+    """
+    Calcula el hash del contenido del archivo cargado
+    """
+    return hashlib.md5(contenido).hexdigest()
+
+@st.cache_data(show_spinner=False)
+def cargar_hojas_excel(hash_archivo, _contenido):
+    """
+    Lee las hojas requeridas en una sola pasada sobre el archivo, dejando solo las columnas
+    que usa procesar_datos y asignando tipos categóricos. El resultado se cachea por hash_archivo.
+    Retorna (nombres de hojas, diccionario de DataFrames o None si faltan hojas)
+    """
+    excel_file = pd.ExcelFile(io.BytesIO(_contenido))
+    sheet_names = excel_file.sheet_names
+    
+    if any(sheet not in sheet_names for sheet in HOJAS_REQUERIDAS):
+        return sheet_names, None
+    
+    columnas_usadas = set().union(*COLUMNAS_POR_HOJA.values())
+    hojas = excel_file.parse(sheet_name=HOJAS_REQUERIDAS, usecols=lambda columna: columna in columnas_usadas)
+    
+    dfs = {}
+    for nombre_hoja, df in hojas.items():
+        columnas = [col for col in COLUMNAS_POR_HOJA[nombre_hoja] if col in df.columns]
+        df = df[columnas].copy()
+        for columna in COLUMNAS_CATEGORICAS:
+            if columna in df.columns:
+                df[columna] = df[columna].astype('category')
+        dfs[nombre_hoja] = df
+    
+    return sheet_names, dfs
 
 def convertir_a_hora(valor):
     """
@@ -94,46 +197,43 @@ def convertir_a_hora(valor):
     except Exception as e:
         return None
 
-def extraer_hora_de_fecha(fecha_datetime):
+def convertir_a_minutos(serie):
+    """
+    Convierte una columna de horas a minutos desde la medianoche (NaN si no es válida).
+    convertir_a_hora se evalúa una sola vez por cada valor distinto
+    """
+    mapa_minutos = {}
+    for valor in serie.dropna().unique():
+        hora_dt = convertir_a_hora(valor)
+        mapa_minutos[valor] = hora_dt.hour * 60 + hora_dt.minute if hora_dt is not None else np.nan
+    return serie.map(mapa_minutos).astype(float)
+
+def formatear_minutos(minutos):
     """
-    Extrae solo la hora de un objeto datetime
+    Convierte minutos desde la medianoche a texto 'HH:MM'
     """
-    if fecha_datetime is None:
+    if pd.isna(minutos):
         return None
-    return datetime(2000, 1, 1, fecha_datetime.hour, fecha_datetime.minute)
+    minutos = int(minutos)
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
 
-def redondear_hora_5_minutos(hora_str):
+def generar_tabla_horas(minutos_intervalo=5, minuto_inicio=MINUTO_INICIO_DEFECTO, minuto_fin=MINUTO_FIN_DEFECTO):
     """
-    Redondea una hora al siguiente intervalo de 5 minutos
+    Genera una tabla con las horas de la ventana del día (por defecto 06:30 a 19:00) cada minutos_intervalo.
+    La columna 'Minuto' tiene los minutos desde la medianoche de cada franja
     """
-    try:
-        if pd.isna(hora_str) or hora_str is None:
-            return None
-        hora_dt = datetime.strptime(hora_str, '%H:%M')
-        minutos = hora_dt.minute
-        # Redondear hacia arriba al siguiente múltiplo de 5
-        minutos_redondeados = ((minutos + 4) // 5) * 5
-        if minutos_redondeados >= 60:
-            hora_dt = hora_dt.replace(hour=hora_dt.hour + 1, minute=0)
-        else:
-            hora_dt = hora_dt.replace(minute=minutos_redondeados)
-        return hora_dt.strftime('%H:%M')
-    except:
-        return hora_str
+    minutos = np.arange(minuto_inicio, minuto_fin + 1, minutos_intervalo)
+    return pd.DataFrame({'Hora': [formatear_minutos(m) for m in minutos], 'Minuto': minutos})
 
-def generar_tabla_horas():
+def asignar_franja(minutos, minutos_intervalo, minuto_inicio, n_franjas):
     """
-    Genera una tabla con las horas desde 06:30 hasta 19:00 cada 5 minutos
+    Asigna a cada valor (minutos desde la medianoche) el índice de su franja, redondeando hacia
+    arriba al siguiente múltiplo del intervalo contado desde el inicio de la ventana.
+    Los valores inválidos o fuera de la ventana quedan en -1
     """
-    horas = []
-    hora_actual = datetime(2000, 1, 1, 6, 30)
-    hora_fin = datetime(2000, 1, 1, 19, 0)
-    
-    while hora_actual <= hora_fin:
-        horas.append(hora_actual.strftime('%H:%M'))
-        hora_actual += timedelta(minutes=5)
-    
-    return pd.DataFrame({'Hora': horas})
+    franja = np.ceil((np.asarray(minutos, dtype=float) - minuto_inicio) / minutos_intervalo)
+    valido = np.isfinite(franja) & (franja >= 0) & (franja < n_franjas)
+    return np.where(valido, franja, -1).astype(int)
 
 def contar_dias_mes(fecha):
     """
@@ -200,42 +300,13 @@ def procesar_datos(df_cita, df_registro, df_usuarios, unidades_seleccionadas):
     df_registro_filtrado['rol'] = df_registro_filtrado['usuario registra'].map(usuario_rol_map)
     df_registro_filtrado = df_registro_filtrado[df_registro_filtrado['rol'] == 'LF'].copy()
     
-    # Calcular hora ingreso a cita (hora inicio cita - 30 minutos) para FECHA DE CITA
-    def calcular_hora_ingreso(hora_valor):
-        try:
-            hora_dt = convertir_a_hora(hora_valor)
-            if hora_dt is None:
-                return None
-            hora_solo = extraer_hora_de_fecha(hora_dt)
-            if hora_solo is None:
-                return None
-            nueva_hora = hora_solo - timedelta(minutes=30)
-            return nueva_hora.strftime('%H:%M')
-        except Exception as e:
-            return None
-    
-    df_cita_filtrado['hora ingreso a cita'] = df_cita_filtrado['hora inicio cita'].apply(calcular_hora_ingreso)
-    
-    # Redondear hora ingreso a cita al siguiente intervalo de 5 minutos
-    df_cita_filtrado['hora ingreso redondeada'] = df_cita_filtrado['hora ingreso a cita'].apply(redondear_hora_5_minutos)
+    # Calcular hora ingreso a cita (hora inicio cita - 30 minutos) para FECHA DE CITA, en minutos desde la medianoche
+    df_cita_filtrado['minuto ingreso a cita'] = (convertir_a_minutos(df_cita_filtrado['hora inicio cita']) - 30) % (24 * 60)
+    df_cita_filtrado['hora ingreso a cita'] = df_cita_filtrado['minuto ingreso a cita'].apply(formatear_minutos)
     
-    # Redondear hora final cita para la columna "En cola entrega de ordenes"
-    df_cita_filtrado['hora final redondeada'] = df_cita_filtrado['hora final cita'].apply(redondear_hora_5_minutos)
-    
-    # Calcular hora entrega documentos
-    def convertir_hora_entrega(hora_valor):
-        try:
-            hora_dt = convertir_a_hora(hora_valor)
-            if hora_dt is None:
-                return None
-            hora_solo = extraer_hora_de_fecha(hora_dt)
-            if hora_solo is None:
-                return None
-            return hora_solo.strftime('%H:%M')
-        except Exception as e:
-            return None
-    
-    df_cita_filtrado['hora entrega documentos'] = df_cita_filtrado['hora final cita'].apply(convertir_hora_entrega)
+    # Calcular hora entrega documentos (hora final cita) para la columna "En cola entrega de ordenes"
+    df_cita_filtrado['minuto final cita'] = convertir_a_minutos(df_cita_filtrado['hora final cita'])
+    df_cita_filtrado['hora entrega documentos'] = df_cita_filtrado['minuto final cita'].apply(formatear_minutos)
     
     # Convertir fecha cita a datetime
     df_cita_filtrado['fecha_cita_dt'] = df_cita_filtrado['fecha cita'].apply(convertir_fecha)
@@ -249,8 +320,8 @@ def procesar_datos(df_cita, df_registro, df_usuarios, unidades_seleccionadas):
     df_cita_filtrado['año'] = df_cita_filtrado['fecha_cita_dt'].dt.year
     
     # Procesar FECHA DE REGISTRO para la columna "En cola asignación de citas"
-    # Redondear hora inicio cita para FECHA DE REGISTRO
-    df_registro_filtrado['hora inicio redondeada'] = df_registro_filtrado['hora inicio cita'].apply(redondear_hora_5_minutos)
+    # Hora inicio cita en minutos desde la medianoche para FECHA DE REGISTRO
+    df_registro_filtrado['minuto inicio cita'] = convertir_a_minutos(df_registro_filtrado['hora inicio cita'])
     
     # Convertir fecha cita a datetime para FECHA DE REGISTRO
     df_registro_filtrado['fecha_cita_dt'] = df_registro_filtrado['fecha cita'].apply(convertir_fecha)
@@ -261,40 +332,35 @@ def procesar_datos(df_cita, df_registro, df_usuarios, unidades_seleccionadas):
     
     return df_cita_filtrado, df_registro_filtrado
 
-def agregar_columnas_adicionales(df, unidades_seleccionadas):
+def agregar_columnas_adicionales(df, unidades_seleccionadas, parametros=None):
     """
-    Agrega las columnas de Tiempo atención, Total pacientes en cola, Total tiempo requerido y Recurso a necesidad
+    Agrega las columnas de Tiempo atención, Total pacientes en cola, Total tiempo requerido y Recurso a necesidad.
+    Las columnas derivadas son una transformación lineal de los conteos de admisiones, por lo que
+    se recalculan en bloque al cambiar los parámetros
     """
+    if parametros is None:
+        parametros = PARAMETROS_DEFECTO
     df_resultado = df.copy()
     
-    # 1. Agregar columnas de Tiempo atención para cada unidad
-    for unidad in unidades_seleccionadas:
+    # Matriz (horas x unidades) de conteos; las unidades sin columna cuentan como 0
+    conteos = np.zeros((len(df_resultado), len(unidades_seleccionadas)))
+    for i, unidad in enumerate(unidades_seleccionadas):
         columna_conteo = f'En cola de admisiones {unidad}'
-        columna_tiempo = f'Tiempo atención {unidad}'
         if columna_conteo in df_resultado.columns:
-            df_resultado[columna_tiempo] = df_resultado[columna_conteo] * 2.5
-        else:
-            df_resultado[columna_tiempo] = 0
-    
-    # 2. Agregar columna Total pacientes en cola (suma de todos los conteos)
-    columnas_conteo = [f'En cola de admisiones {unidad}' for unidad in unidades_seleccionadas if f'En cola de admisiones {unidad}' in df_resultado.columns]
-    if columnas_conteo:
-        df_resultado['Total pacientes en cola'] = df_resultado[columnas_conteo].sum(axis=1)
-    else:
-        df_resultado['Total pacientes en cola'] = 0
-    
-    # 3. Agregar columna Total tiempo requerido del segmento (suma de todos los tiempos)
-    columnas_tiempo = [f'Tiempo atención {unidad}' for unidad in unidades_seleccionadas if f'Tiempo atención {unidad}' in df_resultado.columns]
-    if columnas_tiempo:
-        df_resultado['Total tiempo requerido del segmento (mins)'] = df_resultado[columnas_tiempo].sum(axis=1)
-    else:
-        df_resultado['Total tiempo requerido del segmento (mins)'] = 0
-    
-    # 4. Agregar columna Recurso a necesidad (Total pacientes en cola / 1.72)
-    if 'Total pacientes en cola' in df_resultado.columns:
-        df_resultado['Recurso a necesidad'] = df_resultado['Total pacientes en cola'] / 1.72
-    else:
-        df_resultado['Recurso a necesidad'] = 0
+            conteos[:, i] = df_resultado[columna_conteo].to_numpy(dtype=float)
+    
+    # 1. Tiempo atención por unidad
+    tiempos = conteos * parametros['minutos_por_admision']
+    for i, unidad in enumerate(unidades_seleccionadas):
+        df_resultado[f'Tiempo atención {unidad}'] = tiempos[:, i]
+    
+    # 2. Total pacientes en cola y 3. Total tiempo requerido del segmento
+    total_pacientes = conteos.sum(axis=1)
+    df_resultado['Total pacientes en cola'] = total_pacientes
+    df_resultado['Total tiempo requerido del segmento (mins)'] = tiempos.sum(axis=1)
+    
+    # 4. Recurso a necesidad (Total pacientes en cola / pacientes por recurso)
+    df_resultado['Recurso a necesidad'] = total_pacientes / parametros['pacientes_por_recurso']
     
     return df_resultado
 
@@ -344,20 +410,11 @@ def generar_grafico_matplotlib(df, titulo, guardar=False, ruta=None):
         ax.set_ylabel('Recurso a necesidad', fontsize=11)
         ax.set_title(titulo, fontsize=13, fontweight='bold')
         
-        # Configurar ticks cada 30 minutos
-        tick_positions = []
-        tick_labels = []
-        hora_actual = datetime(2000, 1, 1, 6, 30)
-        hora_fin = datetime(2000, 1, 1, 19, 0)
-        
-        while hora_actual <= hora_fin:
-            hora_str = hora_actual.strftime('%H:%M')
-            tick_positions.append(hora_str)
-            tick_labels.append(hora_str)
-            hora_actual += timedelta(minutes=30)
+        # Configurar ticks cada 30 minutos (en punto y media hora)
+        tick_positions = [hora for hora in df_grafico['Hora'] if int(hora[-2:]) % 30 == 0]
         
         ax.set_xticks(tick_positions)
-        ax.set_xticklabels(tick_labels, rotation=45, ha='right', fontsize=9)
+        ax.set_xticklabels(tick_positions, rotation=45, ha='right', fontsize=9)
         
         ax.grid(True, alpha=0.3, linestyle='--')
         ax.set_axisbelow(True)
@@ -373,152 +430,356 @@ def generar_grafico_matplotlib(df, titulo, guardar=False, ruta=None):
         st.error(f"Error al generar gráfico: {str(e)}")
         return None
 
-def generar_tablas_resumen(df_cita_proc, df_registro_proc, unidades_seleccionadas):
+def acumular_pesos_por_franja(df, columna_minutos, franjas, n_franjas, unidades=None):
     """
-    Genera las tablas de resumen por día de la semana y promedio
+    Acumula en un arreglo denso (días, franjas[, unidades]) el peso (1 / días del mes con ese día
+    de la semana) de los registros únicos por llave (año-mes + profesional + centro de atención)
+    y franja, para cada día de la semana (y unidad funcional si se indican unidades)
+    """
+    n_dias = len(DIAS_SEMANA)
+    n_unidades = len(unidades) if unidades is not None else 1
+    
+    df = df.assign(franja=asignar_franja(df[columna_minutos], franjas['minutos_intervalo'],
+                                         franjas['minuto_inicio'], n_franjas))
+    df = df[(df['franja'] >= 0) & (df['dia_semana'] < n_dias)]
+    columnas_grupo = ['dia_semana', 'llave_unica', 'franja']
+    if unidades is not None:
+        df = df.assign(unidad_idx=pd.Categorical(df['unidad funcional'], categories=unidades).codes)
+        df = df[df['unidad_idx'] >= 0]
+        columnas_grupo.append('unidad_idx')
+    
+    df_unicos = df.drop_duplicates(subset=columnas_grupo)
+    pesos = 1 / df_unicos['fecha_cita_dt'].apply(contar_dias_mes).to_numpy(dtype=float)
+    
+    indice = df_unicos['dia_semana'].to_numpy(dtype=int) * n_franjas + df_unicos['franja'].to_numpy()
+    if unidades is not None:
+        indice = indice * n_unidades + df_unicos['unidad_idx'].to_numpy(dtype=int)
+    
+    acumulado = np.bincount(indice, weights=pesos, minlength=n_dias * n_franjas * n_unidades)
+    if unidades is not None:
+        return acumulado.reshape(n_dias, n_franjas, n_unidades)
+    return acumulado.reshape(n_dias, n_franjas)
+
+def agregar_llave_unica(df):
+    """
+    Agrega la llave única: año-mes + profesional + centro de atención
+    """
+    return df.assign(llave_unica=df['fecha_cita_dt'].dt.year.astype(str) + '-' +
+                                 df['fecha_cita_dt'].dt.month.astype(str) + '_' +
+                                 df['profesional'].astype(str) + '_' +
+                                 df['centro de atencion'].astype(str))
+
+def calcular_conteos_base(df_cita_proc, df_registro_proc, unidades_seleccionadas, franjas=None):
     """
-    dias_semana = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
-    df_base = generar_tabla_horas()
+    Calcula los conteos base por día de la semana x franja x unidad, independientes de los
+    parámetros de dimensionamiento:
+    - 'admisiones': (días, franjas, unidades) desde FECHA DE CITA por hora ingreso a cita
+    - 'entrega': (días, franjas) desde FECHA DE CITA por hora final, sin aplicar el factor
+    - 'asignacion': (días, franjas) desde FECHA DE REGISTRO por hora inicio, solo rol LF
+    franjas define el intervalo en minutos y la ventana del día (ver FRANJAS_DEFECTO)
+    """
+    if franjas is None:
+        franjas = FRANJAS_DEFECTO
+    df_tabla_horas = generar_tabla_horas(franjas['minutos_intervalo'], franjas['minuto_inicio'], franjas['minuto_fin'])
+    horas = df_tabla_horas['Hora'].tolist()
+    n_franjas = len(horas)
+    
+    df_cita_llave = agregar_llave_unica(df_cita_proc)
+    df_registro_llave = agregar_llave_unica(df_registro_proc)
+    
+    return {
+        'horas': horas,
+        'minutos': df_tabla_horas['Minuto'].to_numpy(),
+        'unidades': list(unidades_seleccionadas),
+        'minutos_intervalo': franjas['minutos_intervalo'],
+        'admisiones': acumular_pesos_por_franja(df_cita_llave, 'minuto ingreso a cita', franjas, n_franjas,
+                                                unidades=list(unidades_seleccionadas)),
+        'entrega': acumular_pesos_por_franja(df_cita_llave, 'minuto final cita', franjas, n_franjas),
+        'asignacion': acumular_pesos_por_franja(df_registro_llave, 'minuto inicio cita', franjas, n_franjas)
+    }
+
+def construir_tabla(horas, unidades, admisiones, entrega, asignacion, parametros):
+    """
+    Arma una tabla de resumen a partir de los conteos base de un día (o de su promedio)
+    """
+    df_resultado = pd.DataFrame({'Hora': horas})
+    for unidad_idx, unidad in enumerate(unidades):
+        df_resultado[f'En cola de admisiones {unidad}'] = admisiones[:, unidad_idx]
+    df_resultado['En cola entrega de ordenes'] = entrega * parametros['factor_entrega_ordenes']
+    df_resultado['En cola asignación de citas'] = asignacion
+    return agregar_columnas_adicionales(df_resultado, unidades, parametros)
+
+def construir_tablas_resumen(conteos_base, parametros=None):
+    """
+    Genera las tablas por día de la semana y el promedio desde los conteos base.
+    No vuelve a recorrer los registros, por lo que se puede llamar en cada cambio de parámetros
+    """
+    if parametros is None:
+        parametros = PARAMETROS_DEFECTO
+    horas = conteos_base['horas']
+    unidades = conteos_base['unidades']
     tablas = {}
     
-    for dia_idx, dia_nombre in enumerate(dias_semana):
-        # Filtrar por día de la semana para FECHA DE CITA
-        df_dia_cita = df_cita_proc[df_cita_proc['dia_semana'] == dia_idx].copy()
+    for dia_idx, dia_nombre in enumerate(DIAS_SEMANA):
+        tablas[dia_nombre] = construir_tabla(
+            horas, unidades,
+            conteos_base['admisiones'][dia_idx],
+            conteos_base['entrega'][dia_idx],
+            conteos_base['asignacion'][dia_idx],
+            parametros
+        )
+    
+    tablas['Promedio'] = construir_tabla(
+        horas, unidades,
+        conteos_base['admisiones'].mean(axis=0),
+        conteos_base['entrega'].mean(axis=0),
+        conteos_base['asignacion'].mean(axis=0),
+        parametros
+    )
+    
+    return tablas
+
+def generar_tablas_resumen(df_cita_proc, df_registro_proc, unidades_seleccionadas, parametros=None, franjas=None):
+    """
+    Genera las tablas de resumen por día de la semana y promedio
+    """
+    conteos_base = calcular_conteos_base(df_cita_proc, df_registro_proc, unidades_seleccionadas, franjas)
+    return construir_tablas_resumen(conteos_base, parametros)
+
+def simular_dia_cola(llegadas, servicios, limites, capacidades):
+    """
+    Simula un día de la cola de recepción (FIFO con varios recursos) con un bucle de eventos.
+    Las salidas se manejan en un heap; las llegadas y los cambios de franja se recorren en orden.
+    capacidades[j] es la cantidad de recursos después de pasar j límites de franja.
+    Retorna la espera de cada llegada en minutos
+    """
+    n = len(llegadas)
+    esperas = [0.0] * n
+    cola = deque()
+    salidas = []
+    ocupados = 0
+    i_llegada = 0
+    i_limite = 0
+    infinito = float('inf')
+    
+    while i_llegada < n or cola:
+        t_llegada = llegadas[i_llegada] if i_llegada < n else infinito
+        t_salida = salidas[0] if salidas else infinito
+        t_limite = limites[i_limite] if i_limite < len(limites) else infinito
+        
+        if t_salida <= t_llegada and t_salida <= t_limite:
+            t = heapq.heappop(salidas)
+            ocupados -= 1
+        elif t_limite <= t_llegada:
+            t = t_limite
+            i_limite += 1
+        else:
+            t = t_llegada
+            cola.append(i_llegada)
+            i_llegada += 1
+        
+        # Iniciar atención mientras haya recursos libres en la franja actual
+        capacidad = capacidades[i_limite]
+        while cola and ocupados < capacidad:
+            k = cola.popleft()
+            esperas[k] = t - llegadas[k]
+            ocupados += 1
+            heapq.heappush(salidas, t + servicios[k])
+    
+    return esperas
+
+def simular_cola_recepcion(horas, llegadas_esperadas, recursos_por_franja, minutos_atencion,
+                           n_dias=1000, minutos_franja=5, semilla=None):
+    """
+    Simula n_dias días sintéticos de la cola de admisiones para un vector de recursos por franja.
+    
+    - Las llegadas por franja siguen una Poisson con media llegadas_esperadas (la curva de
+      'Total pacientes en cola'), distribuidas uniformemente dentro de la franja; cada hora de
+      la tabla representa el intervalo que termina en ella, igual que el redondeo hacia arriba.
+    - El tiempo de atención es exponencial con media minutos_atencion.
+    - Las personas que esperan pasan a la siguiente franja; al cierre se mantiene la capacidad de
+      la última franja (mínimo 1 recurso) hasta vaciar la cola.
+    
+    Retorna un DataFrame por franja con llegadas promedio, recursos y percentiles de espera
+    """
+    rng = np.random.default_rng(semilla)
+    llegadas_esperadas = np.clip(np.asarray(llegadas_esperadas, dtype=float), 0, None)
+    recursos = np.maximum(np.asarray(recursos_por_franja, dtype=int), 0)
+    n_franjas = len(horas)
+    
+    # Muestreo vectorizado de todas las llegadas y tiempos de atención
+    conteos = rng.poisson(llegadas_esperadas, size=(n_dias, n_franjas))
+    franja_llegada = np.repeat(np.tile(np.arange(n_franjas), n_dias), conteos.ravel())
+    dia_llegada = np.repeat(np.arange(n_dias), conteos.sum(axis=1))
+    tiempo_llegada = (franja_llegada - 1 + rng.random(len(franja_llegada))) * minutos_franja
+    tiempo_atencion = rng.exponential(minutos_atencion, len(franja_llegada))
+    
+    orden = np.lexsort((tiempo_llegada, dia_llegada))
+    franja_llegada = franja_llegada[orden]
+    tiempo_llegada = tiempo_llegada[orden]
+    tiempo_atencion = tiempo_atencion[orden]
+    
+    limites = (np.arange(n_franjas) * minutos_franja).tolist()
+    capacidades = recursos.tolist() + [max(int(recursos[-1]), 1)]
+    
+    esperas = np.empty(len(tiempo_llegada))
+    cortes = np.concatenate([[0], np.cumsum(conteos.sum(axis=1))])
+    for dia in range(n_dias):
+        inicio, fin = cortes[dia], cortes[dia + 1]
+        if fin > inicio:
+            esperas[inicio:fin] = simular_dia_cola(
+                tiempo_llegada[inicio:fin].tolist(),
+                tiempo_atencion[inicio:fin].tolist(),
+                limites,
+                capacidades
+            )
+    
+    df_esperas = pd.DataFrame({'franja': franja_llegada, 'espera': esperas})
+    por_franja = df_esperas.groupby('franja')['espera']
+    # Sin llegadas (p. ej. un día sin registros) no hay esperas: percentiles en 0 para todas las franjas
+    cuantiles = [0.5, 0.9, 0.95]
+    percentiles = por_franja.quantile(cuantiles).unstack().reindex(index=range(n_franjas), columns=cuantiles).fillna(0)
+    
+    df_resultado = pd.DataFrame({
+        'Hora': horas,
+        'Llegadas promedio': conteos.mean(axis=0),
+        'Recursos': recursos,
+        'Espera promedio (min)': por_franja.mean().reindex(range(n_franjas)).fillna(0).to_numpy(),
+        'Espera P50 (min)': percentiles[0.5].to_numpy(),
+        'Espera P90 (min)': percentiles[0.9].to_numpy(),
+        'Espera P95 (min)': percentiles[0.95].to_numpy()
+    })
+    
+    return df_resultado
+
+def conectar_almacen(ruta=RUTA_ALMACEN_PERIODOS):
+    """
+    Abre el almacén SQLite de períodos y crea las tablas si no existen
+    """
+    conexion = sqlite3.connect(ruta)
+    conexion.execute("""
+        CREATE TABLE IF NOT EXISTS periodos (
+            periodo TEXT PRIMARY KEY,
+            minutos_intervalo INTEGER,
+            minuto_inicio INTEGER,
+            minuto_fin INTEGER,
+            unidades TEXT,
+            fecha_guardado TEXT
+        )
+    """)
+    conexion.execute("""
+        CREATE TABLE IF NOT EXISTS conteos_base (
+            periodo TEXT,
+            serie TEXT,
+            unidad TEXT,
+            dia_semana INTEGER,
+            franja INTEGER,
+            valor REAL
+        )
+    """)
+    conexion.execute("CREATE INDEX IF NOT EXISTS idx_conteos_periodo ON conteos_base (periodo)")
+    return conexion
+
+def guardar_periodo(periodo, conteos_base, franjas, ruta=RUTA_ALMACEN_PERIODOS):
+    """
+    Guarda (o reemplaza) los conteos base de una corrida en el almacén bajo la llave periodo
+    """
+    unidades = conteos_base['unidades']
+    n_dias, n_franjas = conteos_base['entrega'].shape
+    dia_idx, franja_idx = np.indices((n_dias, n_franjas))
+    
+    registros = []
+    for unidad_idx, unidad in enumerate(unidades):
+        registros.append(pd.DataFrame({'serie': 'admisiones', 'unidad': unidad, 'dia_semana': dia_idx.ravel(),
+                                       'franja': franja_idx.ravel(),
+                                       'valor': conteos_base['admisiones'][:, :, unidad_idx].ravel()}))
+    for serie in ['entrega', 'asignacion']:
+        registros.append(pd.DataFrame({'serie': serie, 'unidad': '', 'dia_semana': dia_idx.ravel(),
+                                       'franja': franja_idx.ravel(), 'valor': conteos_base[serie].ravel()}))
+    df_registros = pd.concat(registros, ignore_index=True)
+    df_registros.insert(0, 'periodo', periodo)
+    
+    conexion = conectar_almacen(ruta)
+    try:
+        with conexion:
+            conexion.execute("DELETE FROM conteos_base WHERE periodo = ?", (periodo,))
+            conexion.execute("DELETE FROM periodos WHERE periodo = ?", (periodo,))
+            conexion.execute(
+                "INSERT INTO periodos VALUES (?, ?, ?, ?, ?, ?)",
+                (periodo, int(franjas['minutos_intervalo']), int(franjas['minuto_inicio']), int(franjas['minuto_fin']),
+                 '|'.join(unidades), datetime.now().strftime('%Y-%m-%d %H:%M'))
+            )
+            df_registros.to_sql('conteos_base', conexion, if_exists='append', index=False)
+    finally:
+        conexion.close()
+
+def listar_periodos(ruta=RUTA_ALMACEN_PERIODOS):
+    """
+    Lista los períodos guardados en el almacén
+    """
+    if not os.path.exists(ruta):
+        return pd.DataFrame(columns=['periodo', 'minutos_intervalo', 'minuto_inicio', 'minuto_fin',
+                                     'unidades', 'fecha_guardado'])
+    conexion = conectar_almacen(ruta)
+    try:
+        return pd.read_sql_query("SELECT * FROM periodos ORDER BY periodo", conexion)
+    finally:
+        conexion.close()
+
+def cargar_periodos(periodos, ruta=RUTA_ALMACEN_PERIODOS):
+    """
+    Carga desde el almacén los conteos base de los períodos indicados.
+    Retorna un diccionario periodo -> conteos_base con la misma forma que calcular_conteos_base
+    """
+    if not periodos:
+        return {}
+    marcadores = ', '.join('?' * len(periodos))
+    conexion = conectar_almacen(ruta)
+    try:
+        df_periodos = pd.read_sql_query(f"SELECT * FROM periodos WHERE periodo IN ({marcadores})", conexion,
+                                        params=list(periodos))
+        df_conteos = pd.read_sql_query(f"SELECT * FROM conteos_base WHERE periodo IN ({marcadores})", conexion,
+                                       params=list(periodos))
+    finally:
+        conexion.close()
+    
+    resultado = {}
+    n_dias = len(DIAS_SEMANA)
+    for fila in df_periodos.itertuples(index=False):
+        df_tabla_horas = generar_tabla_horas(fila.minutos_intervalo, fila.minuto_inicio, fila.minuto_fin)
+        n_franjas = len(df_tabla_horas)
+        unidades = fila.unidades.split('|') if fila.unidades else []
+        df_periodo = df_conteos[df_conteos['periodo'] == fila.periodo]
         
-        # Filtrar por día de la semana para FECHA DE REGISTRO
-        df_dia_registro = df_registro_proc[df_registro_proc['dia_semana'] == dia_idx].copy()
+        conteos_base = {
+            'horas': df_tabla_horas['Hora'].tolist(),
+            'minutos': df_tabla_horas['Minuto'].to_numpy(),
+            'unidades': unidades,
+            'minutos_intervalo': fila.minutos_intervalo,
+            'admisiones': np.zeros((n_dias, n_franjas, len(unidades))),
+            'entrega': np.zeros((n_dias, n_franjas)),
+            'asignacion': np.zeros((n_dias, n_franjas))
+        }
         
-        # Crear tabla de resumen para este día
-        df_resultado = df_base.copy()
+        df_admisiones = df_periodo[df_periodo['serie'] == 'admisiones']
+        unidad_idx = pd.Categorical(df_admisiones['unidad'], categories=unidades).codes
+        conteos_base['admisiones'][df_admisiones['dia_semana'].to_numpy(), df_admisiones['franja'].to_numpy(),
+                                   unidad_idx] = df_admisiones['valor'].to_numpy()
+        for serie in ['entrega', 'asignacion']:
+            df_serie = df_periodo[df_periodo['serie'] == serie]
+            conteos_base[serie][df_serie['dia_semana'].to_numpy(), df_serie['franja'].to_numpy()] = df_serie['valor'].to_numpy()
         
-        # ============================================================
-        # 1. Calcular "En cola de admisiones" (desde FECHA DE CITA)
-        # ============================================================
-        for unidad in unidades_seleccionadas:
-            df_unidad = df_dia_cita[df_dia_cita['unidad funcional'] == unidad].copy()
-            
-            if len(df_unidad) > 0:
-                # Crear llave única combinando: mes + profesional + centro de atención
-                df_unidad['mes'] = df_unidad['fecha_cita_dt'].dt.month
-                df_unidad['año'] = df_unidad['fecha_cita_dt'].dt.year
-                df_unidad['llave_unica'] = df_unidad['año'].astype(str) + '-' + \
-                                           df_unidad['mes'].astype(str) + '_' + \
-                                           df_unidad['profesional'].astype(str) + '_' + \
-                                           df_unidad['centro de atencion'].astype(str)
-                
-                df_unicos = df_unidad.drop_duplicates(subset=['llave_unica', 'hora ingreso redondeada'])
-                df_unicos['dias_mes'] = df_unicos['fecha_cita_dt'].apply(contar_dias_mes)
-                df_unicos['peso_registro'] = 1 / df_unicos['dias_mes']
-                
-                df_horas = df_unicos.groupby('hora ingreso redondeada')['peso_registro'].sum().reset_index()
-                
-                df_resultado[f'En cola de admisiones {unidad}'] = df_resultado['Hora'].map(
-                    dict(zip(df_horas['hora ingreso redondeada'], df_horas['peso_registro']))
-                ).fillna(0)
-            else:
-                df_resultado[f'En cola de admisiones {unidad}'] = 0
-        
-        # ============================================================
-        # 2. Calcular "En cola entrega de ordenes" (desde FECHA DE CITA, hora final cita * 0.1)
-        # ============================================================
-        if len(df_dia_cita) > 0:
-            # Crear llave única para entrega de órdenes
-            df_dia_cita['mes'] = df_dia_cita['fecha_cita_dt'].dt.month
-            df_dia_cita['año'] = df_dia_cita['fecha_cita_dt'].dt.year
-            df_dia_cita['llave_unica'] = df_dia_cita['año'].astype(str) + '-' + \
-                                         df_dia_cita['mes'].astype(str) + '_' + \
-                                         df_dia_cita['profesional'].astype(str) + '_' + \
-                                         df_dia_cita['centro de atencion'].astype(str)
-            
-            df_unicos_entrega = df_dia_cita.drop_duplicates(subset=['llave_unica', 'hora final redondeada'])
-            df_unicos_entrega['dias_mes'] = df_unicos_entrega['fecha_cita_dt'].apply(contar_dias_mes)
-            df_unicos_entrega['peso_registro'] = 1 / df_unicos_entrega['dias_mes']
-            
-            # Agrupar por hora final redondeada
-            df_horas_entrega = df_unicos_entrega.groupby('hora final redondeada')['peso_registro'].sum().reset_index()
-            
-            # Calcular el 10% (multiplicar por 0.1)
-            df_horas_entrega['peso_registro'] = df_horas_entrega['peso_registro'] * 0.1
-            
-            # Mapear a las horas
-            df_resultado['En cola entrega de ordenes'] = df_resultado['Hora'].map(
-                dict(zip(df_horas_entrega['hora final redondeada'], df_horas_entrega['peso_registro']))
-            ).fillna(0)
-        else:
-            df_resultado['En cola entrega de ordenes'] = 0
-        
-        # ============================================================
-        # 3. Calcular "En cola asignación de citas" (desde FECHA DE REGISTRO, solo rol LF)
-        # ============================================================
-        if len(df_dia_registro) > 0:
-            # Crear llave única para asignación de citas
-            df_dia_registro['mes'] = df_dia_registro['fecha_cita_dt'].dt.month
-            df_dia_registro['año'] = df_dia_registro['fecha_cita_dt'].dt.year
-            df_dia_registro['llave_unica'] = df_dia_registro['año'].astype(str) + '-' + \
-                                             df_dia_registro['mes'].astype(str) + '_' + \
-                                             df_dia_registro['profesional'].astype(str) + '_' + \
-                                             df_dia_registro['centro de atencion'].astype(str)
-            
-            df_unicos_asignacion = df_dia_registro.drop_duplicates(subset=['llave_unica', 'hora inicio redondeada'])
-            df_unicos_asignacion['dias_mes'] = df_unicos_asignacion['fecha_cita_dt'].apply(contar_dias_mes)
-            df_unicos_asignacion['peso_registro'] = 1 / df_unicos_asignacion['dias_mes']
-            
-            # Agrupar por hora inicio redondeada
-            df_horas_asignacion = df_unicos_asignacion.groupby('hora inicio redondeada')['peso_registro'].sum().reset_index()
-            
-            # Mapear a las horas
-            df_resultado['En cola asignación de citas'] = df_resultado['Hora'].map(
-                dict(zip(df_horas_asignacion['hora inicio redondeada'], df_horas_asignacion['peso_registro']))
-            ).fillna(0)
-        else:
-            df_resultado['En cola asignación de citas'] = 0
-        
-        # Agregar columnas adicionales (Tiempo atención, Total pacientes en cola, etc.)
-        df_resultado = agregar_columnas_adicionales(df_resultado, unidades_seleccionadas)
-        tablas[dia_nombre] = df_resultado
-    
-    # ============================================================
-    # Generar tabla de Promedio
-    # ============================================================
-    df_promedio = df_base.copy()
-    
-    # Para cada unidad, calcular promedio de "En cola de admisiones"
-    for unidad in unidades_seleccionadas:
-        columna = f'En cola de admisiones {unidad}'
-        valores = []
-        for dia in dias_semana:
-            if dia in tablas and columna in tablas[dia].columns:
-                valores.append(tablas[dia][columna])
-        if valores:
-            df_promedio[columna] = sum(valores) / len(valores)
-        else:
-            df_promedio[columna] = 0
-    
-    # Promedio de "En cola entrega de ordenes"
-    valores_entrega = []
-    for dia in dias_semana:
-        if dia in tablas and 'En cola entrega de ordenes' in tablas[dia].columns:
-            valores_entrega.append(tablas[dia]['En cola entrega de ordenes'])
-    if valores_entrega:
-        df_promedio['En cola entrega de ordenes'] = sum(valores_entrega) / len(valores_entrega)
-    else:
-        df_promedio['En cola entrega de ordenes'] = 0
-    
-    # Promedio de "En cola asignación de citas"
-    valores_asignacion = []
-    for dia in dias_semana:
-        if dia in tablas and 'En cola asignación de citas' in tablas[dia].columns:
-            valores_asignacion.append(tablas[dia]['En cola asignación de citas'])
-    if valores_asignacion:
-        df_promedio['En cola asignación de citas'] = sum(valores_asignacion) / len(valores_asignacion)
-    else:
-        df_promedio['En cola asignación de citas'] = 0
-    
-    # Agregar columnas adicionales al promedio
-    df_promedio = agregar_columnas_adicionales(df_promedio, unidades_seleccionadas)
-    tablas['Promedio'] = df_promedio
+        resultado[fila.periodo] = conteos_base
     
-    return tablas
+    return resultado
+
+def periodo_predominante(df_cita_proc):
+    """
+    Sugiere la llave del período (AAAA-MM) según el mes con más citas
+    """
+    if df_cita_proc.empty:
+        return datetime.now().strftime('%Y-%m')
+    return df_cita_proc['fecha_cita_dt'].dt.strftime('%Y-%m').mode().iloc[0]
 
 def exportar_excel_con_graficos(tablas, df_cita_proc):
     """
@@ -593,19 +854,19 @@ uploaded_file = st.file_uploader(
 
 if uploaded_file is not None:
     try:
-        excel_file = pd.ExcelFile(uploaded_file)
-        sheet_names = excel_file.sheet_names
+        contenido = uploaded_file.getvalue()
+        hash_archivo = calcular_hash_archivo(contenido)
+        sheet_names, dfs_cargados = cargar_hojas_excel(hash_archivo, contenido)
         
-        required_sheets = ['FECHA DE CITA', 'FECHA DE REGISTRO', 'USUARIOS']
-        missing_sheets = [sheet for sheet in required_sheets if sheet not in sheet_names]
+        missing_sheets = [sheet for sheet in HOJAS_REQUERIDAS if sheet not in sheet_names]
         
         if missing_sheets:
             st.error(f"❌ Faltan las siguientes hojas en el archivo: {', '.join(missing_sheets)}")
             st.info(f"Hojas encontradas: {', '.join(sheet_names)}")
         else:
-            df_cita = pd.read_excel(uploaded_file, sheet_name='FECHA DE CITA')
-            df_registro = pd.read_excel(uploaded_file, sheet_name='FECHA DE REGISTRO')
-            df_usuarios = pd.read_excel(uploaded_file, sheet_name='USUARIOS')
+            df_cita = dfs_cargados['FECHA DE CITA']
+            df_registro = dfs_cargados['FECHA DE REGISTRO']
+            df_usuarios = dfs_cargados['USUARIOS']
             
             st.session_state.dfs = {
                 'FECHA DE CITA': df_cita,
@@ -613,7 +874,10 @@ if uploaded_file is not None:
                 'USUARIOS': df_usuarios
             }
             st.session_state.data_loaded = True
-            st.session_state.process_clicked = False
+            # Solo se descarta el procesamiento anterior cuando cambia el archivo
+            if st.session_state.hash_archivo != hash_archivo:
+                st.session_state.hash_archivo = hash_archivo
+                st.session_state.process_clicked = False
             
             st.success("✅ Archivo cargado correctamente")
             
@@ -653,17 +917,25 @@ if uploaded_file is not None:
                                 df_cita, df_registro, df_usuarios, unidades_seleccionadas
                             )
                             
-                            tablas_resumen = generar_tablas_resumen(
-                                df_cita_proc, df_registro_proc, unidades_seleccionadas
+                            franjas = obtener_franjas_sesion()
+                            if franjas['minuto_fin'] <= franjas['minuto_inicio']:
+                                franjas = FRANJAS_DEFECTO
+                            conteos_base = calcular_conteos_base(
+                                df_cita_proc, df_registro_proc, unidades_seleccionadas, franjas
                             )
+                            parametros = obtener_parametros_sesion()
+                            tablas_resumen = construir_tablas_resumen(conteos_base, parametros)
                             
                             st.session_state.dfs_procesados = {
+                                'FRANJAS': franjas,
+                                'CONTEOS_BASE': conteos_base,
                                 'TABLAS': tablas_resumen,
                                 'CITA_PROCESADA': df_cita_proc,
                                 'REGISTRO_PROCESADO': df_registro_proc
                             }
                             st.session_state.process_clicked = True
                             st.session_state.unidades_seleccionadas = unidades_seleccionadas
+                            st.session_state.resultado_simulacion = None
                             
                             # Generar Excel y guardar en session_state
                             with st.spinner("Generando archivo Excel con gráficos..."):
@@ -672,6 +944,7 @@ if uploaded_file is not None:
                                     df_cita_proc
                                 )
                                 st.session_state.excel_generado = excel_output
+                                st.session_state.excel_parametros = {**parametros, **franjas}
                     
     except Exception as e:
         st.error(f"❌ Error al leer el archivo: {str(e)}")
@@ -687,12 +960,53 @@ if st.session_state.process_clicked and st.session_state.data_loaded:
         with col1:
             st.write(f"**Unidades Funcionales:** {', '.join(st.session_state.unidades_seleccionadas)}")
         
+        st.subheader("⚙️ Parámetros de Dimensionamiento")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.slider("Minutos por admisión", min_value=0.5, max_value=10.0, step=0.1,
+                      key='minutos_por_admision')
+        with col2:
+            st.slider("Pacientes por recurso", min_value=0.5, max_value=5.0, step=0.01,
+                      key='pacientes_por_recurso')
+        with col3:
+            st.slider("Factor entrega de órdenes", min_value=0.0, max_value=1.0, step=0.01,
+                      key='factor_entrega_ordenes')
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.selectbox("Tamaño de franja (minutos)", options=INTERVALOS_DISPONIBLES, key='minutos_intervalo')
+        with col2:
+            st.time_input("Inicio de la ventana", step=timedelta(minutes=5), key='hora_inicio_ventana')
+        with col3:
+            st.time_input("Fin de la ventana", step=timedelta(minutes=5), key='hora_fin_ventana')
+        
+        parametros = obtener_parametros_sesion()
+        franjas = obtener_franjas_sesion()
+        if franjas['minuto_fin'] <= franjas['minuto_inicio']:
+            st.error("❌ El fin de la ventana debe ser posterior al inicio; se usa la ventana anterior")
+            franjas = st.session_state.dfs_procesados['FRANJAS']
+        
+        # Al cambiar la franja solo se reacumulan los conteos base desde los datos ya procesados
+        if st.session_state.dfs_procesados['FRANJAS'] != franjas:
+            st.session_state.dfs_procesados['CONTEOS_BASE'] = calcular_conteos_base(
+                st.session_state.dfs_procesados['CITA_PROCESADA'],
+                st.session_state.dfs_procesados['REGISTRO_PROCESADO'],
+                st.session_state.unidades_seleccionadas,
+                franjas
+            )
+            st.session_state.dfs_procesados['FRANJAS'] = franjas
+            st.session_state.resultado_simulacion = None
+        
+        conteos_base = st.session_state.dfs_procesados['CONTEOS_BASE']
+        
         st.header("📊 Tablas de Resumen")
         
-        tablas = st.session_state.dfs_procesados['TABLAS']
+        # Las tablas se recalculan desde los conteos base con los parámetros actuales
+        tablas = construir_tablas_resumen(conteos_base, parametros)
+        st.session_state.dfs_procesados['TABLAS'] = tablas
         
         # Crear pestañas: Lunes a Viernes y Promedio
-        nombres_tabs = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Promedio']
+        nombres_tabs = DIAS_SEMANA + ['Promedio']
         tabs = st.tabs(nombres_tabs)
         
         for i, tab in enumerate(tabs):
@@ -740,12 +1054,105 @@ if st.session_state.process_clicked and st.session_state.data_loaded:
                     st.pyplot(fig)
                     plt.close(fig)
         
+        # Simulación de la cola de recepción
+        st.divider()
+        st.subheader("🧪 Simulación de Cola de Recepción")
+        st.write("Simula días sintéticos con las llegadas de la tabla seleccionada para estimar la espera por franja, "
+                 "considerando que los pacientes que no alcanzan a ser atendidos pasan a la siguiente franja.")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            tabla_simulacion = st.selectbox("Tabla de llegadas", options=nombres_tabs, key='tabla_simulacion')
+        with col2:
+            n_dias_simulacion = st.number_input("Días a simular", min_value=20, max_value=5000, value=1000, step=100)
+        with col3:
+            recursos_adicionales = st.number_input(
+                "Recursos adicionales por franja", min_value=-5, max_value=20, value=0, step=1,
+                help="Se suman a la necesidad estimada (Recurso a necesidad redondeado hacia arriba)"
+            )
+        
+        if st.button("▶️ Simular", use_container_width=True):
+            df_tabla = tablas[tabla_simulacion]
+            recursos_por_franja = np.maximum(
+                np.ceil(df_tabla['Recurso a necesidad'].to_numpy()) + recursos_adicionales, 0
+            )
+            with st.spinner("Simulando..."):
+                st.session_state.resultado_simulacion = simular_cola_recepcion(
+                    df_tabla['Hora'].tolist(),
+                    df_tabla['Total pacientes en cola'].to_numpy(),
+                    recursos_por_franja,
+                    parametros['minutos_por_admision'],
+                    n_dias=int(n_dias_simulacion),
+                    minutos_franja=conteos_base['minutos_intervalo']
+                )
+                st.session_state.tabla_simulada = tabla_simulacion
+        
+        if st.session_state.get('resultado_simulacion') is not None:
+            df_simulacion = st.session_state.resultado_simulacion
+            st.caption(f"Resultado para: {st.session_state.tabla_simulada}")
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Espera P90 máxima (min)", f"{df_simulacion['Espera P90 (min)'].max():.1f}")
+            with col2:
+                hora_critica = df_simulacion.loc[df_simulacion['Espera P90 (min)'].idxmax(), 'Hora']
+                st.metric("Franja crítica", hora_critica)
+            with col3:
+                st.metric("Recursos máximos", f"{df_simulacion['Recursos'].max():.0f}")
+            
+            fig, ax = plt.subplots(figsize=(14, 5))
+            for columna, color in [('Espera P50 (min)', '#2A9D8F'), ('Espera P90 (min)', '#E9C46A'),
+                                   ('Espera P95 (min)', '#E84A5F')]:
+                ax.plot(df_simulacion['Hora'], df_simulacion[columna], linewidth=2, color=color, label=columna)
+            ax.set_xlabel('Hora', fontsize=11)
+            ax.set_ylabel('Espera (min)', fontsize=11)
+            ax.set_title('Espera simulada por franja', fontsize=13, fontweight='bold')
+            ax.set_xticks([hora for hora in df_simulacion['Hora'] if int(hora[-2:]) % 30 == 0])
+            ax.tick_params(axis='x', rotation=45, labelsize=9)
+            ax.grid(True, alpha=0.3, linestyle='--')
+            ax.legend()
+            plt.tight_layout()
+            st.pyplot(fig)
+            plt.close(fig)
+            
+            st.dataframe(df_simulacion, use_container_width=True, height=400)
+        
+        # Guardar la corrida en el histórico de períodos
+        st.divider()
+        st.subheader("💾 Guardar en Histórico de Períodos")
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            periodo_guardar = st.text_input(
+                "Período", value=periodo_predominante(st.session_state.dfs_procesados['CITA_PROCESADA']),
+                help="Llave con la que se guardan los conteos base; si ya existe se reemplaza"
+            )
+        with col2:
+            st.write("")
+            st.write("")
+            if st.button("💾 Guardar período", use_container_width=True):
+                if not periodo_guardar.strip():
+                    st.error("❌ Debes indicar el período")
+                else:
+                    guardar_periodo(periodo_guardar.strip(), conteos_base, franjas)
+                    st.success(f"✅ Período {periodo_guardar.strip()} guardado")
+        
         # Botón de descarga
         st.divider()
         st.subheader("📥 Descargar Tablas de Resumen con Gráficos")
         
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
+            configuracion = {**parametros, **franjas}
+            if st.session_state.excel_generado is not None and st.session_state.excel_parametros != configuracion:
+                st.warning("⚠️ El Excel fue generado con otros parámetros de dimensionamiento")
+                if st.button("🔄 Regenerar Excel con los parámetros actuales", use_container_width=True):
+                    with st.spinner("Generando archivo Excel con gráficos..."):
+                        st.session_state.excel_generado = exportar_excel_con_graficos(
+                            tablas,
+                            st.session_state.dfs_procesados['CITA_PROCESADA']
+                        )
+                        st.session_state.excel_parametros = configuracion
+                    st.rerun()
             if st.session_state.excel_generado is not None:
                 st.download_button(
                     label="📥 Descargar Excel con Gráficos",
@@ -762,3 +1169,56 @@ elif st.session_state.data_loaded and not st.session_state.process_clicked:
 
 else:
     st.info("📂 Por favor, carga un archivo Excel para comenzar")
+
+# Comparación de períodos guardados (solo lee los conteos base del histórico)
+df_periodos_guardados = listar_periodos()
+if not df_periodos_guardados.empty:
+    st.divider()
+    st.header("📅 Comparación de Períodos")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        periodos_comparar = st.multiselect(
+            "Períodos a comparar:",
+            options=df_periodos_guardados['periodo'].tolist(),
+            default=df_periodos_guardados['periodo'].tolist()[-2:]
+        )
+    with col2:
+        tabla_comparar = st.selectbox("Día", options=DIAS_SEMANA + ['Promedio'], key='tabla_comparar')
+    with col3:
+        columna_comparar = st.selectbox(
+            "Indicador",
+            options=['Recurso a necesidad', 'Total pacientes en cola',
+                     'En cola entrega de ordenes', 'En cola asignación de citas']
+        )
+    
+    if periodos_comparar:
+        parametros_comparar = obtener_parametros_sesion()
+        conteos_periodos = cargar_periodos(periodos_comparar)
+        
+        fig, ax = plt.subplots(figsize=(14, 5))
+        for periodo in periodos_comparar:
+            conteos_periodo = conteos_periodos[periodo]
+            df_periodo = construir_tablas_resumen(conteos_periodo, parametros_comparar)[tabla_comparar]
+            ax.plot(conteos_periodo['minutos'], df_periodo[columna_comparar], linewidth=2, marker='o',
+                    markersize=3, label=periodo)
+        
+        minutos_ticks = np.arange(0, 24 * 60 + 1, 30)
+        minuto_min = min(conteos_periodos[p]['minutos'].min() for p in periodos_comparar)
+        minuto_max = max(conteos_periodos[p]['minutos'].max() for p in periodos_comparar)
+        minutos_ticks = minutos_ticks[(minutos_ticks >= minuto_min) & (minutos_ticks <= minuto_max)]
+        ax.set_xticks(minutos_ticks)
+        ax.set_xticklabels([formatear_minutos(m) for m in minutos_ticks], rotation=45, ha='right', fontsize=9)
+        ax.set_xlabel('Hora', fontsize=11)
+        ax.set_ylabel(columna_comparar, fontsize=11)
+        ax.set_title(f"{tabla_comparar} - {columna_comparar} por período", fontsize=13, fontweight='bold')
+        ax.grid(True, alpha=0.3, linestyle='--')
+        ax.legend()
+        plt.tight_layout()
+        st.pyplot(fig)
+        plt.close(fig)
+        
+        st.dataframe(
+            df_periodos_guardados[df_periodos_guardados['periodo'].isin(periodos_comparar)],
+            use_container_width=True
+        )
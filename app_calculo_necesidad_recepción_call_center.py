@@ -3,8 +3,18 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import io
+import os
+import json
+import hashlib
+import joblib
+from joblib import Parallel, delayed
 from fpdf import FPDF
-from sklearn.model_selection import train_test_split
+from almacen_llamadas import (
+    CODIGOS_POR_EMPRESA, COLUMNAS_CDR, TAMANO_BLOQUE_CSV, MINUTOS_FRANJA_BASE, FRANJAS_BASE,
+    calcular_hash_archivo, detectar_formato_call_time, clasificar_bloque_llamadas, tipar_conteos,
+    agregar_archivo_almacen, registrar_archivo_procesado, rango_fechas_almacen, consultar_almacen_llamadas
+)
+from sklearn.model_selection import TimeSeriesSplit
 from sklearn.linear_model import LinearRegression
 from sklearn.neural_network import MLPRegressor
 from sklearn.ensemble import GradientBoostingRegressor
@@ -21,35 +31,45 @@ st.markdown("Carga un archivo CSV con registros de llamadas para analizar demand
 
 # Constante para el cálculo de recursos
 CONSTANTE_VALIDACION = 14.08
-CONSTANTE_DEMANDA_A_RECURSOS = 3.0
 
-# Diccionario de códigos de extensión por empresa
-CODIGOS_POR_EMPRESA = {
-    'UDC': [
-        '(0220)', '(0221)', '(0222)', '(0303)', '(0305)', '(0308)', '(0316)', '(0320)', 
-        '(0323)', '(0324)', '(0327)', '(0331)', '(0404)', '(0407)', '(0410)', '(0412)', 
-        '(0413)', '(0414)', '(0415)', '(0417)', '(8062)', '(8063)', '(8064)', '(8072)', 
-        '(8080)'
-    ],
-    'ODO': [
-        '(2001)', '(2002)', '(2003)', '(2004)', '(2005)', '(2006)', '(2007)', '(2008)', 
-        '(2009)', '(2010)', '(2011)', '(2012)', '(2013)', '(2014)', '(2015)', '(2016)', 
-        '(2017)', '(2018)', '(2019)', '(2021)', '(2022)', '(2023)', '(2024)', '(2025)', 
-        '(2026)', '(2032)', '(2034)', '(8000)', '(8002)', '(8003)', '(8071)', '(8079)'
-    ],
-    'CCB': [
-        '(2028)', '(2029)', '(2030)', '(2035)', '(8051)', '(8052)'
-    ]
+# Objetivos de servicio por defecto para el dimensionamiento con Erlang C
+# (tiempo de atención equivalente a CONSTANTE_VALIDACION llamadas por persona y hora; 80% en 20 s; sin límite de ASA)
+PARAMETROS_ERLANG_DEFECTO = {
+    'minutos_atencion': round(60 / CONSTANTE_VALIDACION, 2),
+    'nivel_servicio': 0.8,
+    'segundos_objetivo': 20,
+    'asa_maxima': 0
 }
 
-# Lista completa de códigos que representan extensiones internas
-CODIGOS_EXTENSION = []
-for empresa, codigos in CODIGOS_POR_EMPRESA.items():
-    CODIGOS_EXTENSION.extend(codigos)
+# Parámetros de los modelos de predicción (forman parte de la llave del registro de modelos)
+PARAMETROS_MODELOS = {
+    'n_particiones': 5,
+    'random_state': 42,
+    'mlp': {'hidden_layer_sizes': (50, 25), 'max_iter': 500, 'early_stopping': True, 'validation_fraction': 0.1},
+    'mlp_min_train': 100,
+    'gb': {'max_depth': 3},
+    'gb_n_estimators': (10, 50),
+    'cuantiles': (0.5, 0.9)
+}
+
+# Características de calendario con las que se entrenan y consultan los modelos
+CARACTERISTICAS_PREDICCION = ['Dia_Semana_Num', 'Hora', 'Mes', 'Dia_Mes', 'Semana_Mes']
+
+# Registro local de modelos entrenados (joblib) y su tamaño máximo en disco
+RUTA_REGISTRO_MODELOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'registro_modelos')
+TAMANO_MAXIMO_REGISTRO_MB = 200
+
+# Días de la semana en español, en el orden de dayofweek (0=Lunes)
+ORDEN_DIAS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+DIAS_LABORALES = ORDEN_DIAS[:5]
+DIAS_CON_RECURSOS = DIAS_LABORALES + ['Todos']
 
 # Horas para ingresar recursos (6:00 a 19:00)
 HORAS_DISPONIBLES = list(range(6, 20))  # 6:00 a 19:00
 
+# Intervalos de análisis: los conteos se guardan en franjas base (MINUTOS_FRANJA_BASE) y se agregan al intervalo elegido
+INTERVALOS_DISPONIBLES = [60, 30, 15]
+
 # Sidebar para cargar el archivo
 with st.sidebar:
     st.header("Cargar Datos")
@@ -60,125 +80,313 @@ with st.sidebar:
     st.markdown("""
     1. Sube un archivo CSV con registros de llamadas
     2. Selecciona las empresas a filtrar
-    3. Ingresa los recursos disponibles por hora (6:00-19:00)
-    4. La app calculará la demanda promedio por hora y día
+    3. Ingresa los recursos disponibles por hora o intervalo (6:00-19:00)
+    4. La app calculará la demanda promedio por intervalo y día
     5. **Filtro aplicado**: Llamadas externas → internas
     6. Compara demanda vs recursos en la gráfica
     7. Analiza los resultados
     """)
 
-# Función para traducir días de la semana
-def traducir_dia(dia_ingles):
-    dias_traduccion = {
-        'Monday': 'Lunes',
-        'Tuesday': 'Martes',
-        'Wednesday': 'Miércoles',
-        'Thursday': 'Jueves',
-        'Friday': 'Viernes',
-        'Saturday': 'Sábado',
-        'Sunday': 'Domingo'
-    }
-    return dias_traduccion.get(dia_ingles, dia_ingles)
+# Función para obtener el intervalo de análisis de la sesión
+def obtener_minutos_intervalo():
+    """
+    Retorna los minutos del intervalo de análisis elegido (60 si aún no se elige)
+    """
+    return st.session_state.get('minutos_intervalo', 60)
 
-# Función para determinar si un número es extensión interna y a qué empresa pertenece
-def obtener_empresa_extension(numero):
+# Función para obtener la capacidad de un recurso en un intervalo
+def capacidad_por_recurso(minutos_intervalo=60):
     """
-    Determina si un número contiene algún código de extensión interna
-    y a qué empresa pertenece
+    Retorna las llamadas que atiende un recurso en el intervalo (CONSTANTE_VALIDACION es por hora)
     """
-    if pd.isna(numero):
-        return None
-    
-    numero_str = str(numero)
-    for empresa, codigos in CODIGOS_POR_EMPRESA.items():
-        for extension in codigos:
-            if extension in numero_str:
-                return empresa
-    return None
+    return CONSTANTE_VALIDACION * minutos_intervalo / 60
+
+# Función para nombrar el intervalo en los textos de la interfaz
+def nombre_intervalo(minutos_intervalo=60):
+    """
+    Retorna "Hora" para intervalos de 60 minutos o "Franja de N min" para intervalos menores
+    """
+    return "Hora" if minutos_intervalo == 60 else f"Franja de {minutos_intervalo} min"
+
+# Función para generar las etiquetas de las franjas del día
+def etiquetas_franjas(minutos_intervalo=60):
+    """
+    Retorna las etiquetas "HH:MM" de inicio de cada franja del día para el intervalo dado
+    """
+    return [f"{minuto // 60:02d}:{minuto % 60:02d}" for minuto in range(0, 1440, minutos_intervalo)]
+
+# Función para obtener las franjas en las que se ingresan recursos
+def franjas_con_recursos(minutos_intervalo=60):
+    """
+    Retorna los índices de las franjas del intervalo dado que inician dentro de HORAS_DISPONIBLES
+    """
+    return [franja for franja in range(1440 // minutos_intervalo)
+            if (franja * minutos_intervalo) // 60 in HORAS_DISPONIBLES]
 
 # Función para ingresar recursos por hora
-def ingresar_recursos_por_hora():
+def ingresar_recursos_por_hora(minutos_intervalo=60):
     """
-    Muestra un formulario para ingresar la cantidad de recursos disponibles por hora
+    Muestra un formulario para ingresar la cantidad de recursos disponibles por hora o por
+    franja del intervalo elegido. Retorna un diccionario {franja: recursos}
     """
     recursos = {}
+    etiquetas = etiquetas_franjas(minutos_intervalo)
     
-    # Crear 3 columnas para organizar las horas
-    col1, col2, col3 = st.columns(3)
+    # Repartir las franjas en 3 columnas
+    for columna, franjas in zip(st.columns(3), np.array_split(franjas_con_recursos(minutos_intervalo), 3)):
+        with columna:
+            for franja in franjas:
+                recursos[int(franja)] = st.number_input(
+                    etiquetas[franja],
+                    min_value=0,
+                    max_value=100,
+                    value=1,
+                    key=f"recurso_{franja * minutos_intervalo}"
+                )
     
-    with col1:
-        for hora in HORAS_DISPONIBLES[:5]:  # 6:00 - 10:00
-            recursos[hora] = st.number_input(
-                f"{hora}:00",
-                min_value=0,
-                max_value=100,
-                value=1,
-                key=f"recurso_{hora}"
-            )
+    return recursos
+
+# Función para reducir un bloque del CSV a conteos por fecha, franja base y empresa
+def reducir_bloque_llamadas(bloque, formato=None):
+    """
+    Clasifica un bloque del CSV (con el formato de fecha del archivo) y lo reduce a conteos por franjas
+    base de MINUTOS_FRANJA_BASE minutos.
+    Cada llamada se ubica con aritmética entera (fecha, minutos desde medianoche // MINUTOS_FRANJA_BASE,
+    empresa) en una celda y las celdas se cuentan con np.bincount.
+    Retorna (conteos, registros_validos, registros_externo_interno), donde conteos es una
+    serie indexada por (Fecha, Franja, Empresa)
+    """
+    llamadas, validos = clasificar_bloque_llamadas(bloque, formato)
+    if llamadas.empty:
+        return pd.Series(dtype='int64'), validos, 0
     
-    with col2:
-        for hora in HORAS_DISPONIBLES[5:10]:  # 11:00 - 15:00
-            recursos[hora] = st.number_input(
-                f"{hora}:00",
-                min_value=0,
-                max_value=100,
-                value=1,
-                key=f"recurso_{hora}"
-            )
+    call_time = llamadas['Call Time']
+    empresas = list(CODIGOS_POR_EMPRESA)
+    codigos_fecha, fechas = pd.factorize(call_time.dt.normalize(), sort=True)
+    franjas = (call_time.dt.hour.to_numpy() * 60 + call_time.dt.minute.to_numpy()) // MINUTOS_FRANJA_BASE
+    codigos_empresa = pd.Categorical(llamadas['Empresa'], categories=empresas).codes
     
-    with col3:
-        for hora in HORAS_DISPONIBLES[10:]:  # 16:00 - 19:00
-            recursos[hora] = st.number_input(
-                f"{hora}:00",
-                min_value=0,
-                max_value=100,
-                value=1,
-                key=f"recurso_{hora}"
-            )
+    # Índice lineal de la celda (fecha, franja, empresa) y conteo de todas las celdas a la vez
+    celdas_por_fecha = FRANJAS_BASE * len(empresas)
+    indice_celda = codigos_fecha * celdas_por_fecha + franjas * len(empresas) + codigos_empresa
+    conteo = np.bincount(indice_celda, minlength=len(fechas) * celdas_por_fecha)
     
-    return recursos
+    celdas = np.flatnonzero(conteo)
+    indice_fecha, resto = np.divmod(celdas, celdas_por_fecha)
+    indice_franja, indice_empresa = np.divmod(resto, len(empresas))
+    conteos = pd.Series(conteo[celdas], index=pd.MultiIndex.from_arrays(
+        [fechas[indice_fecha], indice_franja, np.array(empresas)[indice_empresa]],
+        names=['Fecha', 'Franja', 'Empresa']
+    ))
+    
+    return conteos, validos, len(llamadas)
 
-# Función para procesar los datos y calcular demanda CON FILTRO
-def procesar_datos_demanda_filtrada(df, empresas_seleccionadas):
+# Etapa de ingesta compartida por la demanda y la predicción
+@st.cache_data(show_spinner=False)
+def agregar_llamadas_por_bloques(hash_archivo, _archivo, tamano_bloque=TAMANO_BLOQUE_CSV):
+    """
+    Lee el CSV por bloques (solo COLUMNAS_CDR, como texto) y reduce cada bloque a conteos por
+    (Fecha, Franja, Empresa), de modo que la memoria no crece con el tamaño del archivo.
+    Se ejecuta una sola vez por archivo (hash_archivo) para todas las empresas e intervalos.
+    Retorna (conteos, resumen): conteos con columnas Fecha, Franja, Empresa y Llamadas (None si no
+    quedan registros); resumen con las filas leídas y los conteos de cada filtro
+    """
+    _archivo.seek(0)
+    columnas = pd.read_csv(_archivo, nrows=0).columns
+    resumen = {
+        'columnas_faltantes': [col for col in COLUMNAS_CDR if col not in columnas],
+        'filas_archivo': 0,
+        'total_registros': 0,
+        'registros_externo_interno': 0
+    }
+    if resumen['columnas_faltantes']:
+        return None, resumen
+    
+    _archivo.seek(0)
+    acumulado = None
+    formato = None
+    for bloque in pd.read_csv(_archivo, usecols=list(COLUMNAS_CDR), dtype=COLUMNAS_CDR, chunksize=tamano_bloque):
+        # Formato de fecha detectado una sola vez por archivo (primer bloque con valores)
+        if formato is None:
+            formato = detectar_formato_call_time(bloque['Call Time'])
+        conteos_bloque, validos, externo_interno = reducir_bloque_llamadas(bloque, formato)
+        resumen['filas_archivo'] += len(bloque)
+        resumen['total_registros'] += validos
+        resumen['registros_externo_interno'] += externo_interno
+        
+        if conteos_bloque.empty:
+            continue
+        acumulado = conteos_bloque if acumulado is None else acumulado.add(conteos_bloque, fill_value=0)
+    _archivo.seek(0)
+    
+    if acumulado is None:
+        return None, resumen
+    
+    return tipar_conteos(acumulado.rename('Llamadas').reset_index()), resumen
+
+# Cubo denso de conteos por (fecha, franja base, empresa)
+@st.cache_data(show_spinner=False)
+def construir_cubo_demanda(hash_archivo, _conteos):
+    """
+    Convierte los conteos por (Fecha, Franja, Empresa) en un arreglo denso de NumPy de forma
+    (fechas, FRANJAS_BASE, empresas), una sola vez por archivo (hash_archivo).
+    Retorna un diccionario con 'fechas' (DatetimeIndex ordenado), 'empresas' (orden de
+    CODIGOS_POR_EMPRESA) y 'cubo' (None si no hay conteos)
+    """
+    empresas = list(CODIGOS_POR_EMPRESA)
+    if _conteos is None or len(_conteos) == 0:
+        return {'fechas': pd.DatetimeIndex([]), 'empresas': empresas, 'cubo': None}
+    
+    fechas = pd.DatetimeIndex(np.sort(_conteos['Fecha'].unique()))
+    cubo = np.zeros((len(fechas), FRANJAS_BASE, len(empresas)), dtype=np.int32)
+    cubo[
+        fechas.get_indexer(_conteos['Fecha']),
+        _conteos['Franja'].to_numpy(),
+        _conteos['Empresa'].cat.codes.to_numpy()
+    ] = _conteos['Llamadas'].to_numpy()
+    
+    return {'fechas': fechas, 'empresas': empresas, 'cubo': cubo}
+
+# Función para obtener la matriz fecha × franja de las empresas seleccionadas
+def matriz_demanda_empresas(cubo_demanda, empresas_seleccionadas, minutos_intervalo=60):
+    """
+    Suma el cubo sobre las empresas seleccionadas (todas si no hay selección) y agrupa las franjas
+    base consecutivas en intervalos de minutos_intervalo (múltiplo de MINUTOS_FRANJA_BASE).
+    Retorna una matriz de llamadas de forma (fechas, 1440 // minutos_intervalo)
     """
-    Procesa el DataFrame para calcular la demanda promedio por hora y día
-    APLICANDO FILTRO: From = NO extensión (externo), To = SÍ extensión (interno)
-    Y filtrando por empresas seleccionadas
+    franjas_dia = 1440 // minutos_intervalo
+    cubo = cubo_demanda['cubo']
+    if cubo is None:
+        return np.zeros((0, franjas_dia), dtype=np.int64)
+    
+    if empresas_seleccionadas:
+        indices = [cubo_demanda['empresas'].index(empresa) for empresa in empresas_seleccionadas]
+        cubo = cubo[:, :, indices]
+    
+    matriz = cubo.sum(axis=2, dtype=np.int64)
+    return matriz.reshape(len(matriz), franjas_dia, -1).sum(axis=2)
+
+# Función para calcular el mínimo de agentes con Erlang C
+def calcular_agentes_erlang_c(llamadas, minutos_atencion, nivel_servicio=0.8, segundos_objetivo=20,
+                              asa_maxima=0, minutos_intervalo=60):
     """
-    df_procesado = df.copy()
+    Calcula con Erlang C el mínimo de agentes de cada celda para atender las llamadas del intervalo
+    cumpliendo el nivel de servicio (fracción atendida antes de segundos_objetivo) y, si asa_maxima > 0,
+    una espera promedio (ASA) de a lo sumo asa_maxima segundos.
+    Resuelve todas las celdas a la vez (arreglo de cualquier forma) en espacio logarítmico, de modo
+    que se mantiene estable con cargas altas. Retorna un arreglo de enteros con la forma de llamadas
+    """
+    llamadas = np.asarray(llamadas, dtype=float)
+    agentes = np.zeros(llamadas.size, dtype=np.int64)
+    
+    # Carga ofrecida en erlangs por celda
+    carga = np.clip(np.nan_to_num(llamadas.ravel()), 0, None) * minutos_atencion / minutos_intervalo
+    activas = carga > 0
+    if minutos_atencion <= 0 or not activas.any():
+        return agentes.reshape(llamadas.shape)
+    
+    a = carga[activas][:, None]
+    segundos_atencion = minutos_atencion * 60
+    n_max = int(np.ceil(a.max() + 6 * np.sqrt(a.max()) + 10))
+    while True:
+        k = np.arange(n_max + 1)
+        log_factorial = np.concatenate(([0.0], np.cumsum(np.log(k[1:]))))
+        
+        # log(A^k / k!) y log(Σ_{j<=k} A^j / j!) para cada celda y cada k
+        log_terminos = k * np.log(a) - log_factorial
+        log_acumulado = np.logaddexp.accumulate(log_terminos, axis=1)
+        
+        # Probabilidad de espera (Erlang C) para N = 1..n_max agentes; solo es estable si N > A
+        n = k[1:]
+        holgura = n - a
+        estable = holgura > 0
+        holgura = np.where(estable, holgura, 1.0)
+        log_espera = log_terminos[:, 1:] + np.log(n) - np.log(holgura)
+        prob_espera = np.exp(log_espera - np.logaddexp(log_acumulado[:, :-1], log_espera))
+        
+        nivel = 1 - prob_espera * np.exp(-holgura * segundos_objetivo / segundos_atencion)
+        cumple = estable & (nivel >= nivel_servicio)
+        if asa_maxima > 0:
+            cumple &= prob_espera * segundos_atencion / holgura <= asa_maxima
+        
+        # Ambos criterios mejoran con más agentes: basta con que el último N cumpla en todas las celdas
+        if cumple[:, -1].all():
+            break
+        n_max *= 2
+    
+    agentes[activas] = n[np.argmax(cumple, axis=1)]
+    return agentes.reshape(llamadas.shape)
+
+# Función para obtener los objetivos de servicio de la sesión
+def obtener_parametros_erlang():
+    """
+    Retorna los objetivos de servicio configurados (PARAMETROS_ERLANG_DEFECTO si aún no se configuran)
+    """
+    return st.session_state.get('parametros_erlang', PARAMETROS_ERLANG_DEFECTO)
+
+# Función para calcular los recursos necesarios de un arreglo de llamadas por intervalo
+def calcular_recursos_necesarios(llamadas, parametros_erlang=None, minutos_intervalo=None):
+    """
+    Aplica Erlang C con los objetivos de servicio de la sesión a llamadas por intervalo
+    (el intervalo de la sesión si no se indica minutos_intervalo)
+    """
+    return calcular_agentes_erlang_c(llamadas, **(parametros_erlang or obtener_parametros_erlang()),
+                                     minutos_intervalo=minutos_intervalo or obtener_minutos_intervalo())
+
+# Función para calcular la demanda por día de la semana y franja a partir del cubo
+def calcular_demanda_cubo(cubo_demanda, empresas_seleccionadas, minutos_intervalo=60):
+    """
+    Calcula Promedio_Demanda, Num_Dias y Recursos_Necesarios (Erlang C) por día de la semana y franja
+    de minutos_intervalo con reducciones sobre el cubo. El promedio de cada franja considera las fechas
+    con llamadas en esa franja y Num_Dias las fechas con alguna llamada en ese día de la semana.
+    Franja es el índice de la franja en el día y Hora su etiqueta "HH:MM".
+    Retorna None si no hay llamadas para las empresas seleccionadas
+    """
+    matriz = matriz_demanda_empresas(cubo_demanda, empresas_seleccionadas, minutos_intervalo)
+    con_llamadas = matriz > 0
+    if not con_llamadas.any():
+        return None
+    
+    # Matriz indicadora fecha → día de la semana para reducir por día con un producto matricial
+    dias = cubo_demanda['fechas'].dayofweek.to_numpy()
+    indicador_dia = np.eye(7, dtype=np.int64)[dias]
+    suma_llamadas = indicador_dia.T @ matriz
+    fechas_con_llamadas = indicador_dia.T @ con_llamadas
+    num_dias = np.bincount(dias[con_llamadas.any(axis=1)], minlength=7)
     
+    # Solo las celdas (día, franja) con llamadas, ordenadas por día y franja
+    dia_idx, franjas = np.nonzero(fechas_con_llamadas)
+    promedio = np.round(suma_llamadas[dia_idx, franjas] / fechas_con_llamadas[dia_idx, franjas], 2)
+    
+    return pd.DataFrame({
+        'Dia_Semana': pd.Categorical.from_codes(dia_idx, categories=ORDEN_DIAS, ordered=True),
+        'Franja': franjas,
+        'Hora': np.array(etiquetas_franjas(minutos_intervalo))[franjas],
+        'Promedio_Demanda': promedio,
+        'Recursos_Necesarios': calcular_recursos_necesarios(promedio, minutos_intervalo=minutos_intervalo),
+        'Num_Dias': num_dias[dia_idx],
+        'Empresas_Filtradas': ', '.join(empresas_seleccionadas) if empresas_seleccionadas else 'Todas'
+    })
+
+# Función para procesar los datos y calcular demanda CON FILTRO
+def procesar_datos_demanda_filtrada(cubo_demanda, resumen, empresas_seleccionadas, minutos_intervalo=60):
+    """
+    Calcula la demanda promedio por franja de minutos_intervalo y día a partir del cubo de conteos
+    (ya filtrado: From = NO extensión (externo), To = SÍ extensión (interno)) y las empresas seleccionadas
+    """
     try:
         # Verificar columnas necesarias
-        columnas_requeridas = ['Call Time', 'From', 'To']
-        for col in columnas_requeridas:
-            if col not in df_procesado.columns:
-                st.error(f"El archivo no contiene la columna '{col}' necesaria.")
-                return None
-        
-        # Convertir Call Time a datetime si es necesario
-        try:
-            df_procesado['Call Time'] = pd.to_datetime(df_procesado['Call Time'])
-        except:
-            df_procesado['Call Time'] = pd.to_datetime(df_procesado['Call Time'], errors='coerce')
-        
-        # Eliminar filas con Call Time nulo
-        df_procesado = df_procesado.dropna(subset=['Call Time'])
+        for col in resumen['columnas_faltantes']:
+            st.error(f"El archivo no contiene la columna '{col}' necesaria.")
+            return None
         
-        if len(df_procesado) == 0:
+        if resumen['total_registros'] == 0:
             st.error("No hay fechas válidas en los datos.")
             return None
         
-        # Aplicar filtro: From = NO extensión (externo), To = SÍ extensión (interno)
-        df_procesado['From_es_extension'] = df_procesado['From'].apply(obtener_empresa_extension)
-        df_procesado['To_es_extension'] = df_procesado['To'].apply(obtener_empresa_extension)
-        
-        # Filtrar: origen externo Y destino interno
-        mascara = (df_procesado['From_es_extension'].isna()) & (df_procesado['To_es_extension'].notna())
-        df_filtrado = df_procesado[mascara].copy()
-        
         # Mostrar estadísticas del filtro inicial
-        total_registros = len(df_procesado)
-        registros_filtrados = len(df_filtrado)
+        total_registros = resumen['total_registros']
+        registros_filtrados = resumen['registros_externo_interno']
         porcentaje_filtrado = (registros_filtrados / total_registros * 100) if total_registros > 0 else 0
         
         st.info(f"**Filtro inicial aplicado (externo → interno):** {registros_filtrados:,} de {total_registros:,} registros ({porcentaje_filtrado:.1f}%)")
@@ -187,13 +395,18 @@ def procesar_datos_demanda_filtrada(df, empresas_seleccionadas):
             st.warning("No se encontraron registros que cumplan el criterio de filtro externo → interno.")
             return None
         
-        # Aplicar filtro por empresas seleccionadas
+        # Llamadas por fecha y hora de las empresas seleccionadas, y total por empresa
+        matriz = matriz_demanda_empresas(cubo_demanda, empresas_seleccionadas)
+        registros_por_empresa = int(matriz.sum())
+        distribucion_empresas = pd.Series(
+            cubo_demanda['cubo'].sum(axis=(0, 1)), index=cubo_demanda['empresas']
+        ).sort_values(ascending=False)
+        if empresas_seleccionadas:
+            distribucion_empresas = distribucion_empresas[distribucion_empresas.index.isin(empresas_seleccionadas)]
+        distribucion_empresas = distribucion_empresas[distribucion_empresas > 0]
+        
+        # Estadísticas del filtro por empresas seleccionadas
         if empresas_seleccionadas:
-            mascara_empresas = df_filtrado['To_es_extension'].isin(empresas_seleccionadas)
-            df_filtrado = df_filtrado[mascara_empresas].copy()
-            
-            # Mostrar estadísticas del filtro por empresa
-            registros_por_empresa = len(df_filtrado)
             porcentaje_empresa = (registros_por_empresa / registros_filtrados * 100) if registros_filtrados > 0 else 0
             st.info(f"**Filtro por empresas ({', '.join(empresas_seleccionadas)}):** {registros_por_empresa:,} de {registros_filtrados:,} registros ({porcentaje_empresa:.1f}%)")
             
@@ -203,264 +416,172 @@ def procesar_datos_demanda_filtrada(df, empresas_seleccionadas):
         else:
             st.warning("No se seleccionaron empresas. Mostrando todas las empresas disponibles.")
             # Mostrar distribución por empresa
-            distribucion_empresas = df_filtrado['To_es_extension'].value_counts()
             if not distribucion_empresas.empty:
                 st.info("**Distribución por empresa en los datos filtrados:**")
                 for empresa, count in distribucion_empresas.items():
-                    porcentaje = (count / len(df_filtrado) * 100) if len(df_filtrado) > 0 else 0
+                    porcentaje = (count / registros_por_empresa * 100) if registros_por_empresa > 0 else 0
                     st.write(f"- {empresa}: {count:,} registros ({porcentaje:.1f}%)")
         
-        # Extraer hora, día de la semana y fecha
-        df_filtrado['Hora'] = df_filtrado['Call Time'].dt.hour
-        df_filtrado['Dia_Semana'] = df_filtrado['Call Time'].dt.day_name()
-        df_filtrado['Dia_Semana'] = df_filtrado['Dia_Semana'].apply(traducir_dia)
-        df_filtrado['Fecha'] = df_filtrado['Call Time'].dt.date
-        
-        # Agregar columna de empresa para análisis posterior
-        if empresas_seleccionadas:
-            df_filtrado['Empresa'] = df_filtrado['To_es_extension']
-        else:
-            df_filtrado['Empresa'] = df_filtrado['To_es_extension']
-        
         # Verificar que tenemos datos
-        if len(df_filtrado) == 0:
+        if registros_por_empresa == 0:
             st.warning("No hay datos después del filtro.")
             return None
         
         # Mostrar información de las fechas encontradas
-        fecha_min = df_filtrado['Fecha'].min()
-        fecha_max = df_filtrado['Fecha'].max()
+        fechas_con_llamadas = cubo_demanda['fechas'][matriz.sum(axis=1) > 0]
+        fecha_min = fechas_con_llamadas.min()
+        fecha_max = fechas_con_llamadas.max()
         dias_totales = (fecha_max - fecha_min).days + 1
-        st.info(f"**Rango de fechas:** {fecha_min} a {fecha_max} ({dias_totales} días)")
+        st.info(f"**Rango de fechas:** {fecha_min.date()} a {fecha_max.date()} ({dias_totales} días)")
         
         # Mostrar distribución por empresa si hay múltiples empresas
         if empresas_seleccionadas and len(empresas_seleccionadas) > 1:
-            distribucion_empresas = df_filtrado['Empresa'].value_counts()
             st.info("**Distribución por empresa en los datos finales:**")
             for empresa, count in distribucion_empresas.items():
-                porcentaje = (count / len(df_filtrado) * 100) if len(df_filtrado) > 0 else 0
+                porcentaje = (count / registros_por_empresa * 100) if registros_por_empresa > 0 else 0
                 st.write(f"- {empresa}: {count:,} registros ({porcentaje:.1f}%)")
         
-        # Contar el número de días únicos por día de la semana
-        dias_por_semana = df_filtrado.groupby('Dia_Semana')['Fecha'].nunique().reset_index()
-        dias_por_semana.columns = ['Dia_Semana', 'Num_Dias']
-        
-        # Agrupar por día de la semana, hora y fecha para contar llamadas
-        # Primero agrupar por fecha, día y hora
-        llamadas_por_hora_fecha = df_filtrado.groupby(['Fecha', 'Dia_Semana', 'Hora']).size().reset_index(name='Llamadas')
-        
-        # Ahora calcular el promedio por día de la semana y hora
-        demanda_promedio = llamadas_por_hora_fecha.groupby(['Dia_Semana', 'Hora'])['Llamadas'].mean().reset_index()
-        demanda_promedio.rename(columns={'Llamadas': 'Promedio_Demanda'}, inplace=True)
-        demanda_promedio['Promedio_Demanda'] = demanda_promedio['Promedio_Demanda'].round(2)
-        
-        # Combinar con el número de días
-        demanda_final = pd.merge(demanda_promedio, dias_por_semana, on='Dia_Semana')
-        
-        # Calcular Recursos Necesarios (demanda promedio ÷ 3)
-        demanda_final['Recursos_Necesarios'] = (demanda_final['Promedio_Demanda'] / CONSTANTE_DEMANDA_A_RECURSOS).round(2)
-        
-        # Ordenar por día y hora
-        orden_dias = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-        demanda_final['Dia_Semana'] = pd.Categorical(demanda_final['Dia_Semana'], categories=orden_dias, ordered=True)
-        demanda_final = demanda_final.sort_values(['Dia_Semana', 'Hora'])
-        
-        # Agregar información de empresas seleccionadas
-        if empresas_seleccionadas:
-            demanda_final['Empresas_Filtradas'] = ', '.join(empresas_seleccionadas)
-        else:
-            demanda_final['Empresas_Filtradas'] = 'Todas'
+        # Promedio por día de la semana y franja, días por día de la semana y recursos (reducciones del cubo)
+        demanda_final = calcular_demanda_cubo(cubo_demanda, empresas_seleccionadas, minutos_intervalo)
         
         # Mostrar resumen estadístico
         st.success("✅ Demanda promedio calculada correctamente")
         st.write(f"**Resumen por día de la semana:**")
-        for dia in orden_dias:
-            if dia in demanda_final['Dia_Semana'].unique():
-                dias_count = dias_por_semana[dias_por_semana['Dia_Semana'] == dia]['Num_Dias'].values[0]
-                demanda_dia = demanda_final[demanda_final['Dia_Semana'] == dia]['Promedio_Demanda'].sum()
-                st.write(f"- {dia}: {dias_count} días, demanda total: {demanda_dia:.1f} llamadas")
+        resumen_dias = demanda_final.groupby('Dia_Semana', observed=True).agg(
+            Num_Dias=('Num_Dias', 'first'), Demanda=('Promedio_Demanda', 'sum')
+        )
+        for fila in resumen_dias.itertuples():
+            st.write(f"- {fila.Index}: {fila.Num_Dias} días, demanda total: {fila.Demanda:.1f} llamadas")
         
-        return demanda_final[['Dia_Semana', 'Hora', 'Promedio_Demanda', 'Recursos_Necesarios', 'Num_Dias', 'Empresas_Filtradas']]
+        return demanda_final
         
     except Exception as e:
         st.error(f"Error al procesar los datos: {str(e)}")
         return None
 
-# Función para calcular métricas de gráficas "por llamadas"
-def calcular_metricas_llamadas(datos_grafica, dia_seleccionado, recursos_por_hora, max_capacidad_total=None):
+# Función para llevar valores por franja a un índice fijo de franjas del día
+def serie_horaria(valores_por_franja, minutos_intervalo=60):
     """
-    Calcula métricas para gráficas "por llamadas":
-    - Sumatoria demanda
-    - Pico demanda
-    - Demanda promedio hora
-    - Máximo capacidad disponible
+    Convierte un diccionario o serie {franja: valor} en un arreglo con todas las franjas del día
+    (24 para intervalos de 60 minutos; 0 donde no hay dato)
     """
-    # Sumatoria demanda
-    suma_demanda = datos_grafica['Promedio_Demanda'].sum()
-    
-    # Pico demanda
-    if not datos_grafica.empty:
-        pico_demanda_idx = datos_grafica['Promedio_Demanda'].idxmax()
-        pico_demanda = datos_grafica.loc[pico_demanda_idx, 'Promedio_Demanda']
-        hora_pico_demanda = datos_grafica.loc[pico_demanda_idx, 'Hora']
-    else:
-        pico_demanda = 0
-        hora_pico_demanda = 0
-    
-    # Demanda promedio hora (promedio ponderado de las horas con datos)
-    horas_con_demanda = datos_grafica[datos_grafica['Promedio_Demanda'] > 0]
-    if not horas_con_demanda.empty:
-        demanda_promedio_hora = horas_con_demanda['Promedio_Demanda'].mean()
+    return pd.Series(valores_por_franja, dtype=float).reindex(range(1440 // minutos_intervalo), fill_value=0).to_numpy()
+
+# Función para obtener la demanda promedio por franja del día seleccionado
+def demanda_horaria(demanda_df, dia_seleccionado, minutos_intervalo=60):
+    """
+    Retorna el Promedio_Demanda del día seleccionado sobre un índice fijo de franjas del día (0 sin datos).
+    "Todos" promedia por franja los días de Lunes a Viernes con datos en esa franja.
+    Retorna None si no hay datos para el día
+    """
+    if dia_seleccionado == "Todos":
+        demanda_dia = demanda_df[demanda_df['Dia_Semana'].isin(DIAS_LABORALES)]
     else:
-        demanda_promedio_hora = 0
+        demanda_dia = demanda_df[demanda_df['Dia_Semana'] == dia_seleccionado]
     
-    # Máximo capacidad disponible (máxima capacidad de todo el sistema)
-    max_capacidad_disponible = max_capacidad_total if max_capacidad_total is not None else 0
+    if len(demanda_dia) == 0:
+        return None
     
-    return {
-        'suma_demanda': suma_demanda,
-        'pico_demanda': pico_demanda,
-        'hora_pico_demanda': hora_pico_demanda,
-        'demanda_promedio_hora': demanda_promedio_hora,
-        'max_capacidad_disponible': max_capacidad_disponible
-    }
+    return demanda_dia.groupby('Franja')['Promedio_Demanda'].mean().reindex(range(1440 // minutos_intervalo), fill_value=0)
 
-# Función para calcular métricas de gráficas "por recursos"
-def calcular_metricas_recursos(datos_grafica, dia_seleccionado, recursos_por_hora):
-    """
-    Calcula métricas para gráficas "por recursos":
-    - Máximo recursos disponible
-    - Máximo recursos requeridos
-    - Máximo déficit de recursos
-    """
-    if dia_seleccionado in ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Todos']:
-        # Máximo recursos disponible
-        if 'Capacidad_Recursos' in datos_grafica.columns:
-            max_recursos_disponible_idx = datos_grafica['Capacidad_Recursos'].idxmax()
-            max_recursos_disponible = datos_grafica.loc[max_recursos_disponible_idx, 'Capacidad_Recursos']
-            hora_max_recursos = datos_grafica.loc[max_recursos_disponible_idx, 'Hora']
-        else:
-            # Calcular capacidad de recursos desde recursos_por_hora
-            max_recursos_disponible = 0
-            hora_max_recursos = 0
-            for hora, valor in recursos_por_hora.items():
-                capacidad_recursos = valor  # Ya es en recursos base
-                if capacidad_recursos > max_recursos_disponible:
-                    max_recursos_disponible = capacidad_recursos
-                    hora_max_recursos = hora
-        
-        # Máximo recursos requeridos
-        if 'Demanda_Recursos' in datos_grafica.columns:
-            max_recursos_requeridos_idx = datos_grafica['Demanda_Recursos'].idxmax()
-            max_recursos_requeridos = datos_grafica.loc[max_recursos_requeridos_idx, 'Demanda_Recursos']
-            hora_max_requeridos = datos_grafica.loc[max_recursos_requeridos_idx, 'Hora']
-        else:
-            # Calcular a partir de la demanda
-            datos_grafica['Demanda_Recursos'] = datos_grafica['Promedio_Demanda'] / CONSTANTE_VALIDACION
-            max_recursos_requeridos_idx = datos_grafica['Demanda_Recursos'].idxmax()
-            max_recursos_requeridos = datos_grafica.loc[max_recursos_requeridos_idx, 'Demanda_Recursos']
-            hora_max_requeridos = datos_grafica.loc[max_recursos_requeridos_idx, 'Hora']
-        
-        # Máximo déficit de recursos
-        if 'Capacidad_Recursos' in datos_grafica.columns and 'Demanda_Recursos' in datos_grafica.columns:
-            datos_grafica['Deficit_Recursos'] = datos_grafica['Demanda_Recursos'] - datos_grafica['Capacidad_Recursos']
-            deficit_positivos = datos_grafica[datos_grafica['Deficit_Recursos'] > 0]
-            if not deficit_positivos.empty:
-                max_deficit_idx = deficit_positivos['Deficit_Recursos'].idxmax()
-                max_deficit_recursos = deficit_positivos.loc[max_deficit_idx, 'Deficit_Recursos']
-                hora_max_deficit = deficit_positivos.loc[max_deficit_idx, 'Hora']
-            else:
-                max_deficit_recursos = 0
-                hora_max_deficit = 0
-        else:
-            max_deficit_recursos = 0
-            hora_max_deficit = 0
+# Función para obtener el pico de un arreglo horario
+def pico_horario(valores):
+    """
+    Retorna (valor máximo, franja) de un arreglo de franjas del día (la primera franja en caso de empate)
+    """
+    hora = int(np.argmax(valores))
+    return valores[hora], hora
+
+# Función para calcular las métricas de las gráficas "por llamadas" y "por recursos"
+def calcular_metricas_horarias(demanda, recursos_necesarios, recursos, dia_seleccionado, max_capacidad_total=None,
+                               minutos_intervalo=60):
+    """
+    Calcula las métricas compartidas por las vistas "por llamadas" y "por recursos" a partir de
+    arreglos por franja del día de demanda (llamadas), recursos necesarios (Erlang C) y recursos base:
+    - Sumatoria, pico y promedio por franja (franjas con demanda) de la demanda
+    - Máximo capacidad disponible
+    - Máximo recursos disponibles, requeridos y máximo déficit de recursos
+    Las horas de los picos se retornan como etiquetas "HH:MM" de la franja.
+    Para sábado y domingo no se consideran recursos disponibles ni déficit
+    """
+    demanda = np.asarray(demanda, dtype=float)
+    recursos = np.asarray(recursos, dtype=float) if dia_seleccionado in DIAS_CON_RECURSOS else np.zeros(len(demanda))
+    etiquetas = etiquetas_franjas(minutos_intervalo)
+    
+    # Por llamadas
+    pico_demanda, hora_pico_demanda = pico_horario(demanda)
+    horas_con_demanda = demanda[demanda > 0]
+    
+    # Por recursos: requeridos y déficit (requeridos - disponibles) franja a franja
+    recursos_necesarios = np.asarray(recursos_necesarios, dtype=float)
+    max_recursos_disponible, hora_max_recursos = pico_horario(recursos)
+    max_recursos_requeridos, hora_max_requeridos = pico_horario(recursos_necesarios)
+    deficit = np.maximum(recursos_necesarios - recursos, 0)
+    if dia_seleccionado in DIAS_CON_RECURSOS and deficit.max() > 0:
+        max_deficit_recursos, hora_max_deficit = pico_horario(deficit)
     else:
-        # Para sábado y domingo, solo calcular recursos requeridos
-        max_recursos_disponible = 0
-        hora_max_recursos = 0
-        
-        # Máximo recursos requeridos
-        datos_grafica['Demanda_Recursos'] = datos_grafica['Promedio_Demanda'] / CONSTANTE_VALIDACION
-        max_recursos_requeridos_idx = datos_grafica['Demanda_Recursos'].idxmax()
-        max_recursos_requeridos = datos_grafica.loc[max_recursos_requeridos_idx, 'Demanda_Recursos']
-        hora_max_requeridos = datos_grafica.loc[max_recursos_requeridos_idx, 'Hora']
-        
-        max_deficit_recursos = 0
-        hora_max_deficit = 0
+        max_deficit_recursos, hora_max_deficit = 0, 0
     
     return {
+        'suma_demanda': demanda.sum(),
+        'pico_demanda': pico_demanda,
+        'hora_pico_demanda': etiquetas[hora_pico_demanda],
+        'demanda_promedio_hora': horas_con_demanda.mean() if horas_con_demanda.size else 0,
+        'max_capacidad_disponible': max_capacidad_total if max_capacidad_total is not None else 0,
         'max_recursos_disponible': max_recursos_disponible,
-        'hora_max_recursos': hora_max_recursos,
+        'hora_max_recursos': etiquetas[hora_max_recursos],
         'max_recursos_requeridos': max_recursos_requeridos,
-        'hora_max_requeridos': hora_max_requeridos,
+        'hora_max_requeridos': etiquetas[hora_max_requeridos],
         'max_deficit_recursos': max_deficit_recursos,
-        'hora_max_deficit': hora_max_deficit
+        'hora_max_deficit': etiquetas[hora_max_deficit]
     }
 
+# Función para mostrar las métricas "por llamadas" y "por recursos"
+def mostrar_metricas_llamadas(metricas, titulo, etiqueta, minutos_intervalo=60):
+    """
+    Muestra las métricas de la vista "por llamadas" (etiqueta: 'Demanda' o 'Predicción')
+    """
+    st.write(f"**{titulo}:**")
+    col1_ll, col2_ll, col3_ll, col4_ll = st.columns(4)
+    with col1_ll:
+        st.metric(f"Sumatoria {etiqueta}", f"{metricas['suma_demanda']:.0f} llamadas")
+    with col2_ll:
+        st.metric(f"Pico {etiqueta}", f"{metricas['pico_demanda']:.0f}", 
+                 f"Hora: {metricas['hora_pico_demanda']}")
+    with col3_ll:
+        st.metric(f"{etiqueta} Promedio/{nombre_intervalo(minutos_intervalo)}", f"{metricas['demanda_promedio_hora']:.1f}")
+    with col4_ll:
+        st.metric("Máximo Capacidad Disponible", f"{metricas['max_capacidad_disponible']:.1f}")
+
 # Función para crear gráfica comparativa
 def crear_grafica_comparativa(demanda_df, recursos_por_hora, dia_seleccionado, empresas_seleccionadas, max_capacidad_total):
     """
     Crea una gráfica comparando recursos disponibles vs demanda promedio
     """
-    if dia_seleccionado == "Todos":
-        # Filtrar solo días de semana (Lunes a Viernes)
-        dias_semana = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
-        demanda_dia = demanda_df[demanda_df['Dia_Semana'].isin(dias_semana)].copy()
-        
-        if len(demanda_dia) == 0:
-            st.warning("No hay datos de demanda para días de semana")
-            return
-        
-        # Calcular promedio por hora para todos los días de semana
-        demanda_promedio = demanda_dia.groupby('Hora').agg({
-            'Promedio_Demanda': 'mean',
-            'Recursos_Necesarios': 'mean'
-        }).reset_index()
-        
-        demanda_promedio['Promedio_Demanda'] = demanda_promedio['Promedio_Demanda'].round(2)
-        demanda_promedio['Recursos_Necesarios'] = demanda_promedio['Recursos_Necesarios'].round(2)
-        
-        demanda_dia = demanda_promedio
-        titulo_dia = "Todos (Lunes a Viernes)"
-    else:
-        # Filtrar demanda para el día seleccionado
-        demanda_dia = demanda_df[demanda_df['Dia_Semana'] == dia_seleccionado].copy()
-        titulo_dia = dia_seleccionado
+    titulo_dia = "Todos (Lunes a Viernes)" if dia_seleccionado == "Todos" else dia_seleccionado
+    minutos_intervalo = obtener_minutos_intervalo()
     
-    if len(demanda_dia) == 0:
-        st.warning(f"No hay datos de demanda para {titulo_dia}")
+    # Demanda y recursos sobre el mismo índice de franjas del día (sin recursos para sábado y domingo)
+    demanda = demanda_horaria(demanda_df, dia_seleccionado, minutos_intervalo)
+    if demanda is None:
+        if dia_seleccionado == "Todos":
+            st.warning("No hay datos de demanda para días de semana")
+        else:
+            st.warning(f"No hay datos de demanda para {titulo_dia}")
         return
+    demanda = demanda.round(2).to_numpy()
+    recursos_necesarios = calcular_recursos_necesarios(demanda)
+    recursos = serie_horaria(recursos_por_hora, minutos_intervalo) if dia_seleccionado in DIAS_CON_RECURSOS else np.zeros(len(demanda))
     
-    # Crear DataFrame para la gráfica
-    horas_completas = pd.DataFrame({'Hora': range(0, 24)})
+    datos_grafica = pd.DataFrame({
+        'Capacidad Disponible': recursos * capacidad_por_recurso(minutos_intervalo),
+        'Demanda Promedio': demanda,
+        'Recursos Disponibles': recursos,
+        'Recursos Necesarios': recursos_necesarios
+    }, index=pd.Index(etiquetas_franjas(minutos_intervalo), name='Hora'))
     
-    # Preparar datos de recursos (solo para días de semana)
-    if dia_seleccionado in ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Todos']:
-        recursos_lista = []
-        for hora, valor in recursos_por_hora.items():
-            recursos_lista.append({'Hora': hora, 'Capacidad_Disponible': valor * CONSTANTE_VALIDACION})
-        
-        recursos_df = pd.DataFrame(recursos_lista)
-        
-        # Combinar con horas completas
-        recursos_completo = pd.merge(horas_completas, recursos_df, on='Hora', how='left')
-        recursos_completo['Capacidad_Disponible'] = recursos_completo['Capacidad_Disponible'].fillna(0)
-    else:
-        # Para sábado y domingo, no mostrar recursos
-        recursos_completo = horas_completas.copy()
-        recursos_completo['Capacidad_Disponible'] = 0
-    
-    # Preparar datos de demanda
-    if dia_seleccionado == "Todos":
-        demanda_completo = pd.merge(horas_completas, demanda_dia[['Hora', 'Promedio_Demanda']], on='Hora', how='left')
-    else:
-        demanda_completo = pd.merge(horas_completas, demanda_dia[['Hora', 'Promedio_Demanda']], on='Hora', how='left')
-    
-    demanda_completo['Promedio_Demanda'] = demanda_completo['Promedio_Demanda'].fillna(0)
-    
-    # Combinar ambos DataFrames
-    datos_grafica = pd.merge(recursos_completo, demanda_completo, on='Hora')
+    metricas = calcular_metricas_horarias(demanda, recursos_necesarios, recursos, dia_seleccionado, max_capacidad_total,
+                                          minutos_intervalo)
     
     # Agregar información de empresas filtradas si está disponible
     empresas_info = ""
@@ -473,138 +594,76 @@ def crear_grafica_comparativa(demanda_df, recursos_por_hora, dia_seleccionado, e
     else:
         st.write(f"### 📈 Comparación: Capacidad vs Demanda - {titulo_dia}")
     
+    # Para sábado y domingo, solo mostrar demanda
+    fin_de_semana = dia_seleccionado in ['Sábado', 'Domingo']
+    
     # Dos columnas para las gráficas
     col_grafica1, col_grafica2 = st.columns(2)
     
     with col_grafica1:
         st.write("#### 📊 Por Llamadas")
-        # Para sábado y domingo, solo mostrar demanda
-        if dia_seleccionado in ['Sábado', 'Domingo']:
-            chart_data = datos_grafica[['Hora', 'Promedio_Demanda']].set_index('Hora')
-            chart_data = chart_data.rename(columns={'Promedio_Demanda': 'Demanda Promedio'})
-        else:
-            chart_data = datos_grafica[['Hora', 'Capacidad_Disponible', 'Promedio_Demanda']].set_index('Hora')
-            chart_data = chart_data.rename(columns={
-                'Capacidad_Disponible': 'Capacidad Disponible',
-                'Promedio_Demanda': 'Demanda Promedio'
-            })
-        
-        # Mostrar gráfica
-        st.line_chart(chart_data, height=400)
+        columnas = ['Demanda Promedio'] if fin_de_semana else ['Capacidad Disponible', 'Demanda Promedio']
+        st.line_chart(datos_grafica[columnas], height=400)
         
-        # Calcular y mostrar métricas para gráfica "por llamadas"
-        metricas_llamadas = calcular_metricas_llamadas(datos_grafica, dia_seleccionado, recursos_por_hora, max_capacidad_total)
-        
-        st.write("**Métricas - Por Llamadas:**")
-        col1_ll, col2_ll, col3_ll, col4_ll = st.columns(4)
-        with col1_ll:
-            st.metric("Sumatoria Demanda", f"{metricas_llamadas['suma_demanda']:.0f} llamadas")
-        with col2_ll:
-            st.metric("Pico Demanda", f"{metricas_llamadas['pico_demanda']:.0f}", 
-                     f"Hora: {metricas_llamadas['hora_pico_demanda']}:00")
-        with col3_ll:
-            st.metric("Demanda Promedio/Hora", f"{metricas_llamadas['demanda_promedio_hora']:.1f}")
-        with col4_ll:
-            st.metric("Máximo Capacidad Disponible", f"{metricas_llamadas['max_capacidad_disponible']:.1f}")
+        mostrar_metricas_llamadas(metricas, "Métricas - Por Llamadas", "Demanda", minutos_intervalo)
     
     with col_grafica2:
         st.write("#### 👥 Por Recursos")
-        # Crear versión de datos para recursos (dividiendo por CONSTANTE_VALIDACION)
-        datos_recursos = datos_grafica.copy()
-        
-        if dia_seleccionado in ['Sábado', 'Domingo']:
-            # Solo demanda
-            datos_recursos['Demanda_Recursos'] = datos_recursos['Promedio_Demanda'] / CONSTANTE_VALIDACION
-            chart_data_recursos = datos_recursos[['Hora', 'Demanda_Recursos']].set_index('Hora')
-            chart_data_recursos = chart_data_recursos.rename(columns={'Demanda_Recursos': 'Recursos Necesarios'})
-        else:
-            # Capacidad y demanda
-            datos_recursos['Capacidad_Recursos'] = datos_recursos['Capacidad_Disponible'] / CONSTANTE_VALIDACION
-            datos_recursos['Demanda_Recursos'] = datos_recursos['Promedio_Demanda'] / CONSTANTE_VALIDACION
-            
-            chart_data_recursos = datos_recursos[['Hora', 'Capacidad_Recursos', 'Demanda_Recursos']].set_index('Hora')
-            chart_data_recursos = chart_data_recursos.rename(columns={
-                'Capacidad_Recursos': 'Recursos Disponibles',
-                'Demanda_Recursos': 'Recursos Necesarios'
-            })
-        
-        # Mostrar gráfica de recursos
-        st.line_chart(chart_data_recursos, height=400)
-        
-        # Calcular y mostrar métricas para gráfica "por recursos"
-        metricas_recursos = calcular_metricas_recursos(datos_recursos, dia_seleccionado, recursos_por_hora)
+        columnas = ['Recursos Necesarios'] if fin_de_semana else ['Recursos Disponibles', 'Recursos Necesarios']
+        st.line_chart(datos_grafica[columnas], height=400)
         
         st.write("**Métricas - Por Recursos:**")
         col1_re, col2_re, col3_re = st.columns(3)
         with col1_re:
-            st.metric("Máximo Recursos Disponible", f"{metricas_recursos['max_recursos_disponible']:.1f}",
-                     f"Hora: {metricas_recursos['hora_max_recursos']}:00")
+            st.metric("Máximo Recursos Disponible", f"{metricas['max_recursos_disponible']:.1f}",
+                     f"Hora: {metricas['hora_max_recursos']}")
         with col2_re:
-            st.metric("Máximo Recursos Requeridos", f"{metricas_recursos['max_recursos_requeridos']:.1f}",
-                     f"Hora: {metricas_recursos['hora_max_requeridos']}:00")
+            st.metric("Máximo Recursos Requeridos", f"{metricas['max_recursos_requeridos']:.1f}",
+                     f"Hora: {metricas['hora_max_requeridos']}")
         with col3_re:
-            if metricas_recursos['max_deficit_recursos'] > 0:
-                st.metric("Máximo Déficit Recursos", f"{metricas_recursos['max_deficit_recursos']:.1f}",
-                         f"Hora: {metricas_recursos['hora_max_deficit']}:00")
+            if metricas['max_deficit_recursos'] > 0:
+                st.metric("Máximo Déficit Recursos", f"{metricas['max_deficit_recursos']:.1f}",
+                         f"Hora: {metricas['hora_max_deficit']}")
             else:
                 st.metric("Máximo Déficit Recursos", "0.0", "Sin déficit")
 
+# Función para agregar las características de calendario a partir de la fecha
+def agregar_caracteristicas_calendario(df):
+    """
+    Agrega Dia_Semana_Num, Mes, Dia_Mes y Semana_Mes a partir de la columna Fecha
+    """
+    df['Dia_Semana_Num'] = df['Fecha'].dt.dayofweek
+    df['Mes'] = df['Fecha'].dt.month
+    df['Dia_Mes'] = df['Fecha'].dt.day
+    df['Semana_Mes'] = (df['Dia_Mes'] - 1) // 7 + 1
+    return df
+
 # Función para preparar datos para modelos de predicción
-def preparar_datos_para_prediccion(df, empresas_seleccionadas):
+def preparar_datos_para_prediccion(cubo_demanda, empresas_seleccionadas, minutos_intervalo=60):
     """
-    Prepara los datos para entrenar modelos de predicción
+    Prepara los datos para entrenar modelos de predicción a partir del cubo de conteos.
+    Cada fila es una franja de minutos_intervalo con llamadas; Hora es el inicio de la franja en horas
+    (p. ej. 7.5 para 7:30)
     """
     try:
-        # Hacer una copia para no modificar el original
-        df_clean = df.copy()
-        
-        # Convertir Call Time a datetime, manejar errores
-        try:
-            df_clean['Call Time'] = pd.to_datetime(df_clean['Call Time'], errors='coerce')
-        except Exception as e:
-            # Intentar con formato específico
-            try:
-                df_clean['Call Time'] = pd.to_datetime(df_clean['Call Time'], format='mixed', errors='coerce')
-            except:
-                df_clean['Call Time'] = pd.to_datetime(df_clean['Call Time'], errors='coerce')
-        
-        # Eliminar filas con Call Time nulo o inválido
-        df_clean = df_clean.dropna(subset=['Call Time'])
-        
-        if len(df_clean) == 0:
-            return None, None, None
-        
-        # Aplicar filtro: From = NO extensión (externo), To = SÍ extensión (interno)
-        df_clean['From_es_extension'] = df_clean['From'].apply(obtener_empresa_extension)
-        df_clean['To_es_extension'] = df_clean['To'].apply(obtener_empresa_extension)
-        
-        # Filtrar: origen externo Y destino interno
-        mascara = (df_clean['From_es_extension'].isna()) & (df_clean['To_es_extension'].notna())
-        df_filtrado = df_clean[mascara].copy()
-        
-        if len(df_filtrado) == 0:
+        # Celdas (fecha, franja) con llamadas de las empresas seleccionadas, en orden cronológico
+        matriz = matriz_demanda_empresas(cubo_demanda, empresas_seleccionadas, minutos_intervalo)
+        indices_fecha, franjas = np.nonzero(matriz)
+        if len(franjas) == 0:
             return None, None, None
         
-        # Aplicar filtro por empresas seleccionadas
-        if empresas_seleccionadas:
-            mascara_empresas = df_filtrado['To_es_extension'].isin(empresas_seleccionadas)
-            df_filtrado = df_filtrado[mascara_empresas].copy()
-        
-        if len(df_filtrado) == 0:
-            return None, None, None
+        df_agrupado = pd.DataFrame({
+            'Fecha': cubo_demanda['fechas'][indices_fecha],
+            'Franja': franjas,
+            'Hora': franjas * minutos_intervalo / 60,
+            'Llamadas': matriz[indices_fecha, franjas]
+        })
         
         # Extraer características
-        df_filtrado['Hora'] = df_filtrado['Call Time'].dt.hour
-        df_filtrado['Dia_Semana_Num'] = df_filtrado['Call Time'].dt.dayofweek  # 0=Lunes, 6=Domingo
-        df_filtrado['Mes'] = df_filtrado['Call Time'].dt.month
-        df_filtrado['Dia_Mes'] = df_filtrado['Call Time'].dt.day
-        df_filtrado['Semana_Mes'] = (df_filtrado['Dia_Mes'] - 1) // 7 + 1
-        
-        # Agrupar por día y hora para obtener datos diarios
-        df_agrupado = df_filtrado.groupby(['Dia_Semana_Num', 'Hora', 'Mes', 'Dia_Mes', 'Semana_Mes']).size().reset_index(name='Llamadas')
+        agregar_caracteristicas_calendario(df_agrupado)
         
         # Preparar características y variable objetivo
-        X = df_agrupado[['Dia_Semana_Num', 'Hora', 'Mes', 'Dia_Mes', 'Semana_Mes']]
+        X = df_agrupado[CARACTERISTICAS_PREDICCION]
         y = df_agrupado['Llamadas']
         
         # Verificar que tenemos suficientes datos para entrenamiento
@@ -613,93 +672,107 @@ def preparar_datos_para_prediccion(df, empresas_seleccionadas):
         
         return X, y, df_agrupado
         
-    except Exception as e:
+    except Exception:
         return None, None, None
 
+# Función para crear un modelo de predicción con sus parámetros
+def crear_modelo_prediccion(nombre, n_entrenamiento):
+    """
+    Crea el modelo sin entrenar (None si no aplica para la cantidad de datos de entrenamiento)
+    """
+    if nombre == 'Regresión Lineal':
+        return LinearRegression()
+    if nombre == 'MLP (Red Neuronal)':
+        # MLP solo si hay suficientes datos
+        if n_entrenamiento <= PARAMETROS_MODELOS['mlp_min_train']:
+            return None
+        return MLPRegressor(random_state=PARAMETROS_MODELOS['random_state'], **PARAMETROS_MODELOS['mlp'])
+    if nombre == 'Gradient Boosting':
+        min_estimators, max_estimators = PARAMETROS_MODELOS['gb_n_estimators']
+        n_estimators = max(min_estimators, min(max_estimators, n_entrenamiento // 2))
+        return GradientBoostingRegressor(
+            n_estimators=n_estimators,
+            random_state=PARAMETROS_MODELOS['random_state'],
+            **PARAMETROS_MODELOS['gb']
+        )
+    return None
+
+# Tarea de un worker: entrenar un modelo en una partición y evaluarlo
+def entrenar_evaluar_modelo(nombre, X_train, y_train, X_test=None, y_test=None):
+    """
+    Entrena un modelo; si se entregan datos de prueba retorna sus métricas, si no retorna el modelo.
+    Retorna (nombre, resultado o None si no se pudo entrenar)
+    """
+    try:
+        modelo = crear_modelo_prediccion(nombre, len(X_train))
+        if modelo is None:
+            return nombre, None
+        modelo.fit(X_train, y_train)
+        if X_test is None:
+            return nombre, {'modelo': modelo}
+        
+        y_pred = np.maximum(modelo.predict(X_test), 0)
+        return nombre, {
+            'mse': mean_squared_error(y_test, y_pred),
+            'mae': mean_absolute_error(y_test, y_pred),
+            'r2': r2_score(y_test, y_pred),
+            'predicciones': y_pred
+        }
+    except Exception:
+        return nombre, None
+
 # Función para entrenar y evaluar modelos
 def entrenar_modelos_prediccion(X, y):
     """
-    Entrena y evalúa diferentes modelos de predicción
+    Entrena y evalúa diferentes modelos de predicción.
+    X e y deben venir en orden cronológico: la evaluación usa particiones temporales (TimeSeriesSplit),
+    siempre entrenando con el pasado y evaluando con el futuro. Cada modelo y partición, más el
+    entrenamiento final con todos los datos, se ejecuta como una tarea en paralelo
     """
-    resultados = {}
+    nombres_modelos = ['Regresión Lineal', 'MLP (Red Neuronal)', 'Gradient Boosting']
     
     # Verificar que tenemos suficientes datos
     if len(X) < 30:
         return None, None, None
     
     try:
-        # Dividir datos en entrenamiento y prueba (70%/30%)
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-        
-        # Modelo 1: Regresión Lineal
-        with st.spinner("🧠 Entrenando Regresión Lineal..."):
-            try:
-                modelo_lr = LinearRegression()
-                modelo_lr.fit(X_train, y_train)
-                y_pred_lr = modelo_lr.predict(X_test)
-                y_pred_lr = np.maximum(y_pred_lr, 0)
-                
-                resultados['Regresión Lineal'] = {
-                    'modelo': modelo_lr,
-                    'mse': mean_squared_error(y_test, y_pred_lr),
-                    'mae': mean_absolute_error(y_test, y_pred_lr),
-                    'r2': r2_score(y_test, y_pred_lr),
-                    'predicciones': y_pred_lr
-                }
-            except Exception as e:
-                resultados['Regresión Lineal'] = None
+        particiones = list(TimeSeriesSplit(n_splits=PARAMETROS_MODELOS['n_particiones']).split(X))
         
-        # Modelo 2: MLP (Red Neuronal) - Solo si hay suficientes datos
-        with st.spinner("🧠 Entrenando MLP (Red Neuronal)..."):
-            try:
-                if len(X_train) > 100:
-                    modelo_mlp = MLPRegressor(
-                        hidden_layer_sizes=(50, 25), 
-                        max_iter=500, 
-                        random_state=42,
-                        early_stopping=True,
-                        validation_fraction=0.1
-                    )
-                    modelo_mlp.fit(X_train, y_train)
-                    y_pred_mlp = modelo_mlp.predict(X_test)
-                    y_pred_mlp = np.maximum(y_pred_mlp, 0)
-                    
-                    resultados['MLP (Red Neuronal)'] = {
-                        'modelo': modelo_mlp,
-                        'mse': mean_squared_error(y_test, y_pred_mlp),
-                        'mae': mean_absolute_error(y_test, y_pred_mlp),
-                        'r2': r2_score(y_test, y_pred_mlp),
-                        'predicciones': y_pred_mlp
-                    }
-                else:
-                    resultados['MLP (Red Neuronal)'] = None
-            except Exception as e:
-                resultados['MLP (Red Neuronal)'] = None
+        tareas = []
+        for nombre in nombres_modelos:
+            for idx_train, idx_test in particiones:
+                tareas.append(delayed(entrenar_evaluar_modelo)(
+                    nombre, X.iloc[idx_train], y.iloc[idx_train], X.iloc[idx_test], y.iloc[idx_test]
+                ))
+            tareas.append(delayed(entrenar_evaluar_modelo)(nombre, X, y))
         
-        # Modelo 3: Gradient Boosting
-        with st.spinner("🧠 Entrenando Gradient Boosting..."):
+        with st.spinner(f"🧠 Entrenando {len(nombres_modelos)} modelos con {len(particiones)} particiones temporales en paralelo..."):
             try:
-                n_estimators = min(50, len(X_train) // 2)
-                n_estimators = max(10, n_estimators)
-                
-                modelo_gb = GradientBoostingRegressor(
-                    n_estimators=n_estimators, 
-                    random_state=42,
-                    max_depth=3
-                )
-                modelo_gb.fit(X_train, y_train)
-                y_pred_gb = modelo_gb.predict(X_test)
-                y_pred_gb = np.maximum(y_pred_gb, 0)
-                
-                resultados['Gradient Boosting'] = {
-                    'modelo': modelo_gb,
-                    'mse': mean_squared_error(y_test, y_pred_gb),
-                    'mae': mean_absolute_error(y_test, y_pred_gb),
-                    'r2': r2_score(y_test, y_pred_gb),
-                    'predicciones': y_pred_gb
-                }
-            except Exception as e:
-                resultados['Gradient Boosting'] = None
+                salidas = Parallel(n_jobs=-1)(tareas)
+            except Exception:
+                # Si no se pueden crear procesos, entrenar en el proceso actual
+                salidas = Parallel(n_jobs=1)(tareas)
+        
+        # Las salidas llegan en el orden de las tareas: particiones y luego el modelo final, por modelo
+        tareas_por_modelo = len(particiones) + 1
+        resultados = {}
+        for i, nombre in enumerate(nombres_modelos):
+            salidas_modelo = [resultado for _, resultado in salidas[i * tareas_por_modelo:(i + 1) * tareas_por_modelo]]
+            evaluaciones, final = salidas_modelo[:-1], salidas_modelo[-1]
+            evaluaciones_validas = [evaluacion for evaluacion in evaluaciones if evaluacion is not None]
+            
+            if final is None or not evaluaciones_validas:
+                resultados[nombre] = None
+                continue
+            
+            resultados[nombre] = {
+                'modelo': final['modelo'],
+                'mse': np.mean([evaluacion['mse'] for evaluacion in evaluaciones_validas]),
+                'mae': np.mean([evaluacion['mae'] for evaluacion in evaluaciones_validas]),
+                'r2': np.mean([evaluacion['r2'] for evaluacion in evaluaciones_validas]),
+                'r2_particiones': [evaluacion['r2'] for evaluacion in evaluaciones_validas],
+                'predicciones': evaluaciones[-1]['predicciones'] if evaluaciones[-1] is not None else None
+            }
         
         # Filtrar modelos que se entrenaron correctamente
         modelos_validos = {k: v for k, v in resultados.items() if v is not None}
@@ -707,151 +780,307 @@ def entrenar_modelos_prediccion(X, y):
         if not modelos_validos:
             return None, None, None
         
-        return modelos_validos, X_test, y_test
+        # El conjunto de prueba de referencia es la última partición (el tramo más reciente)
+        idx_test = particiones[-1][1]
+        return modelos_validos, X.iloc[idx_test], y.iloc[idx_test]
         
-    except Exception as e:
+    except Exception:
         return None, None, None
 
-# Función para calcular métricas de gráficas de predicción "por llamadas"
-def calcular_metricas_prediccion_llamadas(df_grafica, max_capacidad_total=None):
+# Funciones del registro local de modelos
+def calcular_clave_modelos(X, y, empresas_seleccionadas):
     """
-    Calcula métricas para gráficas de predicción "por llamadas":
-    - Sumatoria demanda (predicción)
-    - Pico demanda (predicción)
-    - Demanda promedio hora (predicción)
-    - Máximo capacidad disponible
+    Calcula la llave del registro: hash de los datos de entrenamiento, empresas,
+    conjunto de características y parámetros de los modelos
     """
-    if df_grafica.empty:
-        return {
-            'suma_prediccion': 0,
-            'pico_prediccion': 0,
-            'hora_pico_prediccion': 0,
-            'prediccion_promedio_hora': 0,
-            'max_capacidad_disponible': max_capacidad_total if max_capacidad_total is not None else 0
-        }
+    hash_datos = hashlib.md5()
+    hash_datos.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    hash_datos.update(pd.util.hash_pandas_object(y, index=False).values.tobytes())
+    descriptor = json.dumps({
+        'datos': hash_datos.hexdigest(),
+        'empresas': sorted(empresas_seleccionadas),
+        'caracteristicas': list(X.columns),
+        'parametros': PARAMETROS_MODELOS
+    }, sort_keys=True, default=str)
+    return hashlib.md5(descriptor.encode('utf-8')).hexdigest()
+
+def cargar_modelos_registro(clave):
+    """
+    Carga del registro los modelos y métricas guardados con la llave (None si no existen)
+    """
+    ruta = os.path.join(RUTA_REGISTRO_MODELOS, f"{clave}.joblib")
+    if not os.path.exists(ruta):
+        return None
+    try:
+        contenido = joblib.load(ruta)
+    except Exception:
+        return None
+    # Marcar como usado recientemente para la depuración por antigüedad
+    os.utime(ruta)
+    return contenido
+
+def guardar_modelos_registro(clave, contenido):
+    """
+    Guarda en el registro los modelos y métricas y depura los artefactos más antiguos
+    """
+    os.makedirs(RUTA_REGISTRO_MODELOS, exist_ok=True)
+    joblib.dump(contenido, os.path.join(RUTA_REGISTRO_MODELOS, f"{clave}.joblib"), compress=3)
+    depurar_registro_modelos()
+
+def depurar_registro_modelos(tamano_maximo_mb=TAMANO_MAXIMO_REGISTRO_MB):
+    """
+    Elimina los artefactos usados hace más tiempo hasta que el registro quede bajo el tamaño máximo
+    """
+    if not os.path.isdir(RUTA_REGISTRO_MODELOS):
+        return
+    archivos = [os.path.join(RUTA_REGISTRO_MODELOS, nombre) for nombre in os.listdir(RUTA_REGISTRO_MODELOS)
+                if nombre.endswith('.joblib')]
+    archivos.sort(key=os.path.getmtime)
+    tamano_total = sum(os.path.getsize(ruta) for ruta in archivos)
+    limite = tamano_maximo_mb * 1024 * 1024
+    while archivos and tamano_total > limite:
+        ruta = archivos.pop(0)
+        tamano_total -= os.path.getsize(ruta)
+        os.remove(ruta)
+
+# Función para guardar en session state los modelos entrenados y elegir el mejor
+def registrar_modelos_sesion(resultados, X_test, y_test, datos_agrupados):
+    """
+    Guarda los modelos en session state y determina el mejor modelo (basado en R²).
+    Retorna (nombre del mejor modelo, R² del mejor modelo)
+    """
+    st.session_state.modelos_entrenados = resultados
+    st.session_state.predicciones_grilla = {}
+    st.session_state.datos_prediccion = {
+        'X_test': X_test,
+        'y_test': y_test,
+        'datos_agrupados': datos_agrupados
+    }
     
-    # Sumatoria de predicción
-    suma_prediccion = df_grafica['Predicción'].sum()
+    mejor_modelo_nombre = None
+    mejor_r2 = -float('inf')
+    metricas_comparativas = []
     
-    # Pico de predicción
-    pico_prediccion_idx = df_grafica['Predicción'].idxmax()
-    pico_prediccion = df_grafica.loc[pico_prediccion_idx, 'Predicción']
-    hora_pico_prediccion = df_grafica.loc[pico_prediccion_idx, 'Hora']
+    for nombre, resultado in resultados.items():
+        if resultado['r2'] > mejor_r2:
+            mejor_r2 = resultado['r2']
+            mejor_modelo_nombre = nombre
+        
+        metricas_comparativas.append({
+            'Modelo': nombre,
+            'MSE': resultado['mse'],
+            'MAE': resultado['mae'],
+            'R²': resultado['r2'],
+            'R² por partición': ', '.join(f"{r2:.3f}" for r2 in resultado.get('r2_particiones', []))
+        })
     
-    # Predicción promedio por hora (solo horas con predicción > 0)
-    horas_con_prediccion = df_grafica[df_grafica['Predicción'] > 0]
-    if not horas_con_prediccion.empty:
-        prediccion_promedio_hora = horas_con_prediccion['Predicción'].mean()
+    st.session_state.mejor_modelo = mejor_modelo_nombre
+    st.session_state.metricas_modelos = pd.DataFrame(metricas_comparativas)
+    return mejor_modelo_nombre, mejor_r2
+
+# Función para construir la grilla de características de predicción
+def construir_grilla_prediccion(datos_agrupados, minutos_intervalo=60):
+    """
+    Construye de una sola vez la matriz de características (día de la semana × franja de minutos_intervalo)
+    para un día típico: mes más frecuente de los datos, día del mes 15 y semana del mes 2
+    """
+    if not datos_agrupados.empty and not datos_agrupados['Mes'].mode().empty:
+        mes_comun = datos_agrupados['Mes'].mode()[0]
     else:
-        prediccion_promedio_hora = 0
+        mes_comun = 1
+    dia_mes_comun = 15
+    semana_mes_comun = 2
     
-    # Máximo capacidad disponible
-    max_capacidad_disponible = max_capacidad_total if max_capacidad_total is not None else 0
+    dias, horas = np.meshgrid(np.arange(7), np.arange(1440 // minutos_intervalo) * minutos_intervalo / 60, indexing='ij')
+    return pd.DataFrame({
+        'Dia_Semana_Num': dias.ravel(),
+        'Hora': horas.ravel(),
+        'Mes': mes_comun,
+        'Dia_Mes': dia_mes_comun,
+        'Semana_Mes': semana_mes_comun
+    })
+
+# Función para predecir la grilla completa con un modelo
+def predecir_grilla(modelo, grilla):
+    """
+    Predice toda la grilla en una sola llamada y retorna un arreglo (7 días × franjas del día) sin valores negativos
+    """
+    try:
+        predicciones = np.maximum(modelo.predict(grilla), 0)
+    except Exception:
+        predicciones = np.zeros(len(grilla))
+    return predicciones.reshape(7, -1)
+
+# Tarea de un worker: entrenar un modelo de cuantil
+def entrenar_modelo_cuantil(cuantil, X, y):
+    """
+    Entrena un Gradient Boosting con pérdida de cuantil (alpha=cuantil). Retorna (cuantil, modelo)
+    """
+    min_estimators, max_estimators = PARAMETROS_MODELOS['gb_n_estimators']
+    modelo = GradientBoostingRegressor(
+        loss='quantile',
+        alpha=cuantil,
+        n_estimators=max(min_estimators, min(max_estimators, len(X) // 2)),
+        random_state=PARAMETROS_MODELOS['random_state'],
+        **PARAMETROS_MODELOS['gb']
+    )
+    modelo.fit(X, y)
+    return cuantil, modelo
+
+# Función para entrenar los modelos de cuantiles del pronóstico
+def entrenar_modelos_cuantiles(X, y):
+    """
+    Entrena en paralelo un modelo por cada cuantil de PARAMETROS_MODELOS['cuantiles'].
+    Retorna un diccionario {cuantil: modelo}
+    """
+    tareas = [delayed(entrenar_modelo_cuantil)(cuantil, X, y) for cuantil in PARAMETROS_MODELOS['cuantiles']]
+    try:
+        salidas = Parallel(n_jobs=-1)(tareas)
+    except Exception:
+        # Si no se pueden crear procesos, entrenar en el proceso actual
+        salidas = Parallel(n_jobs=1)(tareas)
+    return dict(salidas)
+
+# Función para obtener los modelos de cuantiles (del registro local o entrenándolos)
+def obtener_modelos_cuantiles(X, y, empresas_seleccionadas):
+    """
+    Busca en el registro los modelos de cuantiles entrenados con estos datos y, si no existen,
+    los entrena y los guarda. Retorna (modelos {cuantil: modelo}, True si vinieron del registro)
+    """
+    clave = f"{calcular_clave_modelos(X, y, empresas_seleccionadas)}_cuantiles"
+    guardado = cargar_modelos_registro(clave)
+    if guardado is not None:
+        return guardado['modelos'], True
     
-    return {
-        'suma_prediccion': suma_prediccion,
-        'pico_prediccion': pico_prediccion,
-        'hora_pico_prediccion': hora_pico_prediccion,
-        'prediccion_promedio_hora': prediccion_promedio_hora,
-        'max_capacidad_disponible': max_capacidad_disponible
-    }
+    modelos = entrenar_modelos_cuantiles(X, y)
+    guardar_modelos_registro(clave, {'modelos': modelos, 'fecha_entrenamiento': datetime.now().isoformat()})
+    return modelos, False
 
-# Función para calcular métricas de gráficas de predicción "por recursos"
-def calcular_metricas_prediccion_recursos(df_grafica, dia_seleccionado, recursos_por_hora):
-    """
-    Calcula métricas para gráficas de predicción "por recursos":
-    - Máximo recursos disponible
-    - Máximo recursos requeridos (predicción)
-    - Máximo déficit de recursos (predicción)
-    """
-    if df_grafica.empty:
-        return {
-            'max_recursos_disponible': 0,
-            'hora_max_recursos': 0,
-            'max_recursos_requeridos_pred': 0,
-            'hora_max_requeridos_pred': 0,
-            'max_deficit_prediccion': 0,
-            'hora_max_deficit_pred': 0
-        }
+# Función para construir la grilla de características de las fechas del horizonte
+def construir_grilla_horizonte(fecha_inicio, semanas, minutos_intervalo=60):
+    """
+    Construye de una sola vez la matriz de características de cada fecha real del horizonte
+    (semanas × 7 fechas desde fecha_inicio) × cada franja de minutos_intervalo.
+    Retorna (fechas, grilla)
+    """
+    fechas = pd.date_range(fecha_inicio, periods=semanas * 7, freq='D')
+    franjas_dia = 1440 // minutos_intervalo
+    grilla = pd.DataFrame({
+        'Fecha': np.repeat(fechas, franjas_dia),
+        'Hora': np.tile(np.arange(franjas_dia) * minutos_intervalo / 60, len(fechas))
+    })
+    agregar_caracteristicas_calendario(grilla)
+    return fechas, grilla[CARACTERISTICAS_PREDICCION]
+
+# Función para predecir el horizonte completo con los modelos de cuantiles
+def predecir_horizonte(modelos_cuantiles, grilla, n_fechas):
+    """
+    Predice toda la grilla del horizonte con cada modelo en una sola llamada.
+    Retorna {cuantil: arreglo (fechas × franjas del día)} sin valores negativos y sin cruces
+    (cada cuantil es al menos el cuantil anterior)
+    """
+    predicciones = {}
+    anterior = 0
+    for cuantil in sorted(modelos_cuantiles):
+        anterior = np.maximum(modelos_cuantiles[cuantil].predict(grilla), anterior)
+        predicciones[cuantil] = anterior.reshape(n_fechas, -1)
+    return predicciones
+
+# Función para armar la tabla del pronóstico por fecha y franja
+def tabla_pronostico(pronostico, recursos_por_hora, minutos_intervalo=60):
+    """
+    Convierte el pronóstico en una tabla larga (una fila por fecha y franja) con la demanda de cada
+    cuantil (P50, P90, ...) y los recursos necesarios (Erlang C) para cada uno. Los recursos disponibles
+    solo se consideran en días laborales
+    """
+    fechas = pronostico['fechas']
+    etiquetas = etiquetas_franjas(minutos_intervalo)
+    franjas_dia = len(etiquetas)
     
-    if dia_seleccionado in ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Todos']:
-        # Máximo recursos disponible
-        max_recursos_disponible = 0
-        hora_max_recursos = 0
-        for hora, valor in recursos_por_hora.items():
-            capacidad_recursos = valor  # Ya es en recursos base
-            if capacidad_recursos > max_recursos_disponible:
-                max_recursos_disponible = capacidad_recursos
-                hora_max_recursos = hora
-        
-        # Máximo recursos requeridos (predicción)
-        df_grafica['Prediccion_Recursos'] = df_grafica['Predicción'] / CONSTANTE_VALIDACION
-        max_recursos_requeridos_pred_idx = df_grafica['Prediccion_Recursos'].idxmax()
-        max_recursos_requeridos_pred = df_grafica.loc[max_recursos_requeridos_pred_idx, 'Prediccion_Recursos']
-        hora_max_requeridos_pred = df_grafica.loc[max_recursos_requeridos_pred_idx, 'Hora']
-        
-        # Máximo déficit de recursos (predicción)
-        # Calcular déficit comparando predicción con capacidad disponible
-        deficit_prediccion = []
-        for idx, row in df_grafica.iterrows():
-            hora = int(row['Hora'])
-            recursos_disponibles_hora = recursos_por_hora.get(hora, 0)
-            recursos_requeridos_pred = row['Prediccion_Recursos']
-            deficit = max(0, recursos_requeridos_pred - recursos_disponibles_hora)
-            deficit_prediccion.append(deficit)
-        
-        df_grafica['Deficit_Prediccion'] = deficit_prediccion
-        max_deficit_prediccion = df_grafica['Deficit_Prediccion'].max()
-        if max_deficit_prediccion > 0:
-            max_deficit_idx = df_grafica['Deficit_Prediccion'].idxmax()
-            hora_max_deficit_pred = df_grafica.loc[max_deficit_idx, 'Hora']
-        else:
-            hora_max_deficit_pred = 0
-    else:
-        # Para sábado y domingo
-        max_recursos_disponible = 0
-        hora_max_recursos = 0
-        
-        # Máximo recursos requeridos (predicción)
-        df_grafica['Prediccion_Recursos'] = df_grafica['Predicción'] / CONSTANTE_VALIDACION
-        max_recursos_requeridos_pred_idx = df_grafica['Prediccion_Recursos'].idxmax()
-        max_recursos_requeridos_pred = df_grafica.loc[max_recursos_requeridos_pred_idx, 'Prediccion_Recursos']
-        hora_max_requeridos_pred = df_grafica.loc[max_recursos_requeridos_pred_idx, 'Hora']
-        
-        max_deficit_prediccion = 0
-        hora_max_deficit_pred = 0
+    tabla = pd.DataFrame({
+        'Fecha': np.repeat(fechas, franjas_dia),
+        'Dia_Semana': np.repeat(np.array(ORDEN_DIAS)[fechas.dayofweek], franjas_dia),
+        'Franja': np.tile(np.arange(franjas_dia), len(fechas)),
+        'Hora': np.tile(etiquetas, len(fechas))
+    })
+    for cuantil, prediccion in pronostico['cuantiles'].items():
+        nombre = f"P{int(round(cuantil * 100))}"
+        tabla[nombre] = np.round(prediccion.ravel(), 2)
+        tabla[f"Recursos_{nombre}"] = calcular_recursos_necesarios(prediccion, minutos_intervalo=minutos_intervalo).ravel()
     
-    return {
-        'max_recursos_disponible': max_recursos_disponible,
-        'hora_max_recursos': hora_max_recursos,
-        'max_recursos_requeridos_pred': max_recursos_requeridos_pred,
-        'hora_max_requeridos_pred': hora_max_requeridos_pred,
-        'max_deficit_prediccion': max_deficit_prediccion,
-        'hora_max_deficit_pred': hora_max_deficit_pred
-    }
+    recursos = serie_horaria(recursos_por_hora, minutos_intervalo)
+    tabla['Recursos_Disponibles'] = np.where(tabla['Dia_Semana'].isin(DIAS_LABORALES), recursos[tabla['Franja']], 0)
+    tabla['Capacidad_Disponible'] = (tabla['Recursos_Disponibles'] * capacidad_por_recurso(minutos_intervalo)).round(2)
+    return tabla
+
+# Función para mostrar el pronóstico por fechas
+def mostrar_pronostico(tabla, minutos_intervalo=60):
+    """
+    Muestra la demanda diaria P50/P90 del horizonte y el detalle por franja de la fecha seleccionada
+    """
+    # Demanda diaria por cuantil
+    diario = tabla.groupby('Fecha')[['P50', 'P90']].sum()
+    st.write("#### 📆 Demanda diaria pronosticada")
+    st.line_chart(diario, height=350)
+    
+    fecha_pico = diario['P90'].idxmax()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Demanda Total P50", f"{diario['P50'].sum():.0f} llamadas")
+    with col2:
+        st.metric("Demanda Total P90", f"{diario['P90'].sum():.0f} llamadas",
+                  f"{diario['P90'].sum() - diario['P50'].sum():+.0f} vs P50")
+    with col3:
+        st.metric("Día Pico (P90)", f"{diario['P90'].max():.0f} llamadas", f"{fecha_pico.date()}")
+    
+    # Detalle por franja de una fecha del horizonte
+    fecha_detalle = st.selectbox(
+        "Selecciona fecha para ver el detalle:",
+        options=list(diario.index),
+        format_func=lambda fecha: f"{fecha.date()} ({ORDEN_DIAS[fecha.dayofweek]})",
+        key="selector_fecha_pronostico"
+    )
+    detalle = tabla[tabla['Fecha'] == fecha_detalle].set_index('Hora')
+    
+    col_grafica1, col_grafica2 = st.columns(2)
+    with col_grafica1:
+        st.write("#### 📊 Por Llamadas")
+        st.line_chart(detalle[['P50', 'P90', 'Capacidad_Disponible']], height=400)
+    with col_grafica2:
+        st.write("#### 👥 Por Recursos")
+        st.line_chart(detalle[['Recursos_P50', 'Recursos_P90', 'Recursos_Disponibles']], height=400)
+    
+    deficit_p90 = np.maximum(detalle['Recursos_P90'] - detalle['Recursos_Disponibles'], 0)
+    if deficit_p90.max() > 0:
+        st.warning(f"Con la curva P90 faltan hasta {deficit_p90.max():.0f} recursos "
+                   f"({nombre_intervalo(minutos_intervalo)}: {deficit_p90.idxmax()})")
+    else:
+        st.success("Los recursos disponibles cubren la curva P90 de esta fecha")
 
 # Función para crear gráfica de predicción
 def crear_grafica_prediccion(dia_seleccionado, predicciones_dia, recursos_por_hora, demanda_promedio_actual, empresas_info, max_capacidad_total):
     """
     Crea una gráfica con las predicciones para un día específico
+    (predicciones_dia y demanda_promedio_actual son arreglos por franja del día)
     """
-    # Crear DataFrame con las predicciones por hora
-    horas = list(range(24))
-    predicciones_por_hora = []
+    # DataFrame con las predicciones por franja sobre el índice fijo de franjas del día
+    minutos_intervalo = obtener_minutos_intervalo()
+    recursos = serie_horaria(recursos_por_hora, minutos_intervalo)
+    df_grafica = pd.DataFrame({
+        'Franja': np.arange(len(recursos)),
+        'Hora': etiquetas_franjas(minutos_intervalo),
+        'Predicción': np.asarray(predicciones_dia, dtype=float),
+        'Promedio Actual': np.asarray(demanda_promedio_actual, dtype=float),
+        'Capacidad Disponible': recursos * capacidad_por_recurso(minutos_intervalo),
+        'Recursos Disponibles': recursos
+    })
     
-    for hora in horas:
-        prediccion = predicciones_dia.get(hora, 0)
-        promedio_actual = demanda_promedio_actual.get(hora, 0)
-        capacidad = recursos_por_hora.get(hora, 0) * CONSTANTE_VALIDACION if hora in recursos_por_hora else 0
-        
-        predicciones_por_hora.append({
-            'Hora': hora,
-            'Predicción': prediccion,
-            'Promedio Actual': promedio_actual,
-            'Capacidad Disponible': capacidad
-        })
+    # Recursos necesarios (Erlang C) de la predicción y del promedio actual
+    df_grafica['Prediccion_Recursos'] = calcular_recursos_necesarios(df_grafica['Predicción'])
+    df_grafica['Promedio_Recursos'] = calcular_recursos_necesarios(df_grafica['Promedio Actual'])
     
-    df_grafica = pd.DataFrame(predicciones_por_hora)
+    metricas = calcular_metricas_horarias(df_grafica['Predicción'].to_numpy(), df_grafica['Prediccion_Recursos'].to_numpy(),
+                                          recursos, dia_seleccionado, max_capacidad_total, minutos_intervalo)
     
     # Crear gráficas en paralelo
     if empresas_info:
@@ -864,67 +1093,35 @@ def crear_grafica_prediccion(dia_seleccionado, predicciones_dia, recursos_por_ho
     
     with col_grafica1:
         st.write("#### 📊 Por Llamadas")
-        chart_data = df_grafica[['Hora', 'Predicción', 'Promedio Actual', 'Capacidad Disponible']].set_index('Hora')
-        chart_data = chart_data.rename(columns={
-            'Predicción': 'Predicción',
-            'Promedio Actual': 'Promedio Actual',
-            'Capacidad Disponible': 'Capacidad Disponible'
-        })
-        
-        # Mostrar gráfica
+        chart_data = df_grafica.set_index('Hora')[['Predicción', 'Promedio Actual', 'Capacidad Disponible']]
         st.line_chart(chart_data, height=400)
         
-        # Calcular y mostrar métricas para gráfica de predicción "por llamadas"
-        metricas_pred_llamadas = calcular_metricas_prediccion_llamadas(df_grafica, max_capacidad_total)
-        
-        st.write("**Métricas - Predicción Por Llamadas:**")
-        col1_pred_ll, col2_pred_ll, col3_pred_ll, col4_pred_ll = st.columns(4)
-        with col1_pred_ll:
-            st.metric("Sumatoria Predicción", f"{metricas_pred_llamadas['suma_prediccion']:.0f} llamadas")
-        with col2_pred_ll:
-            st.metric("Pico Predicción", f"{metricas_pred_llamadas['pico_prediccion']:.0f}", 
-                     f"Hora: {metricas_pred_llamadas['hora_pico_prediccion']}:00")
-        with col3_pred_ll:
-            st.metric("Predicción Promedio/Hora", f"{metricas_pred_llamadas['prediccion_promedio_hora']:.1f}")
-        with col4_pred_ll:
-            st.metric("Máximo Capacidad Disponible", f"{metricas_pred_llamadas['max_capacidad_disponible']:.1f}")
+        mostrar_metricas_llamadas(metricas, "Métricas - Predicción Por Llamadas", "Predicción", minutos_intervalo)
     
     with col_grafica2:
         st.write("#### 👥 Por Recursos")
-        # Crear versión de datos para recursos (dividiendo por CONSTANTE_VALIDACION)
-        df_recursos = df_grafica.copy()
-        df_recursos['Prediccion_Recursos'] = df_recursos['Predicción'] / CONSTANTE_VALIDACION
-        df_recursos['Promedio_Recursos'] = df_recursos['Promedio Actual'] / CONSTANTE_VALIDACION
-        df_recursos['Capacidad_Recursos'] = df_recursos['Capacidad Disponible'] / CONSTANTE_VALIDACION
-        
-        chart_data_recursos = df_recursos[['Hora', 'Prediccion_Recursos', 'Promedio_Recursos', 'Capacidad_Recursos']].set_index('Hora')
-        chart_data_recursos = chart_data_recursos.rename(columns={
+        # Recursos necesarios (Erlang C) de la predicción y del promedio frente a los disponibles
+        chart_data_recursos = df_grafica.set_index('Hora')[['Prediccion_Recursos', 'Promedio_Recursos', 'Recursos Disponibles']].rename(columns={
             'Prediccion_Recursos': 'Predicción Recursos',
-            'Promedio_Recursos': 'Promedio Actual Recursos',
-            'Capacidad_Recursos': 'Recursos Disponibles'
+            'Promedio_Recursos': 'Promedio Actual Recursos'
         })
-        
-        # Mostrar gráfica de recursos
         st.line_chart(chart_data_recursos, height=400)
         
-        # Calcular y mostrar métricas para gráfica de predicción "por recursos"
-        metricas_pred_recursos = calcular_metricas_prediccion_recursos(df_grafica, dia_seleccionado, recursos_por_hora)
-        
         st.write("**Métricas - Predicción Por Recursos:**")
         col1_pred_re, col2_pred_re, col3_pred_re = st.columns(3)
         with col1_pred_re:
-            if metricas_pred_recursos['max_recursos_disponible'] > 0:
-                st.metric("Máximo Recursos Disponible", f"{metricas_pred_recursos['max_recursos_disponible']:.1f}",
-                         f"Hora: {metricas_pred_recursos['hora_max_recursos']}:00")
+            if metricas['max_recursos_disponible'] > 0:
+                st.metric("Máximo Recursos Disponible", f"{metricas['max_recursos_disponible']:.1f}",
+                         f"Hora: {metricas['hora_max_recursos']}")
             else:
                 st.metric("Máximo Recursos Disponible", "0.0", "No aplica")
         with col2_pred_re:
-            st.metric("Máximo Recursos Requeridos", f"{metricas_pred_recursos['max_recursos_requeridos_pred']:.1f}",
-                     f"Hora: {metricas_pred_recursos['hora_max_requeridos_pred']}:00")
+            st.metric("Máximo Recursos Requeridos", f"{metricas['max_recursos_requeridos']:.1f}",
+                     f"Hora: {metricas['hora_max_requeridos']}")
         with col3_pred_re:
-            if metricas_pred_recursos['max_deficit_prediccion'] > 0:
-                st.metric("Máximo Déficit (Pred)", f"{metricas_pred_recursos['max_deficit_prediccion']:.1f}",
-                         f"Hora: {metricas_pred_recursos['hora_max_deficit_pred']}:00")
+            if metricas['max_deficit_recursos'] > 0:
+                st.metric("Máximo Déficit (Pred)", f"{metricas['max_deficit_recursos']:.1f}",
+                         f"Hora: {metricas['hora_max_deficit']}")
             else:
                 st.metric("Máximo Déficit (Pred)", "0.0", "Sin déficit")
     
@@ -967,26 +1164,100 @@ def main():
         st.session_state.metricas_modelos = None
     if 'datos_prediccion' not in st.session_state:
         st.session_state.datos_prediccion = None
+    if 'predicciones_grilla' not in st.session_state:
+        st.session_state.predicciones_grilla = {}
     if 'empresas_seleccionadas' not in st.session_state:
         st.session_state.empresas_seleccionadas = []
     if 'max_capacidad_total' not in st.session_state:
         st.session_state.max_capacidad_total = 0
+    if 'clave_datos' not in st.session_state:
+        st.session_state.clave_datos = None
+    if 'pronostico' not in st.session_state:
+        st.session_state.pronostico = None
+    
+    # Origen de los datos: archivo cargado o histórico local por rango de fechas
+    with st.sidebar:
+        st.markdown("---")
+        st.header("Intervalo de Análisis")
+        minutos_intervalo = st.selectbox(
+            "Granularidad de la demanda:",
+            options=INTERVALOS_DISPONIBLES,
+            format_func=lambda minutos: "1 hora" if minutos == 60 else f"{minutos} minutos",
+            key="minutos_intervalo"
+        )
+        
+        st.markdown("---")
+        st.header("Histórico Local")
+        fecha_min_almacen, fecha_max_almacen, total_almacen = rango_fechas_almacen()
+        usar_historico = False
+        if total_almacen:
+            st.caption(f"{total_almacen:,} llamadas entre {fecha_min_almacen} y {fecha_max_almacen}")
+            usar_historico = st.checkbox("Analizar desde el histórico local", value=False, key="usar_historico")
+            if usar_historico:
+                rango_fechas = st.date_input(
+                    "Rango de fechas:",
+                    value=(fecha_min_almacen, fecha_max_almacen),
+                    min_value=fecha_min_almacen,
+                    max_value=fecha_max_almacen,
+                    key="rango_historico"
+                )
+                # Mientras se elige el rango, date_input retorna solo la fecha inicial
+                fecha_inicio = rango_fechas[0]
+                fecha_fin = rango_fechas[1] if len(rango_fechas) > 1 else rango_fechas[0]
+        else:
+            st.caption("Aún no hay llamadas en el histórico local. Agrega un archivo desde la pestaña de datos "
+                       "o ejecuta `python almacen_llamadas.py <carpeta>` para ingerir los CSV de la central.")
     
-    if uploaded_file is not None:
+    if uploaded_file is not None or usar_historico:
         try:
-            # Leer el archivo CSV
-            df = pd.read_csv(uploaded_file)
+            if usar_historico:
+                # Consultar el histórico por rango de fechas (sin volver a leer los CSV)
+                clave_datos = f"historico|{fecha_inicio}|{fecha_fin}|{total_almacen}"
+                conteos_archivo, resumen_archivo, vista_previa = consultar_almacen_llamadas(fecha_inicio, fecha_fin)
+            else:
+                # Leer el archivo CSV por bloques y reducirlo a conteos (una sola vez por archivo)
+                clave_datos = calcular_hash_archivo(uploaded_file)
+                vista_previa = pd.read_csv(uploaded_file, nrows=10)
+                with st.spinner("Leyendo el archivo por bloques..."):
+                    conteos_archivo, resumen_archivo = agregar_llamadas_por_bloques(clave_datos, uploaded_file)
+            cubo_demanda = construir_cubo_demanda(clave_datos, conteos_archivo)
+            
+            # Con otros datos u otro intervalo, la demanda y los modelos calculados dejan de aplicar
+            if st.session_state.clave_datos != f"{clave_datos}|{minutos_intervalo}":
+                st.session_state.clave_datos = f"{clave_datos}|{minutos_intervalo}"
+                st.session_state.demanda_df = None
+                st.session_state.modelos_entrenados = None
+                st.session_state.mejor_modelo = None
+                st.session_state.metricas_modelos = None
+                st.session_state.datos_prediccion = None
+                st.session_state.predicciones_grilla = {}
+                st.session_state.pronostico = None
             
             # Mostrar pestañas para diferentes vistas
             tab1, tab2, tab3 = st.tabs(["📋 Datos y Configuración", "📊 Resultados y Análisis", "🤖 Predicción de Demanda"])
             
             with tab1:
                 st.subheader("Datos Originales")
-                st.write(f"**Forma del dataset:** {df.shape[0]} filas × {df.shape[1]} columnas")
+                if usar_historico:
+                    st.write(f"**Histórico local:** {resumen_archivo['filas_archivo']:,} llamadas entre {fecha_inicio} y {fecha_fin}")
+                else:
+                    st.write(f"**Forma del dataset:** {resumen_archivo['filas_archivo']} filas × {vista_previa.shape[1]} columnas")
                 
                 # Mostrar vista previa de datos
                 st.write("**Vista previa de datos (primeras 10 filas):**")
-                st.dataframe(df.head(10), use_container_width=True)
+                st.dataframe(vista_previa, use_container_width=True)
+                
+                # Agregar el archivo al histórico local (solo las llamadas que aún no estén registradas)
+                if not usar_historico:
+                    with st.expander("🗄️ Agregar este archivo al histórico local"):
+                        st.write("Se guardan las llamadas clasificadas (externo → interno). Las llamadas ya registradas (misma hora, origen y destino) se omiten.")
+                        if st.button("Agregar al histórico", key="agregar_historico"):
+                            with st.spinner("Agregando llamadas al histórico..."):
+                                resultado_almacen = agregar_archivo_almacen(uploaded_file)
+                                registrar_archivo_procesado(clave_datos, uploaded_file.name, uploaded_file.size,
+                                                            datetime.now().timestamp(), resultado_almacen)
+                            st.success(f"✅ {resultado_almacen['nuevas']:,} llamadas nuevas agregadas "
+                                       f"({resultado_almacen['clasificadas'] - resultado_almacen['nuevas']:,} ya estaban en el histórico)")
                 
                 # Divider
                 st.divider()
@@ -1006,6 +1277,12 @@ def main():
                 # Guardar empresas seleccionadas en session state
                 st.session_state.empresas_seleccionadas = empresas_seleccionadas
                 
+                # Con la demanda ya calculada, un cambio de empresas solo vuelve a reducir el cubo
+                if st.session_state.demanda_df is not None:
+                    etiqueta_empresas = ', '.join(empresas_seleccionadas) if empresas_seleccionadas else 'Todas'
+                    if st.session_state.demanda_df['Empresas_Filtradas'].iloc[0] != etiqueta_empresas:
+                        st.session_state.demanda_df = calcular_demanda_cubo(cubo_demanda, empresas_seleccionadas, minutos_intervalo)
+                
                 # Mostrar información sobre las extensiones por empresa
                 with st.expander("📋 Ver distribución de extensiones por empresa"):
                     for empresa in empresas_disponibles:
@@ -1013,16 +1290,20 @@ def main():
                         st.write(f"**{empresa}:** {num_extensiones} extensiones")
                         st.write(f"Extensiones: {', '.join(CODIGOS_POR_EMPRESA[empresa][:5])}..." if num_extensiones > 5 else f"Extensiones: {', '.join(CODIGOS_POR_EMPRESA[empresa])}")
                 
-                # Configuración de recursos por hora en dos columnas
-                st.subheader("👥 Configuración de Recursos por Hora")
-                st.info("Ingresa la cantidad de personas disponibles para cada hora (6:00 AM - 7:00 PM)")
-                st.write(f"**Nota:** Cada valor se multiplicará por {CONSTANTE_VALIDACION} para calcular capacidad disponible")
+                # Configuración de recursos por franja en dos columnas
+                st.subheader(f"👥 Configuración de Recursos por {nombre_intervalo(minutos_intervalo)}")
+                st.info(f"Ingresa la cantidad de personas disponibles para cada {nombre_intervalo(minutos_intervalo).lower()} (6:00 AM - 7:00 PM)")
+                if minutos_intervalo == 60:
+                    st.write(f"**Nota:** Cada valor se multiplicará por {CONSTANTE_VALIDACION} para calcular capacidad disponible")
+                else:
+                    st.write(f"**Nota:** Cada valor se multiplicará por {capacidad_por_recurso(minutos_intervalo):.2f} "
+                             f"({CONSTANTE_VALIDACION} por hora) para calcular capacidad disponible en la franja")
                 
                 col_recursos1, col_recursos2 = st.columns([3, 2])
                 
                 with col_recursos1:
-                    # Ingresar recursos por hora
-                    recursos = ingresar_recursos_por_hora()
+                    # Ingresar recursos por franja
+                    recursos = ingresar_recursos_por_hora(minutos_intervalo)
                     
                     # Guardar recursos en session state
                     st.session_state.recursos_por_hora = recursos
@@ -1030,7 +1311,7 @@ def main():
                     # Calcular máximo de recursos base y máxima capacidad
                     if recursos:
                         max_recursos_base = max(recursos.values())
-                        max_capacidad = max_recursos_base * CONSTANTE_VALIDACION
+                        max_capacidad = max_recursos_base * capacidad_por_recurso(minutos_intervalo)
                         st.metric("Máximo recursos base", f"{max_recursos_base}")
                         st.metric("Máxima capacidad", f"{max_capacidad:.1f}")
                         
@@ -1040,18 +1321,50 @@ def main():
                 with col_recursos2:
                     # Mostrar gráfico de recursos por hora
                     if recursos:
-                        st.write("**📈 Distribución de recursos por hora (base):**")
-                        recursos_df = pd.DataFrame(list(recursos.items()), columns=['Hora', 'Recursos_Base'])
+                        st.write(f"**📈 Distribución de recursos por {nombre_intervalo(minutos_intervalo).lower()} (base):**")
+                        recursos_df = pd.DataFrame({
+                            'Hora': [etiquetas_franjas(minutos_intervalo)[franja] for franja in recursos],
+                            'Recursos_Base': list(recursos.values())
+                        })
                         st.bar_chart(recursos_df.set_index('Hora')['Recursos_Base'])
                 
+                # Objetivos de servicio para el dimensionamiento con Erlang C
+                st.subheader("📐 Objetivos de Servicio (Erlang C)")
+                st.info("Los recursos necesarios se calculan con Erlang C a partir de la demanda por intervalo, el tiempo promedio de atención y el nivel de servicio objetivo")
+                col_erlang1, col_erlang2, col_erlang3, col_erlang4 = st.columns(4)
+                with col_erlang1:
+                    minutos_atencion = st.number_input("Tiempo promedio de atención (min)", min_value=0.1, max_value=60.0,
+                                                       value=PARAMETROS_ERLANG_DEFECTO['minutos_atencion'], step=0.1, key="erlang_minutos_atencion")
+                with col_erlang2:
+                    nivel_servicio = st.number_input("Nivel de servicio objetivo (%)", min_value=1, max_value=99,
+                                                     value=int(PARAMETROS_ERLANG_DEFECTO['nivel_servicio'] * 100), key="erlang_nivel_servicio")
+                with col_erlang3:
+                    segundos_objetivo = st.number_input("Tiempo objetivo de respuesta (s)", min_value=1, max_value=600,
+                                                        value=PARAMETROS_ERLANG_DEFECTO['segundos_objetivo'], key="erlang_segundos_objetivo")
+                with col_erlang4:
+                    asa_maxima = st.number_input("Espera promedio máxima (s, 0 = sin límite)", min_value=0, max_value=600,
+                                                 value=PARAMETROS_ERLANG_DEFECTO['asa_maxima'], key="erlang_asa_maxima")
+                st.session_state.parametros_erlang = {
+                    'minutos_atencion': minutos_atencion,
+                    'nivel_servicio': nivel_servicio / 100,
+                    'segundos_objetivo': segundos_objetivo,
+                    'asa_maxima': asa_maxima
+                }
+                
+                # Con la demanda ya calculada, un cambio de objetivos solo vuelve a resolver Erlang C
+                if st.session_state.demanda_df is not None:
+                    st.session_state.demanda_df['Recursos_Necesarios'] = calcular_recursos_necesarios(
+                        st.session_state.demanda_df['Promedio_Demanda']
+                    )
+                
                 # Botón para procesar datos de demanda
                 st.divider()
                 st.subheader("Procesamiento de Datos de Demanda")
                 
                 if st.button("📊 Calcular Demanda Promedio", type="primary", use_container_width=True):
                     with st.spinner("Calculando demanda promedio..."):
-                        # Procesar datos para calcular demanda CON FILTRO
-                        demanda_df = procesar_datos_demanda_filtrada(df, empresas_seleccionadas)
+                        # Calcular demanda CON FILTRO reduciendo el cubo del archivo a las empresas seleccionadas
+                        demanda_df = procesar_datos_demanda_filtrada(cubo_demanda, resumen_archivo, empresas_seleccionadas, minutos_intervalo)
                         
                         if demanda_df is not None:
                             # Guardar en session state
@@ -1110,8 +1423,8 @@ def main():
                     if dia_seleccionado == "Todos":
                         dias_semana = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
                         demanda_dia = demanda_df[demanda_df['Dia_Semana'].isin(dias_semana)].copy()
-                        # Calcular promedio por hora
-                        export_data = demanda_dia.groupby('Hora').agg({
+                        # Calcular promedio por franja
+                        export_data = demanda_dia.groupby(['Franja', 'Hora']).agg({
                             'Promedio_Demanda': 'mean',
                             'Recursos_Necesarios': 'mean'
                         }).reset_index()
@@ -1121,14 +1434,15 @@ def main():
                         nombre_base = "promedio_lv"
                     else:
                         demanda_dia = demanda_df[demanda_df['Dia_Semana'] == dia_seleccionado].copy()
-                        export_data = demanda_dia[['Hora', 'Promedio_Demanda', 'Recursos_Necesarios']].copy()
+                        export_data = demanda_dia[['Franja', 'Hora', 'Promedio_Demanda', 'Recursos_Necesarios']].copy()
                         nombre_base = dia_seleccionado.lower().replace('á', 'a').replace('é', 'e').replace('í', 'i').replace('ó', 'o').replace('ú', 'u')
                     
                     # Para días con capacidad disponible, agregar columnas adicionales
-                    if dia_seleccionado in ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Todos']:
-                        export_data['Recursos_Base'] = export_data['Hora'].apply(lambda h: recursos_por_hora.get(h, 0))
-                        export_data['Capacidad_Disponible'] = (export_data['Recursos_Base'] * CONSTANTE_VALIDACION).round(2)
+                    if dia_seleccionado in DIAS_CON_RECURSOS:
+                        export_data['Recursos_Base'] = export_data['Franja'].map(recursos_por_hora).fillna(0).astype(int)
+                        export_data['Capacidad_Disponible'] = (export_data['Recursos_Base'] * capacidad_por_recurso(minutos_intervalo)).round(2)
                         export_data['Diferencia'] = (export_data['Capacidad_Disponible'] - export_data['Promedio_Demanda']).round(2)
+                    export_data = export_data.drop(columns='Franja')
                     
                     # Agregar información de empresas
                     if empresas_seleccionadas:
@@ -1192,45 +1506,48 @@ def main():
                     st.divider()
                     st.write("### 🚀 Configuración de Predicción")
                     
+                    # Recuperar del registro local los modelos entrenados con estos mismos datos (p. ej. tras refrescar)
+                    if st.session_state.modelos_entrenados is None:
+                        X, y, datos_agrupados = preparar_datos_para_prediccion(cubo_demanda, empresas_seleccionadas, minutos_intervalo)
+                        if X is not None and y is not None:
+                            guardado = cargar_modelos_registro(calcular_clave_modelos(X, y, empresas_seleccionadas))
+                            if guardado is not None:
+                                registrar_modelos_sesion(guardado['resultados'], guardado['X_test'], guardado['y_test'], datos_agrupados)
+                                st.info("♻️ Modelos recuperados del registro local para estos datos")
+                    
+                    reentrenar = st.checkbox("Reentrenar aunque existan modelos guardados para estos datos", value=False)
+                    
                     if st.button("🤖 Ejecutar Modelos de Predicción", type="primary", use_container_width=True):
                         with st.spinner("Preparando datos y entrenando modelos..."):
                             # Preparar datos para predicción
-                            X, y, datos_agrupados = preparar_datos_para_prediccion(df, empresas_seleccionadas)
+                            X, y, datos_agrupados = preparar_datos_para_prediccion(cubo_demanda, empresas_seleccionadas, minutos_intervalo)
                             
                             if X is not None and y is not None:
-                                # Entrenar y evaluar modelos
-                                resultados, X_test, y_test = entrenar_modelos_prediccion(X, y)
+                                # Buscar en el registro antes de entrenar
+                                clave_modelos = calcular_clave_modelos(X, y, empresas_seleccionadas)
+                                guardado = None if reentrenar else cargar_modelos_registro(clave_modelos)
                                 
-                                if resultados is not None:
-                                    # Guardar resultados en session state
-                                    st.session_state.modelos_entrenados = resultados
-                                    st.session_state.datos_prediccion = {
-                                        'X_test': X_test,
-                                        'y_test': y_test,
-                                        'datos_agrupados': datos_agrupados
-                                    }
-                                    
-                                    # Determinar el mejor modelo (basado en R²)
-                                    mejor_modelo_nombre = None
-                                    mejor_r2 = -float('inf')
-                                    metricas_comparativas = []
-                                    
-                                    for nombre, resultado in resultados.items():
-                                        if resultado['r2'] > mejor_r2:
-                                            mejor_r2 = resultado['r2']
-                                            mejor_modelo_nombre = nombre
-                                        
-                                        metricas_comparativas.append({
-                                            'Modelo': nombre,
-                                            'MSE': resultado['mse'],
-                                            'MAE': resultado['mae'],
-                                            'R²': resultado['r2']
+                                if guardado is not None:
+                                    resultados, X_test, y_test = guardado['resultados'], guardado['X_test'], guardado['y_test']
+                                else:
+                                    # Entrenar y evaluar modelos
+                                    resultados, X_test, y_test = entrenar_modelos_prediccion(X, y)
+                                    if resultados is not None:
+                                        guardar_modelos_registro(clave_modelos, {
+                                            'resultados': resultados,
+                                            'X_test': X_test,
+                                            'y_test': y_test,
+                                            'fecha_entrenamiento': datetime.now().isoformat()
                                         })
+                                
+                                if resultados is not None:
+                                    # Guardar resultados en session state y determinar el mejor modelo
+                                    mejor_modelo_nombre, mejor_r2 = registrar_modelos_sesion(resultados, X_test, y_test, datos_agrupados)
                                     
-                                    st.session_state.mejor_modelo = mejor_modelo_nombre
-                                    st.session_state.metricas_modelos = pd.DataFrame(metricas_comparativas)
-                                    
-                                    st.success("✅ Modelos entrenados exitosamente!")
+                                    if guardado is not None:
+                                        st.success("✅ Modelos cargados del registro local (mismos datos y parámetros)")
+                                    else:
+                                        st.success("✅ Modelos entrenados exitosamente!")
                                     
                                     # Mostrar comparativa de modelos
                                     st.write("### 📊 Comparativa de Modelos")
@@ -1285,109 +1602,23 @@ def main():
                                     key="selector_dia_prediccion"
                                 )
                                 
-                                # Preparar datos según la selección
+                                # Predecir la grilla completa una sola vez por modelo; cambiar de día es solo un corte
+                                if mejor_modelo_nombre not in st.session_state.predicciones_grilla:
+                                    grilla = construir_grilla_prediccion(datos_agrupados, minutos_intervalo)
+                                    st.session_state.predicciones_grilla[mejor_modelo_nombre] = predecir_grilla(mejor_modelo, grilla)
+                                predicciones_grilla = st.session_state.predicciones_grilla[mejor_modelo_nombre]
+                                
+                                # Preparar datos según la selección (arreglos por franja del día)
                                 if dia_prediccion == "Todos":
-                                    # Calcular promedio de predicciones para Lunes a Viernes
-                                    dias_semana_nums = [0, 1, 2, 3, 4]  # Lunes a Viernes
-                                    predicciones_todas = []
-                                    demanda_promedio_todas = []
-                                    
-                                    # Obtener valores promedio de los datos de entrenamiento
-                                    if not datos_agrupados.empty:
-                                        mes_comun = datos_agrupados['Mes'].mode()[0] if not datos_agrupados['Mes'].mode().empty else 1
-                                        dia_mes_comun = 15
-                                        semana_mes_comun = 2
-                                    else:
-                                        mes_comun = 1
-                                        dia_mes_comun = 15
-                                        semana_mes_comun = 2
-                                    
-                                    # Generar predicciones para cada hora y cada día de semana
-                                    predicciones_por_hora_todas = {}
-                                    demanda_promedio_actual_todas = {}
-                                    
-                                    for dia_num in dias_semana_nums:
-                                        predicciones_dia = {}
-                                        for hora in range(24):
-                                            try:
-                                                # Crear características para la predicción
-                                                caracteristicas = np.array([[dia_num, hora, mes_comun, dia_mes_comun, semana_mes_comun]])
-                                                # Predecir
-                                                prediccion = mejor_modelo.predict(caracteristicas)[0]
-                                                prediccion = max(0, prediccion)
-                                                predicciones_dia[hora] = prediccion
-                                            except:
-                                                predicciones_dia[hora] = 0
-                                        
-                                        # Acumular predicciones por hora
-                                        for hora, pred in predicciones_dia.items():
-                                            if hora not in predicciones_por_hora_todas:
-                                                predicciones_por_hora_todas[hora] = []
-                                            predicciones_por_hora_todas[hora].append(pred)
-                                    
-                                    # Calcular promedio por hora para todos los días
-                                    predicciones_por_hora = {}
-                                    for hora, preds in predicciones_por_hora_todas.items():
-                                        predicciones_por_hora[hora] = np.mean(preds) if preds else 0
-                                    
-                                    # Calcular demanda promedio actual para "Todos"
-                                    demanda_promedio_actual = {}
-                                    dias_semana_nombres = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
-                                    for hora in range(24):
-                                        demandas_hora = []
-                                        for dia_nombre in dias_semana_nombres:
-                                            if dia_nombre in demanda_df['Dia_Semana'].unique():
-                                                datos_dia = demanda_df[demanda_df['Dia_Semana'] == dia_nombre]
-                                                datos_hora = datos_dia[datos_dia['Hora'] == hora]
-                                                if not datos_hora.empty:
-                                                    demandas_hora.append(datos_hora['Promedio_Demanda'].values[0])
-                                        demanda_promedio_actual[hora] = np.mean(demandas_hora) if demandas_hora else 0
-                                    
+                                    # Promedio de predicciones para Lunes a Viernes
+                                    predicciones_por_hora = predicciones_grilla[:5].mean(axis=0)
                                 else:
-                                    # Obtener el número del día seleccionado
-                                    dia_num = None
-                                    for num, nombre in dias_numericos.items():
-                                        if nombre == dia_prediccion:
-                                            dia_num = num
-                                            break
-                                    
-                                    if dia_num is not None:
-                                        # Preparar datos para predicción del día seleccionado
-                                        if not datos_agrupados.empty:
-                                            mes_comun = datos_agrupados['Mes'].mode()[0] if not datos_agrupados['Mes'].mode().empty else 1
-                                            dia_mes_comun = 15
-                                            semana_mes_comun = 2
-                                        else:
-                                            mes_comun = 1
-                                            dia_mes_comun = 15
-                                            semana_mes_comun = 2
-                                        
-                                        # Crear predicciones por hora para el día seleccionado
-                                        predicciones_por_hora = {}
-                                        demanda_promedio_actual = {}
-                                        
-                                        # Obtener datos actuales del día seleccionado
-                                        datos_dia_actual = demanda_df[demanda_df['Dia_Semana'] == dia_prediccion]
-                                        for _, row in datos_dia_actual.iterrows():
-                                            demanda_promedio_actual[row['Hora']] = row['Promedio_Demanda']
-                                        
-                                        # Generar predicciones para cada hora
-                                        for hora in range(24):
-                                            try:
-                                                # Crear características para la predicción
-                                                caracteristicas = np.array([[dia_num, hora, mes_comun, dia_mes_comun, semana_mes_comun]])
-                                                # Predecir
-                                                prediccion = mejor_modelo.predict(caracteristicas)[0]
-                                                prediccion = max(0, prediccion)
-                                                predicciones_por_hora[hora] = prediccion
-                                            except:
-                                                predicciones_por_hora[hora] = 0
-                                        
-                                        # Si no hay datos actuales para este día, usar 0
-                                        if not demanda_promedio_actual:
-                                            for hora in range(24):
-                                                demanda_promedio_actual[hora] = 0
-                                    
+                                    predicciones_por_hora = predicciones_grilla[ORDEN_DIAS.index(dia_prediccion)]
+                                
+                                # Demanda promedio actual del día (0 en franjas o días sin datos)
+                                demanda_actual = demanda_horaria(demanda_df, dia_prediccion, minutos_intervalo)
+                                demanda_promedio_actual = demanda_actual.to_numpy() if demanda_actual is not None else np.zeros(predicciones_grilla.shape[1])
+                                
                                 # Obtener información de empresas para mostrar en título
                                 empresas_info = ""
                                 if 'Empresas_Filtradas' in demanda_df.columns and not demanda_df.empty:
@@ -1451,13 +1682,11 @@ def main():
                                     )
                                 
                                 # Mostrar tabla detallada
-                                with st.expander("📋 Ver predicciones detalladas por hora"):
+                                with st.expander(f"📋 Ver predicciones detalladas por {nombre_intervalo(minutos_intervalo).lower()}"):
                                     df_detalle = metricas_prediccion['df_grafica'].copy()
-                                    df_detalle['Hora_Formato'] = df_detalle['Hora'].apply(lambda x: f"{x}:00")
+                                    df_detalle['Hora_Formato'] = df_detalle['Hora']
                                     df_detalle['Diferencia'] = df_detalle['Predicción'] - df_detalle['Promedio Actual']
                                     df_detalle['% Cambio'] = (df_detalle['Diferencia'] / df_detalle['Promedio Actual'] * 100).where(df_detalle['Promedio Actual'] > 0, 0)
-                                    df_detalle['Prediccion_Recursos'] = (df_detalle['Predicción'] / CONSTANTE_VALIDACION).round(2)
-                                    df_detalle['Promedio_Recursos'] = (df_detalle['Promedio Actual'] / CONSTANTE_VALIDACION).round(2)
                                     
                                     st.dataframe(
                                         df_detalle[['Hora_Formato', 'Predicción', 'Promedio Actual', 
@@ -1480,17 +1709,14 @@ def main():
                                 
                                 # Preparar datos para exportación
                                 df_export = metricas_prediccion['df_grafica'].copy()
-                                df_export['Hora_Formato'] = df_export['Hora'].apply(lambda x: f"{x}:00")
+                                df_export['Hora_Formato'] = df_export['Hora']
                                 df_export['Diferencia'] = df_export['Predicción'] - df_export['Promedio Actual']
                                 df_export['% Cambio'] = (df_export['Diferencia'] / df_export['Promedio Actual'] * 100).where(df_export['Promedio Actual'] > 0, 0)
-                                df_export['Prediccion_Recursos'] = (df_export['Predicción'] / CONSTANTE_VALIDACION).round(2)
-                                df_export['Promedio_Recursos'] = (df_export['Promedio Actual'] / CONSTANTE_VALIDACION).round(2)
                                 
                                 # Para días con capacidad disponible, agregar columnas adicionales
-                                if dia_prediccion in ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Todos']:
-                                    df_export['Recursos_Base'] = df_export['Hora'].apply(lambda h: recursos_por_hora.get(h, 0))
-                                    df_export['Capacidad_Disponible'] = (df_export['Recursos_Base'] * CONSTANTE_VALIDACION).round(2)
-                                    df_export['Recursos_Disponibles'] = (df_export['Capacidad_Disponible'] / CONSTANTE_VALIDACION).round(2)
+                                if dia_prediccion in DIAS_CON_RECURSOS:
+                                    df_export['Recursos_Base'] = df_export['Franja'].map(recursos_por_hora).fillna(0).astype(int)
+                                    df_export['Capacidad_Disponible'] = (df_export['Recursos_Base'] * capacidad_por_recurso(minutos_intervalo)).round(2)
                                 
                                 # Agregar información de empresas
                                 if empresas_seleccionadas:
@@ -1543,6 +1769,50 @@ def main():
                             st.warning("⚠️ No se pudo determinar el mejor modelo. Intenta entrenar nuevamente.")
                     else:
                         st.info("👈 Presiona 'Ejecutar Modelos de Predicción' para entrenar los modelos y generar predicciones")
+                    
+                    # Pronóstico de fechas reales con cuantiles (independiente del día típico)
+                    st.divider()
+                    st.write("### 📅 Pronóstico por Fechas (P50 / P90)")
+                    st.info("Pronostica cada fecha real de las próximas semanas con modelos de cuantiles (Gradient Boosting). "
+                            "P90 es la curva pesimista: la demanda solo debería superarla 1 de cada 10 veces")
+                    
+                    semanas_pronostico = st.number_input("Semanas a pronosticar:", min_value=1, max_value=12, value=4,
+                                                         key="semanas_pronostico")
+                    
+                    if st.button("📅 Generar Pronóstico", use_container_width=True):
+                        X, y, datos_agrupados = preparar_datos_para_prediccion(cubo_demanda, empresas_seleccionadas, minutos_intervalo)
+                        
+                        if X is not None and y is not None:
+                            with st.spinner("Preparando modelos de cuantiles..."):
+                                modelos_cuantiles, desde_registro = obtener_modelos_cuantiles(X, y, empresas_seleccionadas)
+                            
+                            # Todas las fechas y franjas del horizonte en una sola predicción por cuantil
+                            fechas, grilla = construir_grilla_horizonte(
+                                datos_agrupados['Fecha'].max() + pd.Timedelta(days=1), semanas_pronostico, minutos_intervalo
+                            )
+                            st.session_state.pronostico = {
+                                'empresas': list(empresas_seleccionadas),
+                                'fechas': fechas,
+                                'cuantiles': predecir_horizonte(modelos_cuantiles, grilla, len(fechas))
+                            }
+                            if desde_registro:
+                                st.success("✅ Modelos de cuantiles cargados del registro local (mismos datos y parámetros)")
+                        else:
+                            st.error("❌ No hay suficientes datos para entrenar los modelos de predicción")
+                    
+                    pronostico = st.session_state.pronostico
+                    if pronostico is not None and pronostico['empresas'] == list(empresas_seleccionadas):
+                        tabla = tabla_pronostico(pronostico, recursos_por_hora, minutos_intervalo)
+                        st.write(f"**Horizonte:** {pronostico['fechas'][0].date()} a {pronostico['fechas'][-1].date()}")
+                        mostrar_pronostico(tabla, minutos_intervalo)
+                        
+                        st.download_button(
+                            label="📥 Descargar Pronóstico CSV",
+                            data=tabla.drop(columns='Franja').assign(Fecha=tabla['Fecha'].dt.date).to_csv(index=False).encode('utf-8'),
+                            file_name=f"pronostico_{pronostico['fechas'][0].date()}_{len(pronostico['fechas']) // 7}_semanas.csv",
+                            mime="text/csv",
+                            use_container_width=True
+                        )
                 
                 else:
                     st.info("👈 Primero procesa los datos en la pestaña 'Datos y Configuración'")
@@ -1557,7 +1827,7 @@ def main():
     
     else:
         # Mostrar mensaje inicial si no hay archivo cargado
-        st.info("👈 Por favor, carga un archivo CSV usando el panel lateral")
+        st.info("👈 Por favor, carga un archivo CSV o selecciona el histórico local usando el panel lateral")
 
 if __name__ == "__main__":
     main()
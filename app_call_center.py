@@ -1,6 +1,315 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import codecs
+import hashlib
 import io
+from pandas.api.types import union_categoricals
+
+# Lectura por bloques: filas por bloque y bytes usados para detectar la codificación
+CHUNK_SIZE = 100_000
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+# Máximo de filas que se conservan para la tabla; las métricas siempre cubren el archivo completo
+MAX_DETAIL_ROWS = 1_000_000
+
+# Columnas requeridas y su tipo final
+CATEGORICAL_COLUMNS = ['Direction', 'Status']
+REQUIRED_COLUMNS = CATEGORICAL_COLUMNS + ['Cost']
+
+# Columnas del cubo de análisis: fecha y hora de Call Time y duración de Talking (opcional)
+CUBE_KEYS = ['Fecha', 'Hora', 'Direction', 'Status']
+CUBE_VALUES = ['Llamadas', 'Contestadas', 'Entrantes', 'Abandonadas', 'Costo', 'Costo_Contestadas',
+               'Segundos_Conversacion']
+ANSWERED_STATUS = 'Answered'
+
+# Abandono: llamadas entrantes (Direction == INBOUND_DIRECTION) que terminan en alguno de estos estados.
+# Las salientes no contestadas no cuentan como abandono. Ajustar según los estados que exporte la central
+INBOUND_DIRECTION = 'Inbound'
+ABANDONED_STATUSES = ['Abandoned', 'Unanswered', 'Missed']
+
+# Etiqueta del cubo para Direction/Status vacíos (así no se pierden llamadas al agrupar)
+EMPTY_LABEL = '(vacío)'
+
+# Filas por página de la tabla de llamadas
+PAGE_SIZE = 500
+
+# Reportes procesados que se mantienen en memoria (compartidos entre sesiones); los más antiguos se descartan
+MAX_CACHED_REPORTS = 2
+
+def detect_encoding(buffer):
+    """
+    Detecta la codificación del archivo con una muestra inicial: utf-8-sig si tiene BOM o la muestra
+    es UTF-8 válida, latin-1 en otro caso. Deja el buffer al inicio
+    """
+    buffer.seek(0)
+    sample = buffer.read(ENCODING_SAMPLE_BYTES)
+    buffer.seek(0)
+    
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # Decodificador incremental: un carácter cortado al final de la muestra no es un error
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+def type_call_chunk(chunk):
+    """
+    Convierte Direction/Status a categóricas y Cost (p. ej. "$1.25") a float32
+    """
+    for col in CATEGORICAL_COLUMNS:
+        chunk[col] = chunk[col].str.strip().astype('category')
+    cost = chunk['Cost'].str.replace(r'[^0-9.\-]', '', regex=True)
+    chunk['Cost'] = pd.to_numeric(cost, errors='coerce').astype('float32')
+    return chunk
+
+def concat_call_chunks(chunks):
+    """
+    Une los bloques conservando las columnas categóricas (unión de categorías de todos los bloques)
+    """
+    df = pd.concat(chunks, ignore_index=True)
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = union_categoricals([chunk[col] for chunk in chunks])
+    return df
+
+def aggregate_call_chunk(chunk):
+    """
+    Reduce un bloque a conteos por (Fecha, Hora, Direction, Status) en un solo groupby:
+    llamadas, contestadas, entrantes, abandonadas (entrantes), costo total y de contestadas y
+    segundos de conversación. Retorna (cubo parcial, filas descartadas por 'Call Time' inválido);
+    el cubo es None si el bloque no tiene ninguna fecha válida
+    """
+    if 'Call Time' not in chunk.columns:
+        return None, len(chunk)
+    call_time = pd.to_datetime(chunk['Call Time'], errors='coerce')
+    dropped = int(call_time.isna().sum())
+    if dropped == len(chunk):
+        return None, dropped
+    
+    if 'Talking' in chunk.columns:
+        talking = pd.to_timedelta(chunk['Talking'], errors='coerce').dt.total_seconds()
+    else:
+        talking = pd.Series(np.nan, index=chunk.index)
+    answered = chunk['Status'] == ANSWERED_STATUS
+    inbound = chunk['Direction'] == INBOUND_DIRECTION
+    cost = chunk['Cost'].astype('float64')
+    
+    data = pd.DataFrame({
+        'Fecha': call_time.dt.normalize(),
+        'Hora': call_time.dt.hour,
+        'Direction': chunk['Direction'].astype(object).fillna(EMPTY_LABEL),
+        'Status': chunk['Status'].astype(object).fillna(EMPTY_LABEL),
+        'Llamadas': 1,
+        'Contestadas': answered.astype('int64'),
+        'Entrantes': inbound.astype('int64'),
+        'Abandonadas': (inbound & chunk['Status'].isin(ABANDONED_STATUSES)).astype('int64'),
+        'Costo': cost,
+        'Costo_Contestadas': cost.where(answered, 0),
+        'Segundos_Conversacion': talking.where(answered, 0).fillna(0)
+    })
+    return data.groupby(CUBE_KEYS, observed=True)[CUBE_VALUES].sum(), dropped
+
+def combine_cube_chunks(partials):
+    """
+    Une los cubos parciales de cada bloque sumando las celdas repetidas (None si no hay ninguno)
+    """
+    partials = [partial.reset_index() for partial in partials if partial is not None]
+    if not partials:
+        return None
+    cube = pd.concat(partials, ignore_index=True)
+    for col in ['Direction', 'Status']:
+        cube[col] = cube[col].astype(str)
+    cube = cube.groupby(CUBE_KEYS)[CUBE_VALUES].sum().reset_index()
+    cube['Hora'] = cube['Hora'].astype('int8')
+    return cube
+
+def process_call_reports(buffer, chunk_size=CHUNK_SIZE, max_detail_rows=MAX_DETAIL_ROWS):
+    """
+    Lee el CSV de llamadas por bloques directamente del buffer subido (sin decodificarlo completo en memoria).
+    Las métricas (total, contestadas, costo) y el cubo de análisis (metricas['cube']) se calculan como
+    reducciones por bloque y las filas se conservan tipadas hasta max_detail_rows.
+    Retorna (df, metricas) o (None, None) si el archivo no es válido
+    """
+    encoding = detect_encoding(buffer)
+    try:
+        return read_call_chunks(buffer, encoding, chunk_size, max_detail_rows)
+    except UnicodeDecodeError:
+        # La muestra inicial era UTF-8 pero hay bytes no UTF-8 más adelante: releer todo como latin-1
+        return read_call_chunks(buffer, 'latin-1', chunk_size, max_detail_rows)
+
+def read_call_chunks(buffer, encoding, chunk_size, max_detail_rows):
+    """
+    Recorre el buffer con la codificación dada acumulando métricas, cubos parciales y filas.
+    Propaga UnicodeDecodeError para que process_call_reports pueda reintentar; deja el buffer al inicio
+    """
+    metrics = {'total': 0, 'answered': 0, 'cost': 0.0, 'truncated': False, 'cube_dropped': 0}
+    chunks = []
+    cube_partials = []
+    kept_rows = 0
+    
+    text = io.TextIOWrapper(buffer, encoding=encoding, newline='')
+    try:
+        for chunk in pd.read_csv(text, dtype=str, chunksize=chunk_size):
+            missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+            if missing:
+                st.error(f"El archivo no contiene las columnas: {', '.join(missing)}")
+                return None, None
+            
+            chunk = type_call_chunk(chunk)
+            metrics['total'] += len(chunk)
+            metrics['answered'] += int((chunk['Status'] == 'Answered').sum())
+            metrics['cost'] += float(chunk['Cost'].astype('float64').sum())
+            cube_partial, dropped = aggregate_call_chunk(chunk)
+            cube_partials.append(cube_partial)
+            metrics['cube_dropped'] += dropped
+            
+            # Conservar filas para la tabla solo hasta el máximo
+            if kept_rows < max_detail_rows:
+                chunk = chunk.iloc[:max_detail_rows - kept_rows]
+                chunks.append(chunk)
+                kept_rows += len(chunk)
+            else:
+                metrics['truncated'] = True
+    except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        st.error(f"Error al leer el archivo: {e}")
+        return None, None
+    finally:
+        # Soltar el buffer sin cerrarlo
+        text.detach()
+        buffer.seek(0)
+    
+    if not chunks:
+        st.warning("El archivo no contiene llamadas.")
+        return None, None
+    
+    metrics['cube'] = combine_cube_chunks(cube_partials)
+    return concat_call_chunks(chunks), metrics
+
+def slice_cube(cube, direction='Todos', status='Todos', start=None, end=None):
+    """
+    Corta el cubo por dirección, estado y rango de fechas (inclusive); 'Todos' no filtra
+    """
+    mask = np.ones(len(cube), dtype=bool)
+    if direction != 'Todos':
+        mask &= (cube['Direction'] == direction).to_numpy()
+    if status != 'Todos':
+        mask &= (cube['Status'] == status).to_numpy()
+    if start is not None:
+        mask &= (cube['Fecha'] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (cube['Fecha'] <= pd.Timestamp(end)).to_numpy()
+    return cube[mask]
+
+def cube_kpis(cube_slice, by=None):
+    """
+    Suma el corte del cubo (total o agrupado por 'by') y calcula tasa de contestación, tasa de abandono
+    (sobre las entrantes), costo por llamada contestada (solo el costo de las contestadas) y duración
+    promedio de conversación (segundos)
+    """
+    totals = cube_slice[CUBE_VALUES].sum().to_frame().T if by is None else cube_slice.groupby(by)[CUBE_VALUES].sum()
+    calls = totals['Llamadas'].replace(0, np.nan)
+    inbound = totals['Entrantes'].replace(0, np.nan)
+    answered = totals['Contestadas'].replace(0, np.nan)
+    totals['Tasa_Contestacion'] = totals['Contestadas'] / calls
+    totals['Tasa_Abandono'] = totals['Abandonadas'] / inbound
+    totals['Costo_por_Contestada'] = totals['Costo_Contestadas'] / answered
+    totals['Duracion_Promedio'] = totals['Segundos_Conversacion'] / answered
+    return totals
+
+def show_cube_analysis(cube, direction, status, dropped_rows=0):
+    """
+    Muestra los indicadores del cubo para los filtros y el rango de fechas elegidos, por día o por hora.
+    dropped_rows: llamadas sin 'Call Time' válido, que no forman parte del cubo
+    """
+    st.subheader("📈 Indicadores de Atención y Costo")
+    if dropped_rows:
+        st.caption(f"⚠️ {dropped_rows:,} llamadas sin 'Call Time' válido no se incluyen en estos indicadores "
+                   f"(sí en Total Llamadas).")
+    first_day, last_day = cube['Fecha'].min().date(), cube['Fecha'].max().date()
+    date_range = st.date_input("Rango de fechas:", value=(first_day, last_day),
+                               min_value=first_day, max_value=last_day, key="cube_dates")
+    # Mientras se elige el rango, date_input retorna solo la fecha inicial
+    start = date_range[0]
+    end = date_range[1] if len(date_range) > 1 else date_range[0]
+    
+    cube_slice = slice_cube(cube, direction, status, start, end)
+    if cube_slice.empty:
+        st.warning("No hay llamadas para los filtros seleccionados.")
+        return
+    
+    kpis = cube_kpis(cube_slice).iloc[0]
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Tasa de Contestación", f"{kpis['Tasa_Contestacion']:.1%}")
+    with col2:
+        st.metric("Tasa de Abandono", f"{np.nan_to_num(kpis['Tasa_Abandono']):.1%}",
+                  help="Abandonadas sobre llamadas entrantes")
+    with col3:
+        st.metric("Costo por Contestada", f"${np.nan_to_num(kpis['Costo_por_Contestada']):.2f}")
+    with col4:
+        st.metric("Duración Promedio", f"{np.nan_to_num(kpis['Duracion_Promedio']) / 60:.1f} min")
+    
+    view = st.radio("Ver por:", ['Día', 'Hora'], horizontal=True, key="cube_view")
+    by_period = cube_kpis(cube_slice, by='Fecha' if view == 'Día' else 'Hora')
+    st.line_chart(by_period[['Tasa_Contestacion', 'Tasa_Abandono']])
+    st.dataframe(by_period.round(3))
+
+def file_hash(buffer):
+    """
+    Calcula el hash md5 del archivo subido leyéndolo por bloques. Deja el buffer al inicio
+    """
+    digest = hashlib.md5()
+    buffer.seek(0)
+    for block in iter(lambda: buffer.read(1024 * 1024), b''):
+        digest.update(block)
+    buffer.seek(0)
+    return digest.hexdigest()
+
+def build_filter_masks(df):
+    """
+    Precalcula una máscara booleana por cada valor de las columnas categóricas a partir de sus códigos.
+    Retorna {columna: {valor: máscara}}
+    """
+    masks = {}
+    for col in CATEGORICAL_COLUMNS:
+        codes = df[col].cat.codes.to_numpy()
+        masks[col] = {value: codes == code for code, value in enumerate(df[col].cat.categories)}
+    return masks
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_CACHED_REPORTS)
+def load_call_reports(content_hash, _buffer):
+    """
+    Procesa el archivo una sola vez por contenido (content_hash) y precalcula las máscaras de filtro.
+    El resultado se guarda una vez (cache_resource, sin copiarlo en cada rerun) y se trata como
+    solo lectura; solo se conservan los últimos MAX_CACHED_REPORTS archivos.
+    Retorna (df, metricas, mascaras) o (None, None, None)
+    """
+    df, metrics = process_call_reports(_buffer)
+    if df is None:
+        return None, None, None
+    return df, metrics, build_filter_masks(df)
+
+def combine_masks(masks, n_rows, **selected):
+    """
+    Intersecta las máscaras de los valores seleccionados por columna ('Todos' no filtra)
+    """
+    mask = np.ones(n_rows, dtype=bool)
+    for col, value in selected.items():
+        if value != 'Todos':
+            mask &= masks[col][value]
+    return mask
+
+def show_paginated(df, rows, key):
+    """
+    Muestra solo la página seleccionada de las filas (índices posicionales) de df
+    """
+    n_pages = max(1, -(-len(rows) // PAGE_SIZE))
+    page = st.number_input(f"Página (de {n_pages})", min_value=1, max_value=n_pages, value=1, key=key)
+    start = (page - 1) * PAGE_SIZE
+    st.caption(f"Llamadas {min(start + 1, len(rows)):,}-{min(start + PAGE_SIZE, len(rows)):,} de {len(rows):,}")
+    st.dataframe(df.iloc[rows[start:start + PAGE_SIZE]])
 
 def main():
     st.title("📊 Analizador de Reportes de Llamadas")
@@ -9,34 +318,48 @@ def main():
     uploaded_file = st.file_uploader("Sube tu CSV de llamadas", type=['csv'])
     
     if uploaded_file is not None:
-        # Leer y procesar
-        csv_content = uploaded_file.read().decode('utf-8-sig')
-        df = process_call_reports(csv_content)
+        # Leer y procesar por bloques (una sola vez por contenido)
+        df, metrics, masks = load_call_reports(file_hash(uploaded_file), uploaded_file)
         
         if df is not None:
             # Mostrar métricas
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Total Llamadas", len(df))
+                st.metric("Total Llamadas", metrics['total'])
             with col2:
-                answered = len(df[df['Status'] == 'Answered'])
-                st.metric("Contestadas", answered)
+                st.metric("Contestadas", metrics['answered'])
             with col3:
-                st.metric("Costo Total", f"${df['Cost'].sum():.2f}")
+                st.metric("Costo Total", f"${metrics['cost']:.2f}")
+            
+            if metrics['truncated']:
+                st.info(f"La tabla muestra las primeras {len(df):,} llamadas; las métricas incluyen el archivo completo.")
             
             # Filtros
             st.sidebar.header("Filtros")
-            direction = st.sidebar.selectbox("Dirección", ['Todos'] + list(df['Direction'].unique()))
-            status = st.sidebar.selectbox("Estado", ['Todos'] + list(df['Status'].unique()))
-            
-            # Aplicar filtros
-            filtered_df = df.copy()
-            if direction != 'Todos':
-                filtered_df = filtered_df[filtered_df['Direction'] == direction]
-            if status != 'Todos':
-                filtered_df = filtered_df[filtered_df['Status'] == status]
-                
-            st.dataframe(filtered_df)
+            direction = st.sidebar.selectbox("Dirección", ['Todos'] + list(masks['Direction']))
+            status = st.sidebar.selectbox("Estado", ['Todos'] + list(masks['Status']))
+            
+            # Aplicar filtros intersectando las máscaras precalculadas (sin copiar el DataFrame)
+            mask = combine_masks(masks, len(df), Direction=direction, Status=status)
+            rows = np.flatnonzero(mask)
+            
+            if direction != 'Todos' or status != 'Todos':
+                answered = masks['Status'].get('Answered', np.zeros(len(df), dtype=bool))
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Llamadas Filtradas", len(rows))
+                with col2:
+                    st.metric("Contestadas (filtro)", int(np.count_nonzero(mask & answered)))
+                with col3:
+                    st.metric("Costo (filtro)", f"${df['Cost'].to_numpy()[rows].sum(dtype='float64'):.2f}")
+            
+            show_paginated(df, rows, key="page_calls")
+            
+            if metrics['cube'] is not None:
+                st.divider()
+                show_cube_analysis(metrics['cube'], direction, status, metrics['cube_dropped'])
+            elif metrics['cube_dropped']:
+                st.info("El archivo no tiene 'Call Time' válido: no se muestran los indicadores de atención.")
 
 if __name__ == "__main__":
     main()
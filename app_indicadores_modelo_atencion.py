@@ -1,3 +1,4 @@
+import hashlib
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -9,6 +10,214 @@ st.set_page_config(page_title="Gestión de Ingresos y Llamados", layout="wide")
 
 st.title("📊 Análisis de gestiones del modelo de atención")
 
+# ============================================================================
+# FUNCIONES COMPARTIDAS
+# ============================================================================
+def promedios_por_usuario_hora(df_proceso, columna_usuario, usuarios, horas, columnas):
+    """
+    Promedio de registros por día de cada usuario en cada hora, contando solo los días con registros
+    en esa hora. Se calcula con un único groupby por (usuario, hora, fecha), la media sobre las fechas
+    y un unstack de las horas. Retorna un DataFrame usuarios × columnas (0 si no hay registros)
+    """
+    conteos = df_proceso.groupby([columna_usuario, 'HORA', 'FECHA']).size()
+    promedios = conteos.groupby(level=[0, 1]).mean().unstack('HORA')
+    promedios = promedios.reindex(index=usuarios, columns=horas).fillna(0).round(2)
+    return pd.DataFrame(promedios.to_numpy(), index=usuarios, columns=columnas)
+
+def minimo_positivo_por_fila(tabla):
+    """
+    Mínimo de cada fila considerando solo los valores mayores que 0 (0 si la fila no tiene ninguno)
+    """
+    return tabla.where(tabla > 0).min(axis=1).fillna(0)
+
+def hash_archivo(archivo):
+    """
+    Hash MD5 del contenido del archivo cargado, usado como clave de caché de su lectura
+    """
+    return hashlib.md5(archivo.getvalue()).hexdigest()
+
+@st.cache_data(show_spinner="Leyendo archivo...")
+def cargar_excel(clave_archivo, _archivo, columna_fecha=None):
+    """
+    Lee el Excel una sola vez por contenido (clave_archivo) y convierte la columna de fecha,
+    descartando las filas sin fecha válida. Los filtros y el procesamiento principal reutilizan
+    este DataFrame tipado (cache_data entrega una copia en cada llamada)
+    """
+    _archivo.seek(0)
+    df = pd.read_excel(_archivo)
+    if columna_fecha is not None and columna_fecha in df.columns:
+        df[columna_fecha] = pd.to_datetime(df[columna_fecha], errors='coerce')
+        df = df.dropna(subset=[columna_fecha])
+    return df
+
+def encontrar_columna(df, posibles_nombres):
+    """
+    Busca una columna en el DataFrame que coincida con alguno de los nombres posibles
+    """
+    columnas_lower = {col: col.lower().strip() for col in df.columns}
+    for posible in posibles_nombres:
+        posible_lower = posible.lower().strip()
+        for col_original, col_lower in columnas_lower.items():
+            if col_lower == posible_lower or posible_lower in col_lower:
+                return col_original
+    return None
+
+def tiempo_a_minutos(t):
+    """
+    Convierte un tiempo 'HH:MM:SS' o 'MM:SS' (o un número) a minutos
+    """
+    if pd.isna(t):
+        return np.nan
+    try:
+        if isinstance(t, str):
+            partes = t.split(':')
+            if len(partes) == 3:
+                return int(partes[0]) * 60 + int(partes[1]) + int(partes[2]) / 60
+            elif len(partes) == 2:
+                return int(partes[0]) * 60 + int(partes[1])
+        return float(t)
+    except:
+        return np.nan
+
+CLASES_LLAMADO = ['MANUAL', 'AUTOMÁTICO', 'OTRO', 'NO CLASIFICADO']
+
+def clasificar_llamado(valor):
+    """
+    Clasifica el tipo de un llamado como MANUAL, AUTOMÁTICO, OTRO o NO CLASIFICADO (vacío)
+    """
+    if pd.isna(valor):
+        return 'NO CLASIFICADO'
+    v = str(valor).lower().strip()
+    if any(p in v for p in ['manual', 'm', 'man']):
+        return 'MANUAL'
+    elif any(p in v for p in ['auto', 'a', 'aut', 'autom']):
+        return 'AUTOMÁTICO'
+    return 'OTRO'
+
+def clasificar_tipos_llamado(tipos):
+    """
+    Clasifica la columna TIPO evaluando clasificar_llamado solo sobre sus valores únicos y
+    retorna la clasificación de cada registro como categórica (categorías CLASES_LLAMADO)
+    """
+    codigos, unicos = pd.factorize(tipos)
+    clases = np.array([clasificar_llamado(v) for v in unicos] + ['NO CLASIFICADO'], dtype=object)
+    return pd.Categorical(clases[codigos], categories=CLASES_LLAMADO)
+
+def tiempos_promedio_por_usuario(df_atenciones, usuarios):
+    """
+    Tiempo promedio de atención y de espera entre atenciones por llamado individual, para todos los
+    usuarios en una sola pasada sobre los registros ordenados por (usuario, hora de llegada).
+    - Atención: TIEMPO_ATENCION / LLAMADOS, excluyendo viernes y llegadas desde las 3 PM
+    - Espera: llegada actual - finalización anterior del mismo día, excluyendo viernes, fines de semana
+      y llegadas desde las 3 PM; se descartan esperas >= 50 min y cada llamado del registro pesa igual
+    Retorna (atención, espera) como Series indexadas por usuarios, redondeadas a 1 decimal (0 sin datos)
+    """
+    def promedio_redondeado(suma, peso):
+        promedio = (suma / peso).reindex(usuarios)
+        return promedio.map(lambda v: 0 if pd.isna(v) else round(v, 1))
+    
+    vacio = pd.Series(0, index=usuarios, dtype='float64')
+    if df_atenciones.empty:
+        return vacio, vacio
+    
+    df = df_atenciones.sort_values(['USUARIO_ATENCION', 'HORA_LLEGADA'], kind='stable')
+    llegada = df['HORA_LLEGADA']
+    usuario = df['USUARIO_ATENCION']
+    llamados = df['LLAMADOS'].where(df['LLAMADOS'] > 0, 1)
+    
+    # Máscaras de exclusión (4 = viernes, 5-6 = fin de semana, 15 = 3 PM)
+    dia_semana = llegada.dt.weekday
+    despues_3pm = llegada.dt.hour >= 15
+    excluido_atencion = (dia_semana == 4) | despues_3pm
+    excluido_espera = (dia_semana >= 4) | despues_3pm
+    
+    # Tiempo de atención por llamado individual (promedio simple)
+    if 'TIEMPO_ATENCION' in df.columns:
+        tiempo = df['TIEMPO_ATENCION']
+        tiempo_por_llamado = tiempo / llamados
+        valido = tiempo.notna() & (tiempo > 0) & ~excluido_atencion & (tiempo_por_llamado > 0) & (tiempo_por_llamado < 60)
+        atencion = promedio_redondeado(
+            tiempo_por_llamado[valido].groupby(usuario[valido]).sum(),
+            valido.groupby(usuario).sum()
+        )
+    else:
+        atencion = vacio
+    
+    # Tiempo de espera entre atenciones: la finalización de referencia de cada registro es su hora de
+    # finalización (o su llegada si no la tiene y no está excluido); si falta, se mantiene la anterior
+    if 'HORA_FINALIZACION' in df.columns:
+        referencia = df['HORA_FINALIZACION'].where(
+            df['HORA_FINALIZACION'].notna() | excluido_espera, llegada
+        )
+        finalizacion_anterior = referencia.groupby(usuario).ffill().groupby(usuario).shift()
+        fecha = llegada.dt.normalize()
+        mismo_dia = fecha.groupby(usuario).shift() == fecha
+        
+        espera = (llegada - finalizacion_anterior).dt.total_seconds() / 60
+        espera_por_llamado = espera / llamados
+        valido = (mismo_dia & ~excluido_espera & (espera > 0) & (espera < 50)
+                  & (espera_por_llamado > 0) & (espera_por_llamado < 60))
+        espera_ponderada = (espera_por_llamado * llamados)[valido]
+        espera_media = promedio_redondeado(
+            espera_ponderada.groupby(usuario[valido]).sum(),
+            llamados[valido].groupby(usuario[valido]).sum()
+        )
+    else:
+        espera_media = vacio
+    
+    return atencion, espera_media
+
+@st.cache_data(show_spinner="Leyendo archivo...")
+def cargar_turnos_atendidos(clave_archivo, _archivo):
+    """
+    Lee el reporte de turnos (saltando la primera fila) una sola vez por contenido, identifica y
+    renombra sus columnas y deja tipadas las fechas, el tiempo de atención y los llamados.
+    Retorna (DataFrame, columnas encontradas); el DataFrame es None si faltan columnas requeridas
+    """
+    _archivo.seek(0)
+    df = pd.read_excel(_archivo, skiprows=1)
+    df.columns = df.columns.astype(str).str.strip()
+    
+    columnas = {
+        'HORA_LLEGADA': encontrar_columna(df, ['hora llegada', 'hora_llegada', 'hora']),
+        'SERVICIO': encontrar_columna(df, ['servicio']),
+        'USUARIO_ATENCION': encontrar_columna(df, ['user atención', 'user_atencion', 'usuario atención', 'usuario_atencion', 'usuario', 'user']),
+        'TIPO': encontrar_columna(df, ['tipo']),
+        'HORA_FINALIZACION': encontrar_columna(df, ['hora finalización', 'hora_finalizacion', 'hora fin', 'hora final', 'fechafin']),
+        'TIEMPO_ATENCION': encontrar_columna(df, ['tiempo atención', 'tiempo_atencion', 'tiempo de atención', 'duración atención']),
+        'LLAMADOS': encontrar_columna(df, ['llamados', 'cantidad llamados', 'num llamados', 'número llamados', 'nro llamados'])
+    }
+    if not all([columnas['HORA_LLEGADA'], columnas['SERVICIO'], columnas['USUARIO_ATENCION']]):
+        return None, columnas
+    
+    df = df.rename(columns={original: nombre for nombre, original in columnas.items() if original})
+    
+    # Procesar fechas
+    df["HORA_LLEGADA"] = pd.to_datetime(df["HORA_LLEGADA"], errors='coerce')
+    if 'HORA_FINALIZACION' in df.columns:
+        df["HORA_FINALIZACION"] = pd.to_datetime(df["HORA_FINALIZACION"], errors='coerce')
+    
+    df = df.dropna(subset=["HORA_LLEGADA"])
+    
+    # Procesar tiempo de atención (convertir a minutos si es necesario)
+    if 'TIEMPO_ATENCION' in df.columns:
+        if df['TIEMPO_ATENCION'].dtype == 'object':
+            df['TIEMPO_ATENCION'] = df['TIEMPO_ATENCION'].apply(tiempo_a_minutos)
+        else:
+            df['TIEMPO_ATENCION'] = pd.to_numeric(df['TIEMPO_ATENCION'], errors='coerce')
+    
+    # Procesar llamados (asegurar que sea numérico; si no existe, cada registro es 1 llamado)
+    if 'LLAMADOS' in df.columns:
+        df['LLAMADOS'] = pd.to_numeric(df['LLAMADOS'], errors='coerce').fillna(1).astype(int)
+    else:
+        df['LLAMADOS'] = 1
+    
+    # Clasificar el tipo de llamado una sola vez (categórica)
+    if 'TIPO' in df.columns:
+        df['CLASIFICACION'] = clasificar_tipos_llamado(df['TIPO'])
+    
+    return df, columnas
+
 # Crear pestañas
 tab1, tab2, tab3 = st.tabs(["📋 Análisis de ingresos abiertos", "📆 Análisis de turnos atendidos", "🔍 Auditoría de Admisiones"])
 
@@ -38,9 +247,7 @@ with tab1:
         if uploaded_file is not None:
             try:
                 # Leer el archivo para obtener opciones de filtros
-                df_temp = pd.read_excel(uploaded_file)
-                df_temp["FECHA CREACION"] = pd.to_datetime(df_temp["FECHA CREACION"], errors='coerce')
-                df_temp = df_temp.dropna(subset=["FECHA CREACION"])
+                df_temp = cargar_excel(hash_archivo(uploaded_file), uploaded_file, "FECHA CREACION")
                 
                 fecha_minima = df_temp["FECHA CREACION"].min().date()
                 fecha_maxima = df_temp["FECHA CREACION"].max().date()
@@ -121,10 +328,8 @@ with tab1:
     # --- PROCESAMIENTO PRINCIPAL (fuera del expander) ---
     if uploaded_file is not None and 'fecha_inicio' in locals() and fecha_inicio <= fecha_fin:
         try:
-            # Leer el archivo nuevamente para procesamiento
-            df = pd.read_excel(uploaded_file)
-            df["FECHA CREACION"] = pd.to_datetime(df["FECHA CREACION"], errors='coerce')
-            df = df.dropna(subset=["FECHA CREACION"])
+            # Reutilizar la lectura en caché del archivo (ya con fechas convertidas)
+            df = cargar_excel(hash_archivo(uploaded_file), uploaded_file, "FECHA CREACION")
             
             # DataFrame base con filtros de fecha y centros
             df_base = df[
@@ -207,36 +412,13 @@ with tab1:
                     st.warning("No hay usuarios en los datos filtrados.")
                     st.stop()
                 
-                # Crear tabla de promedios
-                data = []
-                for usuario in usuarios_proceso:
-                    df_usuario = df_proceso[df_proceso["USUARIO CREA INGRESO"] == usuario]
-                    fila = []
-                    for hora in horas_con_registros:
-                        df_hora = df_usuario[df_usuario['HORA'] == hora]
-                        if not df_hora.empty:
-                            conteo_por_dia = df_hora.groupby('FECHA').size()
-                            conteo_por_dia = conteo_por_dia[conteo_por_dia > 0]
-                            promedio = conteo_por_dia.mean() if not conteo_por_dia.empty else 0
-                            fila.append(round(promedio, 2))
-                        else:
-                            fila.append(0)
-                    data.append(fila)
-                
-                tabla_resultados = pd.DataFrame(data, index=usuarios_proceso, columns=horas_formateadas)
+                # Crear tabla de promedios (usuario × hora) en una sola agrupación
+                tabla_resultados = promedios_por_usuario_hora(df_proceso, "USUARIO CREA INGRESO", usuarios_proceso,
+                                                              horas_con_registros, horas_formateadas)
                 
                 # Calcular estadísticas
                 tabla_resultados['TOTAL'] = tabla_resultados[horas_formateadas].sum(axis=1).round(2)
-                
-                minimos = []
-                for idx in tabla_resultados.index:
-                    valores_fila = tabla_resultados.loc[idx, horas_formateadas]
-                    valores_positivos = valores_fila[valores_fila > 0]
-                    if len(valores_positivos) > 0:
-                        minimos.append(valores_positivos.min())
-                    else:
-                        minimos.append(0)
-                tabla_resultados['MÍNIMO'] = [round(x, 2) for x in minimos]
+                tabla_resultados['MÍNIMO'] = minimo_positivo_por_fila(tabla_resultados[horas_formateadas]).round(2)
                 
                 tabla_resultados['MÁXIMO'] = tabla_resultados[horas_formateadas].max(axis=1).round(2)
                 
@@ -668,96 +850,21 @@ with tab2:
         # Si hay archivo cargado, mostrar los filtros dentro del MISMO expander
         if uploaded_file_tab2 is not None:
             try:
-                # Leer archivo saltando la primera fila
-                df_temp = pd.read_excel(uploaded_file_tab2, skiprows=1)
-                df_temp.columns = df_temp.columns.astype(str).str.strip()
-                
-                # Función mejorada para encontrar columna
-                def encontrar_columna(df, posibles_nombres):
-                    """
-                    Busca una columna en el DataFrame que coincida con alguno de los nombres posibles
-                    """
-                    columnas_lower = {col: col.lower().strip() for col in df.columns}
-                    for posible in posibles_nombres:
-                        posible_lower = posible.lower().strip()
-                        for col_original, col_lower in columnas_lower.items():
-                            if col_lower == posible_lower or posible_lower in col_lower:
-                                return col_original
-                    return None
-                
-                # Buscar columnas
-                col_hora_llegada = encontrar_columna(df_temp, ['hora llegada', 'hora_llegada', 'hora'])
-                col_hora_finalizacion = encontrar_columna(df_temp, ['hora finalización', 'hora_finalizacion', 'hora fin', 'hora final', 'fechafin'])
-                col_servicio = encontrar_columna(df_temp, ['servicio'])
-                col_usuario = encontrar_columna(df_temp, ['user atención', 'user_atencion', 'usuario atención', 'usuario_atencion', 'usuario', 'user'])
-                col_tipo = encontrar_columna(df_temp, ['tipo'])
-                col_tiempo_atencion = encontrar_columna(df_temp, ['tiempo atención', 'tiempo_atencion', 'tiempo de atención', 'duración atención'])
-                col_llamados = encontrar_columna(df_temp, ['llamados', 'cantidad llamados', 'num llamados', 'número llamados', 'nro llamados'])
+                # Leer archivo (saltando la primera fila) con columnas renombradas y tipadas, en caché por contenido
+                df_temp, columnas_tab2 = cargar_turnos_atendidos(hash_archivo(uploaded_file_tab2), uploaded_file_tab2)
                 
                 # Verificar si encontramos las columnas necesarias
-                if not all([col_hora_llegada, col_servicio]):
-                    st.error(f"No se encontraron las columnas de hora y servicio. Hora Llegada: {col_hora_llegada}, Servicio: {col_servicio}")
+                if not all([columnas_tab2['HORA_LLEGADA'], columnas_tab2['SERVICIO']]):
+                    st.error(f"No se encontraron las columnas de hora y servicio. Hora Llegada: {columnas_tab2['HORA_LLEGADA']}, Servicio: {columnas_tab2['SERVICIO']}")
                     st.stop()
                 
-                if not col_usuario:
+                if not columnas_tab2['USUARIO_ATENCION']:
                     st.error("No se encontró la columna de usuario. Buscamos: 'User Atención', 'usuario atención', etc.")
                     st.stop()
                 
-                if not col_hora_finalizacion:
+                if not columnas_tab2['HORA_FINALIZACION']:
                     st.warning("No se encontró la columna de hora finalización. El tiempo de espera entre atenciones no podrá calcularse correctamente.")
                 
-                # Renombrar temporalmente para obtener datos
-                rename_dict_temp = {
-                    col_hora_llegada: 'HORA_LLEGADA',
-                    col_servicio: 'SERVICIO',
-                    col_usuario: 'USUARIO_ATENCION'
-                }
-                if col_tipo:
-                    rename_dict_temp[col_tipo] = 'TIPO'
-                if col_hora_finalizacion:
-                    rename_dict_temp[col_hora_finalizacion] = 'HORA_FINALIZACION'
-                if col_tiempo_atencion:
-                    rename_dict_temp[col_tiempo_atencion] = 'TIEMPO_ATENCION'
-                if col_llamados:
-                    rename_dict_temp[col_llamados] = 'LLAMADOS'
-                
-                df_temp = df_temp.rename(columns=rename_dict_temp)
-                
-                # Procesar fechas
-                df_temp["HORA_LLEGADA"] = pd.to_datetime(df_temp["HORA_LLEGADA"], errors='coerce')
-                if 'HORA_FINALIZACION' in df_temp.columns:
-                    df_temp["HORA_FINALIZACION"] = pd.to_datetime(df_temp["HORA_FINALIZACION"], errors='coerce')
-                
-                df_temp = df_temp.dropna(subset=["HORA_LLEGADA"])
-                
-                # Procesar tiempo de atención (convertir a minutos si es necesario)
-                if 'TIEMPO_ATENCION' in df_temp.columns:
-                    if df_temp['TIEMPO_ATENCION'].dtype == 'object':
-                        def tiempo_a_minutos(t):
-                            if pd.isna(t):
-                                return np.nan
-                            try:
-                                if isinstance(t, str):
-                                    partes = t.split(':')
-                                    if len(partes) == 3:
-                                        return int(partes[0]) * 60 + int(partes[1]) + int(partes[2]) / 60
-                                    elif len(partes) == 2:
-                                        return int(partes[0]) * 60 + int(partes[1])
-                                return float(t)
-                            except:
-                                return np.nan
-                        
-                        df_temp['TIEMPO_ATENCION'] = df_temp['TIEMPO_ATENCION'].apply(tiempo_a_minutos)
-                    else:
-                        df_temp['TIEMPO_ATENCION'] = pd.to_numeric(df_temp['TIEMPO_ATENCION'], errors='coerce')
-                
-                # Procesar llamados (asegurar que sea numérico)
-                if 'LLAMADOS' in df_temp.columns:
-                    df_temp['LLAMADOS'] = pd.to_numeric(df_temp['LLAMADOS'], errors='coerce').fillna(1).astype(int)
-                else:
-                    # Si no existe la columna, asumir que cada registro es 1 llamado
-                    df_temp['LLAMADOS'] = 1
-                
                 if df_temp.empty:
                     st.warning("No hay registros con fechas válidas")
                     st.stop()
@@ -831,68 +938,8 @@ with tab2:
     # --- PROCESAMIENTO PRINCIPAL (fuera del expander) ---
     if uploaded_file_tab2 is not None and 'fecha_ini' in locals() and fecha_ini <= fecha_fin:
         try:
-            # Leer archivo nuevamente para procesamiento
-            df_tab2 = pd.read_excel(uploaded_file_tab2, skiprows=1)
-            df_tab2.columns = df_tab2.columns.astype(str).str.strip()
-            
-            # Renombrar columnas (usando la misma lógica)
-            col_hora_llegada = encontrar_columna(df_tab2, ['hora llegada', 'hora_llegada', 'hora'])
-            col_hora_finalizacion = encontrar_columna(df_tab2, ['hora finalización', 'hora_finalizacion', 'hora fin', 'hora final', 'fechafin'])
-            col_servicio = encontrar_columna(df_tab2, ['servicio'])
-            col_usuario = encontrar_columna(df_tab2, ['user atención', 'user_atencion', 'usuario atención', 'usuario_atencion', 'usuario', 'user'])
-            col_tipo = encontrar_columna(df_tab2, ['tipo'])
-            col_tiempo_atencion = encontrar_columna(df_tab2, ['tiempo atención', 'tiempo_atencion', 'tiempo de atención', 'duración atención'])
-            col_llamados = encontrar_columna(df_tab2, ['llamados', 'cantidad llamados', 'num llamados', 'número llamados', 'nro llamados'])
-            
-            rename_dict = {
-                col_hora_llegada: 'HORA_LLEGADA',
-                col_servicio: 'SERVICIO',
-                col_usuario: 'USUARIO_ATENCION'
-            }
-            if col_tipo:
-                rename_dict[col_tipo] = 'TIPO'
-            if col_hora_finalizacion:
-                rename_dict[col_hora_finalizacion] = 'HORA_FINALIZACION'
-            if col_tiempo_atencion:
-                rename_dict[col_tiempo_atencion] = 'TIEMPO_ATENCION'
-            if col_llamados:
-                rename_dict[col_llamados] = 'LLAMADOS'
-            
-            df_tab2 = df_tab2.rename(columns=rename_dict)
-            
-            # Procesar fechas
-            df_tab2["HORA_LLEGADA"] = pd.to_datetime(df_tab2["HORA_LLEGADA"], errors='coerce')
-            if 'HORA_FINALIZACION' in df_tab2.columns:
-                df_tab2["HORA_FINALIZACION"] = pd.to_datetime(df_tab2["HORA_FINALIZACION"], errors='coerce')
-            
-            df_tab2_limpio = df_tab2.dropna(subset=["HORA_LLEGADA"])
-            
-            # Procesar tiempo de atención
-            if 'TIEMPO_ATENCION' in df_tab2_limpio.columns:
-                if df_tab2_limpio['TIEMPO_ATENCION'].dtype == 'object':
-                    def tiempo_a_minutos(t):
-                        if pd.isna(t):
-                            return np.nan
-                        try:
-                            if isinstance(t, str):
-                                partes = t.split(':')
-                                if len(partes) == 3:
-                                    return int(partes[0]) * 60 + int(partes[1]) + int(partes[2]) / 60
-                                elif len(partes) == 2:
-                                    return int(partes[0]) * 60 + int(partes[1])
-                            return float(t)
-                        except:
-                            return np.nan
-                    
-                    df_tab2_limpio['TIEMPO_ATENCION'] = df_tab2_limpio['TIEMPO_ATENCION'].apply(tiempo_a_minutos)
-                else:
-                    df_tab2_limpio['TIEMPO_ATENCION'] = pd.to_numeric(df_tab2_limpio['TIEMPO_ATENCION'], errors='coerce')
-            
-            # Procesar llamados
-            if 'LLAMADOS' in df_tab2_limpio.columns:
-                df_tab2_limpio['LLAMADOS'] = pd.to_numeric(df_tab2_limpio['LLAMADOS'], errors='coerce').fillna(1).astype(int)
-            else:
-                df_tab2_limpio['LLAMADOS'] = 1
+            # Reutilizar la lectura en caché del archivo (columnas renombradas, fechas y tiempos tipados)
+            df_tab2_limpio, _ = cargar_turnos_atendidos(hash_archivo(uploaded_file_tab2), uploaded_file_tab2)
             
             # DataFrame base para análisis (con filtros de fecha y servicios)
             df_base = df_tab2_limpio[
@@ -938,42 +985,23 @@ with tab2:
             if 'TIPO' in df_base.columns:
                 st.subheader("📈 Evolución Temporal: Llamados Manuales vs Automáticos")
                 
-                # Clasificar llamados
-                def clasificar_llamado(valor):
-                    if pd.isna(valor):
-                        return 'NO CLASIFICADO'
-                    v = str(valor).lower().strip()
-                    if any(p in v for p in ['manual', 'm', 'man']):
-                        return 'MANUAL'
-                    elif any(p in v for p in ['auto', 'a', 'aut', 'autom']):
-                        return 'AUTOMÁTICO'
-                    return 'OTRO'
-                
-                df_base['CLASIFICACION'] = df_base['TIPO'].apply(clasificar_llamado)
-                
-                # Agrupar por fecha y clasificación
+                # Agrupar por fecha y clasificación (clasificación categórica calculada al cargar)
                 df_temporal = df_base.copy()
                 df_temporal['FECHA_DT'] = pd.to_datetime(df_temporal['FECHA'] if 'FECHA' in df_temporal.columns else df_temporal['HORA_LLEGADA'].dt.date)
-                
-                # Filtrar solo manuales y automáticos
-                df_manual = df_temporal[df_temporal['CLASIFICACION'] == 'MANUAL'].groupby('FECHA_DT').size().reset_index(name='MANUALES')
-                df_auto = df_temporal[df_temporal['CLASIFICACION'] == 'AUTOMÁTICO'].groupby('FECHA_DT').size().reset_index(name='AUTOMÁTICOS')
+                conteos_diarios = (df_temporal.groupby(['FECHA_DT', 'CLASIFICACION'], observed=False).size()
+                                   .unstack('CLASIFICACION').reindex(columns=CLASES_LLAMADO, fill_value=0))
                 
                 # Crear rango completo de fechas
                 fecha_inicio_dt = pd.to_datetime(fecha_ini)
                 fecha_fin_dt = pd.to_datetime(fecha_fin)
                 rango_fechas = pd.date_range(start=fecha_inicio_dt, end=fecha_fin_dt, freq='D')
                 
-                # Crear DataFrame con todas las fechas
-                df_completo = pd.DataFrame({'FECHA_DT': rango_fechas})
-                
-                # Merge con los datos
-                df_completo = df_completo.merge(df_manual, on='FECHA_DT', how='left')
-                df_completo = df_completo.merge(df_auto, on='FECHA_DT', how='left')
-                
-                # Rellenar NaN con 0
-                df_completo['MANUALES'] = df_completo['MANUALES'].fillna(0).astype(int)
-                df_completo['AUTOMÁTICOS'] = df_completo['AUTOMÁTICOS'].fillna(0).astype(int)
+                # Solo manuales y automáticos, con todas las fechas del rango (0 si no hay registros)
+                df_completo = pd.DataFrame({
+                    'FECHA_DT': rango_fechas,
+                    'MANUALES': conteos_diarios['MANUAL'].reindex(rango_fechas, fill_value=0).to_numpy(dtype=int),
+                    'AUTOMÁTICOS': conteos_diarios['AUTOMÁTICO'].reindex(rango_fechas, fill_value=0).to_numpy(dtype=int)
+                })
                 
                 # Calcular totales
                 total_manuales = df_completo['MANUALES'].sum()
@@ -1041,152 +1069,21 @@ with tab2:
                         'Usuario': usuarios_para_tabla
                     })
                     
-                    # Calcular conteos y promedios para cada usuario
-                    conteos_manuales = []
-                    conteos_automaticos = []
-                    tiempos_promedio_atencion = []
-                    tiempos_promedio_espera_entre_atenciones = []
+                    # Tiempos promedio de atención y de espera (con exclusiones) para todos los usuarios a la vez
+                    tiempos_promedio_atencion, tiempos_promedio_espera_entre_atenciones = tiempos_promedio_por_usuario(
+                        df_filtrado, usuarios_para_tabla
+                    )
                     
-                    for usuario in usuarios_para_tabla:
-                        # Filtrar datos para este usuario específico
-                        df_usuario = df_filtrado[df_filtrado['USUARIO_ATENCION'] == usuario].copy()
-                        
-                        # Clasificar llamados para este usuario (para conteos)
-                        if not df_usuario.empty and 'TIPO' in df_usuario.columns:
-                            df_usuario['CLASIF'] = df_usuario['TIPO'].apply(clasificar_llamado)
-                            
-                            # Contar manuales (TODOS los registros, sin exclusiones)
-                            manuales = len(df_usuario[df_usuario['CLASIF'] == 'MANUAL'])
-                            conteos_manuales.append(manuales)
-                            
-                            # Contar automáticos (TODOS los registros, sin exclusiones)
-                            automaticos = len(df_usuario[df_usuario['CLASIF'] == 'AUTOMÁTICO'])
-                            conteos_automaticos.append(automaticos)
-                        else:
-                            conteos_manuales.append(0)
-                            conteos_automaticos.append(0)
-                        
-                        # Calcular tiempo promedio de atención (por llamado individual) - CON EXCLUSIONES
-                        if 'TIEMPO_ATENCION' in df_usuario.columns:
-                            # Filtrar valores válidos (no nulos y mayores que 0)
-                            df_tiempos_validos = df_usuario[df_usuario['TIEMPO_ATENCION'].notna() & (df_usuario['TIEMPO_ATENCION'] > 0)]
-                            
-                            if not df_tiempos_validos.empty:
-                                # Calcular tiempo por llamado individual
-                                tiempos_por_llamado = []
-                                
-                                for _, row in df_tiempos_validos.iterrows():
-                                    # Verificar si es viernes (4) - excluir para tiempo de atención
-                                    dia_semana = row['HORA_LLEGADA'].weekday()
-                                    if dia_semana == 4:  # 4 = viernes
-                                        continue  # Excluir viernes
-                                    
-                                    # Verificar si es después de las 3 PM (15:00)
-                                    hora_dia = row['HORA_LLEGADA'].hour
-                                    if hora_dia >= 15:  # 15 = 3 PM
-                                        continue  # Excluir después de 3 PM
-                                    
-                                    tiempo_atencion = row['TIEMPO_ATENCION']
-                                    llamados = row['LLAMADOS'] if pd.notna(row['LLAMADOS']) and row['LLAMADOS'] > 0 else 1
-                                    
-                                    # Tiempo por llamado individual
-                                    tiempo_por_llamado = tiempo_atencion / llamados
-                                    
-                                    # Solo considerar tiempos razonables (menos de 60 minutos por llamado)
-                                    if 0 < tiempo_por_llamado < 60:
-                                        tiempos_por_llamado.append(tiempo_por_llamado)
-                                
-                                if tiempos_por_llamado:
-                                    # Promedio simple de tiempos por llamado
-                                    tiempo_prom_atencion = round(sum(tiempos_por_llamado) / len(tiempos_por_llamado), 1)
-                                else:
-                                    tiempo_prom_atencion = 0
-                            else:
-                                tiempo_prom_atencion = 0
-                        else:
-                            tiempo_prom_atencion = 0
-                        tiempos_promedio_atencion.append(tiempo_prom_atencion)
-                        
-                        # Calcular tiempo promedio de espera entre atenciones (por llamado individual) - CON EXCLUSIONES
-                        if 'HORA_FINALIZACION' in df_usuario.columns and not df_usuario.empty:
-                            # Ordenar por hora de llegada
-                            df_usuario = df_usuario.sort_values('HORA_LLEGADA')
-                            
-                            tiempos_espera_por_llamado = []  # Lista para almacenar los tiempos de espera por llamado
-                            
-                            fecha_anterior = None
-                            hora_finalizacion_anterior = None
-                            
-                            for idx, row in df_usuario.iterrows():
-                                fecha_actual = row['HORA_LLEGADA'].date()
-                                hora_llegada_actual = row['HORA_LLEGADA']
-                                hora_finalizacion_actual = row['HORA_FINALIZACION'] if pd.notna(row['HORA_FINALIZACION']) else None
-                                llamados_actual = row['LLAMADOS'] if pd.notna(row['LLAMADOS']) and row['LLAMADOS'] > 0 else 1
-                                
-                                # Verificar si es viernes (4) - excluir para tiempo de espera
-                                dia_semana = row['HORA_LLEGADA'].weekday()
-                                if dia_semana == 4:  # 4 = viernes
-                                    fecha_anterior = fecha_actual
-                                    if hora_finalizacion_actual is not None:
-                                        hora_finalizacion_anterior = hora_finalizacion_actual
-                                    continue  # Excluir viernes
-                                
-                                # Verificar si es sábado (5) o domingo (6) - excluir para tiempo de espera
-                                if dia_semana >= 5:  # 5 = sábado, 6 = domingo
-                                    fecha_anterior = fecha_actual
-                                    if hora_finalizacion_actual is not None:
-                                        hora_finalizacion_anterior = hora_finalizacion_actual
-                                    continue  # Excluir fines de semana
-                                
-                                # Verificar si es después de las 3 PM (15:00) - excluir para tiempo de espera
-                                hora_dia = row['HORA_LLEGADA'].hour
-                                if hora_dia >= 15:  # 15 = 3 PM
-                                    fecha_anterior = fecha_actual
-                                    if hora_finalizacion_actual is not None:
-                                        hora_finalizacion_anterior = hora_finalizacion_actual
-                                    continue  # Excluir después de 3 PM
-                                
-                                # Si tenemos un registro anterior del mismo día
-                                if hora_finalizacion_anterior is not None and fecha_anterior == fecha_actual:
-                                    # Calcular tiempo de espera = hora_llegada_actual - hora_finalizacion_anterior
-                                    tiempo_espera = (hora_llegada_actual - hora_finalizacion_anterior).total_seconds() / 60  # en minutos
-                                    
-                                    # Solo considerar tiempos positivos, menores a 50 minutos y mayores que 0
-                                    if 0 < tiempo_espera < 50:  # Excluir tiempos >= 50 minutos
-                                        # Dividir el tiempo de espera por la cantidad de llamados
-                                        # para obtener el tiempo de espera por llamado individual
-                                        tiempo_espera_por_llamado = tiempo_espera / llamados_actual
-                                        
-                                        # Solo considerar tiempos razonables
-                                        if 0 < tiempo_espera_por_llamado < 60:
-                                            # Agregar el tiempo por llamado (cada llamado tiene el mismo peso)
-                                            for _ in range(llamados_actual):
-                                                tiempos_espera_por_llamado.append(tiempo_espera_por_llamado)
-                                
-                                # Actualizar para el siguiente registro
-                                fecha_anterior = fecha_actual
-                                if hora_finalizacion_actual is not None:
-                                    hora_finalizacion_anterior = hora_finalizacion_actual
-                                else:
-                                    # Si no hay hora de finalización, usar la hora de llegada como aproximación
-                                    hora_finalizacion_anterior = hora_llegada_actual
-                            
-                            # Calcular promedio simple de tiempos de espera por llamado
-                            if tiempos_espera_por_llamado:
-                                tiempo_promedio_espera = round(sum(tiempos_espera_por_llamado) / len(tiempos_espera_por_llamado), 1)
-                            else:
-                                tiempo_promedio_espera = 0
-                        else:
-                            tiempo_promedio_espera = 0
-                        
-                        tiempos_promedio_espera_entre_atenciones.append(tiempo_promedio_espera)
+                    # Conteos de manuales y automáticos por usuario (TODOS los registros, sin exclusiones)
+                    conteos_usuario = df_filtrado.groupby(['USUARIO_ATENCION', 'CLASIFICACION'], observed=False).size().unstack('CLASIFICACION')
+                    conteos_usuario = conteos_usuario.reindex(index=usuarios_para_tabla, columns=CLASES_LLAMADO, fill_value=0)
                     
                     # Agregar columnas al DataFrame
-                    usuarios_df['Llamados Manuales'] = conteos_manuales
-                    usuarios_df['Llamados Automáticos'] = conteos_automaticos
+                    usuarios_df['Llamados Manuales'] = conteos_usuario['MANUAL'].to_numpy(dtype=int)
+                    usuarios_df['Llamados Automáticos'] = conteos_usuario['AUTOMÁTICO'].to_numpy(dtype=int)
                     usuarios_df['TOTAL Registros'] = usuarios_df['Llamados Manuales'] + usuarios_df['Llamados Automáticos']
-                    usuarios_df['⏱️ Tiempo promedio atención (min)'] = tiempos_promedio_atencion
-                    usuarios_df['⏱️ Tiempo promedio de espera entre atenciones (min)'] = tiempos_promedio_espera_entre_atenciones
+                    usuarios_df['⏱️ Tiempo promedio atención (min)'] = tiempos_promedio_atencion.to_numpy()
+                    usuarios_df['⏱️ Tiempo promedio de espera entre atenciones (min)'] = tiempos_promedio_espera_entre_atenciones.to_numpy()
                     
                     # Ordenar por total descendente
                     usuarios_df = usuarios_df.sort_values('TOTAL Registros', ascending=False)
@@ -1215,12 +1112,10 @@ with tab2:
                     )
                     
                     # Calcular totales generales (SIN EXCLUSIONES - usando df_filtrado directamente)
-                    # Clasificar todos los registros para obtener totales precisos
-                    df_clasificado = df_filtrado.copy()
-                    if 'TIPO' in df_clasificado.columns:
-                        df_clasificado['CLASIF_TOTAL'] = df_clasificado['TIPO'].apply(clasificar_llamado)
-                        total_manuales_gral = len(df_clasificado[df_clasificado['CLASIF_TOTAL'] == 'MANUAL'])
-                        total_automaticos_gral = len(df_clasificado[df_clasificado['CLASIF_TOTAL'] == 'AUTOMÁTICO'])
+                    if 'CLASIFICACION' in df_filtrado.columns:
+                        conteos_totales = df_filtrado['CLASIFICACION'].value_counts()
+                        total_manuales_gral = int(conteos_totales['MANUAL'])
+                        total_automaticos_gral = int(conteos_totales['AUTOMÁTICO'])
                     else:
                         # Si no hay columna TIPO, asumir que todos son manuales o no clasificados
                         total_manuales_gral = len(df_filtrado)
@@ -1553,17 +1448,13 @@ with tab3:
         if uploaded_file_tab3 is not None:
             try:
                 # Leer el archivo para obtener opciones de filtros
-                df_temp = pd.read_excel(uploaded_file_tab3)
+                df_temp = cargar_excel(hash_archivo(uploaded_file_tab3), uploaded_file_tab3, "fechaRegistro")
                 
                 # Verificar que existe la columna fechaRegistro
                 if 'fechaRegistro' not in df_temp.columns:
                     st.error("No se encontró la columna 'fechaRegistro' en el archivo. Esta columna es requerida.")
                     st.stop()
                 
-                # Procesar fechas
-                df_temp["fechaRegistro"] = pd.to_datetime(df_temp["fechaRegistro"], errors='coerce')
-                df_temp = df_temp.dropna(subset=["fechaRegistro"])
-                
                 fecha_minima = df_temp["fechaRegistro"].min().date()
                 fecha_maxima = df_temp["fechaRegistro"].max().date()
                 
@@ -1668,8 +1559,8 @@ with tab3:
     # --- PROCESAMIENTO PRINCIPAL ---
     if uploaded_file_tab3 is not None and 'fecha_inicio_tab3' in locals() and fecha_inicio_tab3 <= fecha_fin_tab3:
         try:
-            # Leer el archivo nuevamente para procesamiento
-            df = pd.read_excel(uploaded_file_tab3)
+            # Reutilizar la lectura en caché del archivo (ya con fechas convertidas)
+            df = cargar_excel(hash_archivo(uploaded_file_tab3), uploaded_file_tab3, "fechaRegistro")
             
             # Identificar columnas nuevamente
             columnas_nombre = [col for col in df.columns if 'nombre' in col.lower()]
@@ -1681,10 +1572,6 @@ with tab3:
             columnas_motivo = [col for col in df.columns if 'motivo' in col.lower()]
             col_motivo = columnas_motivo[0]  # Primer campo 'motivo'
             
-            # Procesar fechas
-            df["fechaRegistro"] = pd.to_datetime(df["fechaRegistro"], errors='coerce')
-            df = df.dropna(subset=["fechaRegistro"])
-            
             # NIVEL 1: FILTROS BASE (fecha y sede) - para análisis de motivos
             # Incluye todos los registros, incluso aquellos sin usuario
             df_base_filtrado = df[
@@ -1836,36 +1723,13 @@ with tab3:
                         st.warning("No hay usuarios en los datos filtrados.")
                         st.stop()
                     
-                    # Crear tabla de promedios por hora
-                    data = []
-                    for usuario in usuarios_proceso:
-                        df_usuario = df_proceso[df_proceso[col_nombre] == usuario]
-                        fila = []
-                        for hora in horas_con_registros:
-                            df_hora = df_usuario[df_usuario['HORA'] == hora]
-                            if not df_hora.empty:
-                                conteo_por_dia = df_hora.groupby('FECHA').size()
-                                conteo_por_dia = conteo_por_dia[conteo_por_dia > 0]
-                                promedio = conteo_por_dia.mean() if not conteo_por_dia.empty else 0
-                                fila.append(round(promedio, 2))
-                            else:
-                                fila.append(0)
-                        data.append(fila)
-                    
-                    tabla_resultados = pd.DataFrame(data, index=usuarios_proceso, columns=horas_formateadas)
+                    # Crear tabla de promedios por hora (usuario × hora) en una sola agrupación
+                    tabla_resultados = promedios_por_usuario_hora(df_proceso, col_nombre, usuarios_proceso,
+                                                                  horas_con_registros, horas_formateadas)
                     
                     # Calcular estadísticas
                     tabla_resultados['TOTAL'] = tabla_resultados[horas_formateadas].sum(axis=1).round(2)
-                    
-                    minimos = []
-                    for idx in tabla_resultados.index:
-                        valores_fila = tabla_resultados.loc[idx, horas_formateadas]
-                        valores_positivos = valores_fila[valores_fila > 0]
-                        if len(valores_positivos) > 0:
-                            minimos.append(valores_positivos.min())
-                        else:
-                            minimos.append(0)
-                    tabla_resultados['MÍNIMO'] = [round(x, 2) for x in minimos]
+                    tabla_resultados['MÍNIMO'] = minimo_positivo_por_fila(tabla_resultados[horas_formateadas]).round(2)
                     
                     tabla_resultados['MÁXIMO'] = tabla_resultados[horas_formateadas].max(axis=1).round(2)
                     
@@ -0,0 +1,42 @@
+import io
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacen_llamadas import agregar_archivo_almacen, detectar_formato_call_time
+
+import pandas as pd
+
+# Llamadas externas a una extensión de ODO; los primeros días (<= 12) son ambiguos entre día/mes
+FILAS = [f'{dia:02d}/03/2025 08:00:00,3001234567,(2001)' for dia in range(1, 29)]
+
+
+def csv_llamadas(filas):
+    return io.BytesIO(('Call Time,From,To\n' + '\n'.join(filas) + '\n').encode())
+
+
+def fechas_almacen(ruta):
+    conexion = sqlite3.connect(ruta)
+    try:
+        return [fila[0] for fila in conexion.execute('SELECT fecha FROM llamadas ORDER BY call_time')]
+    finally:
+        conexion.close()
+
+
+def test_detectar_formato_call_time():
+    assert detectar_formato_call_time(pd.Series([None, '2025-03-13 08:00:00'])) == '%Y-%m-%d %H:%M:%S'
+    assert detectar_formato_call_time(pd.Series(['sin formato'])) == 'mixed'
+    assert detectar_formato_call_time(pd.Series([None, None], dtype=object)) is None
+
+
+def test_mismo_formato_en_todos_los_bloques(tmp_path):
+    # Con bloques de 5 filas el primero solo tiene días <= 12; todos deben leerse igual que el archivo completo
+    por_bloques = tmp_path / 'bloques.sqlite'
+    completo = tmp_path / 'completo.sqlite'
+
+    agregar_archivo_almacen(csv_llamadas(FILAS), tamano_bloque=5, ruta=str(por_bloques))
+    agregar_archivo_almacen(csv_llamadas(FILAS), tamano_bloque=1000, ruta=str(completo))
+
+    assert fechas_almacen(por_bloques) == fechas_almacen(completo)
@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app_calculador_recursos_modelo_atencion import simular_cola_recepcion
+
+HORAS = ['07:00', '07:05', '07:10', '07:15']
+
+
+def test_simulacion_sin_llegadas():
+    # Un día sin registros: ninguna llegada esperada en ninguna franja
+    resultado = simular_cola_recepcion(HORAS, [0, 0, 0, 0], [1, 1, 1, 1], 3.0, n_dias=50, semilla=0)
+
+    assert list(resultado['Hora']) == HORAS
+    assert (resultado['Llegadas promedio'] == 0).all()
+    for columna in ['Espera promedio (min)', 'Espera P50 (min)', 'Espera P90 (min)', 'Espera P95 (min)']:
+        assert (resultado[columna] == 0).all()
+
+
+def test_simulacion_con_franjas_sin_llegadas():
+    resultado = simular_cola_recepcion(HORAS, [0, 4, 0, 2], [1, 1, 1, 1], 3.0, n_dias=200, semilla=0)
+
+    assert len(resultado) == len(HORAS)
+    assert not resultado.isna().any().any()
+    assert resultado.loc[0, 'Espera P95 (min)'] == 0
+    assert np.all(resultado['Espera P50 (min)'] <= resultado['Espera P95 (min)'])
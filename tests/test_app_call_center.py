@@ -0,0 +1,41 @@
+import io
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app_call_center import EMPTY_LABEL, ENCODING_SAMPLE_BYTES, process_call_reports
+
+HEADER = b'Call Time,Direction,Status,Cost\n'
+ROW = b'2025-03-01 08:00:00,Inbound,Answered,$1.25\n'
+
+
+def test_non_utf8_byte_after_encoding_sample():
+    # Muestra inicial UTF-8 válida y un byte latin-1 después de la ventana de detección
+    n_rows = ENCODING_SAMPLE_BYTES // len(ROW) + 100
+    data = HEADER + ROW * n_rows + b'2025-03-01 09:00:00,Inbound,Jos\xe9,$0.50\n'
+
+    df, metrics = process_call_reports(io.BytesIO(data), chunk_size=1000)
+
+    assert metrics['total'] == n_rows + 1
+    assert metrics['answered'] == n_rows
+    assert len(df) == n_rows + 1
+    assert df['Status'].iloc[-1] == 'José'
+
+
+def test_cube_keeps_calls_with_blank_direction_or_status():
+    data = HEADER + (
+        b'2025-03-01 08:00:00,Inbound,Answered,$1.25\n'
+        b'2025-03-01 08:10:00,,Answered,$0.50\n'
+        b'2025-03-01 08:20:00,Inbound,,$0.00\n'
+        b'no es fecha,Inbound,Answered,$0.75\n'
+    )
+
+    df, metrics = process_call_reports(io.BytesIO(data))
+
+    cube = metrics['cube']
+    assert metrics['total'] == 4
+    assert metrics['cube_dropped'] == 1
+    assert cube['Llamadas'].sum() + metrics['cube_dropped'] == metrics['total']
+    assert (cube['Direction'] == EMPTY_LABEL).sum() == 1
+    assert (cube['Status'] == EMPTY_LABEL).sum() == 1
@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app_indicadores_modelo_atencion import minimo_positivo_por_fila, promedios_por_usuario_hora
+
+
+def promedios_por_usuario_hora_bucle(df_proceso, columna_usuario, usuarios, horas, columnas):
+    # Cálculo original por usuario y hora (referencia)
+    data = []
+    for usuario in usuarios:
+        df_usuario = df_proceso[df_proceso[columna_usuario] == usuario]
+        fila = []
+        for hora in horas:
+            df_hora = df_usuario[df_usuario['HORA'] == hora]
+            if not df_hora.empty:
+                conteo_por_dia = df_hora.groupby('FECHA').size()
+                fila.append(round(conteo_por_dia.mean(), 2))
+            else:
+                fila.append(0)
+        data.append(fila)
+    return pd.DataFrame(data, index=usuarios, columns=columnas)
+
+
+def registros(conteos_por_dia, usuario='u1', hora=8):
+    fechas = pd.date_range('2025-01-01', periods=len(conteos_por_dia)).date
+    return pd.DataFrame({
+        'USUARIO': [usuario] * sum(conteos_por_dia),
+        'HORA': hora,
+        'FECHA': np.repeat(fechas, conteos_por_dia)
+    })
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_promedios_igual_al_bucle(semilla):
+    rng = np.random.default_rng(semilla)
+    n = 5000
+    llegada = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 60 * 86400, n), unit='s')
+    df = pd.DataFrame({'USUARIO': rng.choice([f'user{i}' for i in range(12)], n)})
+    df['FECHA'] = llegada.date
+    df['HORA'] = llegada.hour
+    usuarios = sorted(df['USUARIO'].unique())
+    horas = sorted(df['HORA'].unique())
+    columnas = [f"{h}:00" for h in horas]
+
+    esperado = promedios_por_usuario_hora_bucle(df, 'USUARIO', usuarios, horas, columnas)
+    pd.testing.assert_frame_equal(promedios_por_usuario_hora(df, 'USUARIO', usuarios, horas, columnas), esperado)
+
+
+def test_promedios_empate_xx5():
+    # 107 registros en 40 días: media 2.675 (empate en el redondeo a 2 decimales)
+    df = registros([3] * 27 + [2] * 13)
+    esperado = promedios_por_usuario_hora_bucle(df, 'USUARIO', ['u1'], [8], ['8:00'])
+    resultado = promedios_por_usuario_hora(df, 'USUARIO', ['u1'], [8], ['8:00'])
+    pd.testing.assert_frame_equal(resultado, esperado)
+
+
+def test_minimo_positivo_por_fila():
+    tabla = pd.DataFrame({'8:00': [0.0, 2.5, 0.0], '9:00': [1.5, 0.0, 0.0], '10:00': [3.0, 4.0, 0.0]})
+    assert list(minimo_positivo_por_fila(tabla)) == [1.5, 2.5, 0.0]